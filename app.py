@@ -3,8 +3,11 @@ import os
 from flask import Flask
 from handlers.webhook_handler import webhook_bp
 from handlers.reminder_handler import start_scheduler
+from services.brand_service import brand_config_watcher
+from services.whatsapp_service import outbound_queue
+from utils.payment_utils import payment_link_retries
 from utils.logger import get_logger
-from config.settings import BRAND_NAME
+from config.brand_registry import brand_registry
 
 # Create data directory if it doesn't exist
 os.makedirs("data", exist_ok=True)
@@ -16,14 +19,23 @@ app.register_blueprint(webhook_bp)
 # Initialize logger
 logger = get_logger("app")
 
+# Start draining the outbound message queue in this process
+outbound_queue.start()
+
+# Make payment link retries scheduled by any worker, including before a restart
+payment_link_retries.start()
+
+# Pick up brand catalog/price edits without a restart
+brand_config_watcher.start()
+
+# Every worker runs the scheduler; a Redis lease lets only one of them run the jobs
+start_scheduler()
+
 @app.route("/")
 def home():
-    return f"{BRAND_NAME} Retail WhatsApp Bot is running!"
+    return f"{brand_registry.default.name} Retail WhatsApp Bot is running!"
 
 if __name__ == "__main__":
-    # Start the scheduler
-    start_scheduler()
-
     # Run the Flask app
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,128 @@
+# benchmarks/payload_build.py
+"""Cost of building and serialising outbound WhatsApp payloads.
+
+"before" rebuilds every payload dict by hand and serialises it with the
+stdlib json defaults (the pre-template whatsapp_service); "after" fills
+the per-brand templates from services.message_templates and serialises
+with utils.json_utils (orjson when installed).
+
+Run from the repository root:
+
+    python -m benchmarks.payload_build [iterations]
+"""
+import json
+import sys
+import timeit
+
+from config.brand_registry import brand_registry
+from services.message_templates import (
+    CART_ACTIONS,
+    button_message,
+    get_templates,
+    interactive_payload,
+    item_lines
+)
+from utils.json_utils import dumps, orjson
+
+TO = "919876543210"
+ITEMS = [
+    {"id": f"sku{i}", "name": f"Product {i}", "quantity": i % 3 + 1, "price": 100 + i * 25}
+    for i in range(15)
+]
+
+
+def before_main_menu(brand):
+    return {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": TO,
+        "type": "interactive",
+        "interactive": {
+            "type": "button",
+            "body": {"text": brand.greeting_message},
+            "action": {"buttons": [{"type": "reply", "reply": {"id": "ORDER_NOW", "title": "🛍️ Order Now"}}]}
+        }
+    }
+
+
+def before_branch_list(brand):
+    sections = [{
+        "title": "Select Branch",
+        "rows": [{"id": branch, "title": branch, "description": ""} for branch in brand.branch_coordinates.keys()]
+    }]
+    return {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": TO,
+        "type": "interactive",
+        "interactive": {
+            "type": "list",
+            "header": {"type": "text", "text": "🏪 SELECT A BRANCH"},
+            "body": {"text": "Please select a branch for pickup:"},
+            "footer": {"text": "Tap to select your preferred branch"},
+            "action": {"button": "Select Branch", "sections": sections}
+        }
+    }
+
+
+def before_cart_summary(brand):
+    message = "🛒 *YOUR CART*\n\n"
+    total = 0
+    for item in ITEMS:
+        item_total = item["quantity"] * item["price"]
+        total += item_total
+        message += f"• {item['name']} x{item['quantity']} = ₹{item_total}\n"
+    message += f"\n*TOTAL*: ₹{total}\n\n"
+    return {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": TO,
+        "type": "interactive",
+        "interactive": {
+            "type": "button",
+            "body": {"text": message},
+            "action": {
+                "buttons": [
+                    {"type": "reply", "reply": {"id": "CONTINUE_SHOPPING", "title": "🛍️ Continue"}},
+                    {"type": "reply", "reply": {"id": "PROCEED_TO_CHECKOUT", "title": "✅ Checkout"}},
+                    {"type": "reply", "reply": {"id": "CLEAR_CART", "title": "🗑️ Clear Cart"}}
+                ]
+            }
+        }
+    }
+
+
+def after_main_menu(brand):
+    return interactive_payload(TO, get_templates(brand).main_menu)
+
+
+def after_branch_list(brand):
+    return interactive_payload(TO, get_templates(brand).branch_list)
+
+
+def after_cart_summary(brand):
+    total = sum(item["quantity"] * item["price"] for item in ITEMS)
+    message = f"🛒 *YOUR CART*\n\n{item_lines(ITEMS)}\n*TOTAL*: ₹{total}\n\n"
+    return interactive_payload(TO, button_message(message, CART_ACTIONS))
+
+
+CASES = [
+    ("main menu", before_main_menu, after_main_menu),
+    ("branch list", before_branch_list, after_branch_list),
+    ("cart summary (15 items)", before_cart_summary, after_cart_summary),
+]
+
+
+def main(iterations=50000):
+    brand = brand_registry.default
+    print(f"brand={brand.brand_id} iterations={iterations} encoder={'orjson' if orjson else 'json'}")
+    print(f"{'payload':<26}{'before (us)':>12}{'after (us)':>12}{'speedup':>9}")
+    for name, before, after in CASES:
+        assert json.loads(json.dumps(before(brand))) == json.loads(dumps(after(brand))), name
+        before_us = timeit.timeit(lambda: json.dumps(before(brand)), number=iterations) / iterations * 1e6
+        after_us = timeit.timeit(lambda: dumps(after(brand)), number=iterations) / iterations * 1e6
+        print(f"{name:<26}{before_us:>12.2f}{after_us:>12.2f}{before_us / after_us:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,235 @@
+# config/brand_registry.py
+import contextvars
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+
+from config.credentials import load_brand_credentials
+from config.settings import BRANCH_CONTACTS, BRANCH_COORDINATES
+from utils.logger import get_logger
+
+logger = get_logger("brand_registry")
+
+CONFIG_DIR = Path(__file__).resolve().parent
+BRANDS_DIR = CONFIG_DIR / "brands"
+BRAND_PHONES_PATH = CONFIG_DIR / "brandPhones.json"
+
+# Brand used when a webhook cannot be matched to a phone number, and for
+# code running outside any webhook (scheduler, admin scripts)
+DEFAULT_BRAND_ID = os.getenv("BRAND_ID", "kanuka").lower()
+
+# Redis key namespace of the default brand and of deployment-wide keys. Keys
+# were always namespaced by BRAND_ID (falling back to "default"), so the
+# default brand keeps that namespace and existing carts and orders stay put.
+DEFAULT_KEY_NAMESPACE = os.getenv("BRAND_ID", "default").lower()
+
+
+def _freeze(value):
+    """Read-only copy of nested dicts/lists"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+@dataclass(frozen=True, eq=False)
+class BrandContext:
+    """Everything a request needs to serve one brand; replaced, never mutated, on reload (compared by identity)"""
+
+    brand_id: str
+    name: str
+    phone_number_id: str
+    display_phone_number: str
+    access_token: str
+    catalog_id: str
+    whatsapp_api_url: str
+    catalog: MappingProxyType
+    bulk_contact: MappingProxyType
+    branch_contacts: MappingProxyType
+    branch_coordinates: MappingProxyType
+    config: MappingProxyType
+
+    @property
+    def key_namespace(self):
+        """Namespace of this brand's Redis keys"""
+        return DEFAULT_KEY_NAMESPACE if self.brand_id == DEFAULT_BRAND_ID else self.brand_id
+
+    @property
+    def greeting_message(self):
+        # Real line breaks: settings.GREETING_MESSAGE escaped them, so users
+        # saw a literal "\n" in the main menu
+        return (
+            f"🌿 *Welcome to {self.name}*\n\n"
+            "Your one-stop shop for premium organic products!\n\n"
+            "How can we help you today?"
+        )
+
+
+def _build_catalog(config):
+    return {
+        str(item["id"]).lower(): {"name": item["name"], "price": item["price"]}
+        for item in config.get("catalog", [])
+    }
+
+
+def load_brand_context(brand_id, phone_entry=None):
+    """Build the immutable context for one brand from its JSON file, brandPhones entry and env credentials"""
+    with open(BRANDS_DIR / f"{brand_id}.json", "r", encoding="utf-8") as f:
+        config = json.load(f)
+    phone_entry = phone_entry or {}
+    creds = load_brand_credentials(brand_id)
+
+    phone_number_id = creds["META_PHONE_NUMBER_ID"] or phone_entry.get("phone_number_id")
+    whatsapp_api_url = creds["WHATSAPP_API_URL"] or (
+        f"https://graph.facebook.com/v23.0/{phone_number_id}/messages" if phone_number_id else None
+    )
+
+    return BrandContext(
+        brand_id=brand_id,
+        name=config.get("name", "Our Store"),
+        phone_number_id=phone_number_id,
+        display_phone_number=phone_entry.get("display_phone_number"),
+        access_token=creds["META_ACCESS_TOKEN"],
+        catalog_id=creds["WHATSAPP_CATALOG_ID"] or phone_entry.get("catalog_id_env"),
+        whatsapp_api_url=whatsapp_api_url,
+        catalog=_freeze(_build_catalog(config)),
+        bulk_contact=_freeze(config.get("bulk_contact", {})),
+        # Brands without their own branch table share the one in settings
+        branch_contacts=_freeze(config.get("branch_contacts", BRANCH_CONTACTS)),
+        branch_coordinates=_freeze({
+            branch: tuple(coords) for branch, coords in config.get("branch_coordinates", BRANCH_COORDINATES).items()
+        }),
+        config=_freeze(config),
+    )
+
+
+class BrandRegistry:
+    """All brand contexts, indexed by brand id and by WhatsApp phone_number_id.
+
+    Contexts are immutable; a reload builds a complete new set and swaps it
+    in, bumping `version`. Requests already running keep the context they
+    started with. `digest` hashes the contents of the files last loaded, so
+    processes on different hosts can tell whether they hold the same config.
+    """
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_phone_number_id = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.signature = None
+        self.digest = None
+        self.load()
+
+    def files_signature(self):
+        """(name, mtime, size) of every config file a reload would read"""
+        paths = [BRAND_PHONES_PATH] + sorted(BRANDS_DIR.glob("*.json"))
+        signature = []
+        for path in paths:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            signature.append((path.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def files_digest(self):
+        """SHA-256 of the name and contents of every config file a reload would read"""
+        digest = hashlib.sha256()
+        for path in [BRAND_PHONES_PATH] + sorted(BRANDS_DIR.glob("*.json")):
+            try:
+                content = path.read_bytes()
+            except FileNotFoundError:
+                continue
+            digest.update(path.name.encode("utf-8") + b"\0" + content + b"\0")
+        return digest.hexdigest()
+
+    def load(self):
+        """(Re)load every brand from disk and swap the new contexts in"""
+        with self._lock:
+            signature = self.files_signature()
+            digest = self.files_digest()
+            with open(BRAND_PHONES_PATH, "r", encoding="utf-8") as f:
+                phones = json.load(f)
+            phone_entries = {
+                entry["brand_id"].lower(): dict(entry, phone_number_id=phone_number_id)
+                for phone_number_id, entry in phones.items()
+            }
+
+            by_id = {}
+            for path in sorted(BRANDS_DIR.glob("*.json")):
+                brand_id = path.stem.lower()
+                try:
+                    by_id[brand_id] = load_brand_context(brand_id, phone_entries.get(brand_id))
+                except Exception as e:
+                    logger.error(f"Failed to load brand {brand_id}: {str(e)}")
+                    # A half-saved or broken file keeps the brand on its last good config
+                    if brand_id in self._by_id:
+                        by_id[brand_id] = self._by_id[brand_id]
+
+            by_phone_number_id = {}
+            for brand in by_id.values():
+                if brand.phone_number_id:
+                    by_phone_number_id[str(brand.phone_number_id)] = brand
+            # brandPhones.json also maps numbers whose id is not in the environment
+            for phone_number_id, entry in phones.items():
+                brand = by_id.get(entry["brand_id"].lower())
+                if brand:
+                    by_phone_number_id.setdefault(phone_number_id, brand)
+
+            self._by_id = by_id
+            self._by_phone_number_id = by_phone_number_id
+            self.signature = signature
+            self.digest = digest
+            self.version += 1
+            logger.info("Loaded %s brands (version %s): %s", len(by_id), self.version, ", ".join(sorted(by_id)))
+
+    def reload_if_changed(self):
+        """Reload if any brand file changed since the last load; returns True if it did"""
+        if self.files_signature() == self.signature:
+            return False
+        self.load()
+        return True
+
+    def brands(self):
+        return list(self._by_id.values())
+
+    def get(self, brand_id):
+        """Context for brand_id, or None"""
+        return self._by_id.get(str(brand_id).lower()) if brand_id else None
+
+    def for_phone_number_id(self, phone_number_id):
+        """Context of the brand that owns phone_number_id, or None"""
+        return self._by_phone_number_id.get(str(phone_number_id)) if phone_number_id else None
+
+    @property
+    def default(self):
+        return self._by_id.get(DEFAULT_BRAND_ID) or next(iter(self._by_id.values()))
+
+
+brand_registry = BrandRegistry()
+
+_current_brand = contextvars.ContextVar("current_brand", default=None)
+
+
+def get_current_brand():
+    """Brand of the webhook being handled, or the default brand"""
+    return _current_brand.get() or brand_registry.default
+
+
+@contextmanager
+def use_brand(brand):
+    """Make `brand` (a BrandContext or brand id) current for the enclosed block"""
+    if not isinstance(brand, BrandContext):
+        brand = brand_registry.get(brand) or brand_registry.default
+    token = _current_brand.set(brand)
+    try:
+        yield brand
+    finally:
+        _current_brand.reset(token)
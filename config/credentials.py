@@ -54,3 +54,6 @@ USER_ACTIVITY_LOG_CSV = "../data/user_activity_log.csv"
 BRANCHES_CSV = "../data/branches.csv"
 BRANDS_CSV = "../data/brands.csv"
 
+# SQLite analytics store fed alongside the CSV logs
+ANALYTICS_DB = os.getenv("ANALYTICS_DB", "../data/analytics.db")
+
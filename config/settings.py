@@ -29,7 +29,7 @@
 
 
 # config/settings.py
-
+import os
 
 from .brand_config import brand_config
 
@@ -76,10 +76,40 @@ BRANCH_COORDINATES = {
 # Delivery radius in kilometers
 DELIVERY_RADIUS_KM = 6.0
 
+# How often each worker checks config/brands/*.json for edits; edits found by
+# one worker are also announced to the others over Redis pub/sub
+BRAND_CONFIG_POLL_SECONDS = float(os.getenv("BRAND_CONFIG_POLL_SECONDS", "2"))
+BRAND_CONFIG_CHANNEL = "brand-config:reload"
+
+# Meta Commerce catalog sync: how often the scheduler leader re-pulls each
+# brand's catalog, products per Graph API page, and how often workers check
+# for a newer synced copy
+CATALOG_SYNC_INTERVAL_SECONDS = int(os.getenv("CATALOG_SYNC_INTERVAL_SECONDS", "900"))
+CATALOG_SYNC_PAGE_SIZE = int(os.getenv("CATALOG_SYNC_PAGE_SIZE", "100"))
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "30"))
+
+# Geocoding cache for typed addresses: in-process LRU size, and how long
+# found / not-found results are kept (in-process and in Redis)
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "2048"))
+GEOCODE_CACHE_TTL_SECONDS = int(os.getenv("GEOCODE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL_SECONDS = int(os.getenv("GEOCODE_NEGATIVE_TTL_SECONDS", str(24 * 3600)))
+
 # Cart reminder settings
 CART_REMINDER_INTERVAL_HOURS = 2
 DAILY_REMINDER_TIME = "10:00"  # 10 AM
 
+# Cart reminders sent per second (kept well under the Meta messaging tier so
+# conversational replies keep flowing), and the longest the reminder worker
+# sleeps before checking for reminders scheduled by other processes
+CART_REMINDER_SENDS_PER_SECOND = int(os.getenv("CART_REMINDER_SENDS_PER_SECOND", "20"))
+CART_REMINDER_POLL_SECONDS = int(os.getenv("CART_REMINDER_POLL_SECONDS", "30"))
+# Delay before a claimed reminder that could not be sent is tried again
+CART_REMINDER_RETRY_SECONDS = int(os.getenv("CART_REMINDER_RETRY_SECONDS", "300"))
+
+# Lifetime of the scheduler leader lease; the leader renews it every third of
+# this, and another process takes over within this long after the leader dies
+SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "15"))
+
 # Order status
 ORDER_STATUS = {
     "PENDING": "Pending",
@@ -100,6 +130,57 @@ ORDER_STATUS = {
     "CANCELLED": "Cancelled"
 }
 
+# Orders only move forward through this flow (skipping ahead is allowed);
+# CANCELLED can be reached from any status before DELIVERED
+ORDER_STATUS_FLOW = ["PENDING", "PAID", "READY", "ON_THE_WAY", "DELIVERED"]
+
+# Outbound HTTP (Graph API / Razorpay) connection pooling and retries
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+
+# Outbound rate limits (token buckets shared across workers via Redis):
+# sustained requests per second and the burst allowed on top of it.
+# 80 messages/s is Meta's default throughput per business phone number.
+GRAPH_API_MESSAGES_PER_SECOND = float(os.getenv("GRAPH_API_MESSAGES_PER_SECOND", "80"))
+GRAPH_API_BURST = int(os.getenv("GRAPH_API_BURST", "80"))
+RAZORPAY_REQUESTS_PER_SECOND = float(os.getenv("RAZORPAY_REQUESTS_PER_SECOND", "10"))
+RAZORPAY_BURST = int(os.getenv("RAZORPAY_BURST", "20"))
+
+# Outbound message queue: worker threads per process, send attempts per
+# message before it is dead-lettered, and the base of the exponential backoff (s)
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "4"))
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "5"))
+OUTBOUND_RETRY_BACKOFF = float(os.getenv("OUTBOUND_RETRY_BACKOFF", "1.0"))
+# Messages held in memory (per process) while Redis is unreachable
+OUTBOUND_BUFFER_SIZE = int(os.getenv("OUTBOUND_BUFFER_SIZE", "1000"))
+
+# Senders handled in parallel when one webhook delivery batches several users
+MESSAGE_DISPATCH_WORKERS = int(os.getenv("MESSAGE_DISPATCH_WORKERS", "8"))
+
+# Background threads creating Razorpay payment links
+PAYMENT_LINK_WORKERS = int(os.getenv("PAYMENT_LINK_WORKERS", "4"))
+# How often each process checks Redis for payment link retries that are due (s)
+PAYMENT_LINK_RETRY_POLL_SECONDS = float(os.getenv("PAYMENT_LINK_RETRY_POLL_SECONDS", "1"))
+
+# Audit CSV rows are buffered and appended in batches of up to this many rows,
+# at least every AUDIT_FLUSH_INTERVAL_SECONDS
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "2.0"))
+
+# CSV logs are split into daily partitions, rolled over to a new part once a
+# partition reaches CSV_PARTITION_MAX_BYTES; earlier days are gzipped and
+# deleted after CSV_RETENTION_DAYS (0 keeps them forever)
+CSV_PARTITION_MAX_BYTES = int(os.getenv("CSV_PARTITION_MAX_BYTES", str(256 * 1024 * 1024)))
+CSV_RETENTION_DAYS = int(os.getenv("CSV_RETENTION_DAYS", "180"))
+CSV_MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("CSV_MAINTENANCE_INTERVAL_SECONDS", "3600"))
+
+# How long processed WhatsApp message ids / Razorpay event ids are remembered;
+# Meta keeps redelivering failed webhooks for up to 7 days
+WEBHOOK_DEDUP_TTL_SECONDS = 7 * 24 * 3600
+
 # Payment methods
 PAYMENT_METHODS = ["Pay Now", "Cash on Delivery"]
 
@@ -1,13 +1,14 @@
 # handlers/message_handler.py
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import json
 import traceback
 import uuid
 
-import googlemaps
-from config.credentials import GOOGLE_MAPS_API_KEY
-from config.settings import BRANCH_COORDINATES, DELIVERY_RADIUS_KM, GREETING_MESSAGE, ORDER_STATUS, PRODUCT_CATALOG
+from config.brand_registry import brand_registry, get_current_brand, use_brand
+from config.settings import DELIVERY_RADIUS_KM, MESSAGE_DISPATCH_WORKERS, ORDER_STATUS
 from stateHandlers.redis_state import redis_state
+from services.catalog_service import lookup_product
 from services.whatsapp_service import (
     send_address_request,
     send_main_menu,
@@ -30,6 +31,8 @@ from services.order_service import (
 )
 from utils.logger import get_logger
 from utils.csv_utils import log_user_activity
+from utils.geocode_utils import geocode_address
+from utils.location_utils import is_within_delivery_radius
 import re
 import math
 
@@ -37,78 +40,136 @@ from utils.time_utils import get_current_ist
 
 logger = get_logger("message_handler")
 
+# Runs different senders' messages from one webhook delivery in parallel
+_sender_pool = ThreadPoolExecutor(max_workers=MESSAGE_DISPATCH_WORKERS, thread_name_prefix="sender")
+
 def handle_incoming_message(data):
     """Handle incoming WhatsApp messages"""
     logger.info("Received message data")
     
     try:
+        # Collect every message in the delivery, grouped by the brand number
+        # it was sent to and by sender
+        messages_by_sender = {}
         for entry in data.get("entry", []):
             for change in entry.get("changes", []):
                 value = change.get("value", {})
-                messages = value.get("messages", [])
-                if not messages:
-                    continue
-                
-                msg = messages[0]
-                sender = msg.get("from").lstrip('+')  # Normalize sender ID
-                message_type = msg.get("type")
-                
-                # Log activity
-                if message_type == "text":
-                    text = msg.get("text", {}).get("body", "").strip().lower()
-                    logger.info(f"Message received from {sender}: {text}")
-                    log_user_activity(sender, "message_received", f"Text: {text}")
-                
-                # Get current state
-                current_state = redis_state.get_user_state(sender)
-                logger.debug(f"Current state for {sender}: {current_state}")
-                
-                # INTERACTIVE MESSAGE HANDLING
-                if message_type == "interactive":
-                    interactive_type = msg.get("interactive", {}).get("type")
-                    if interactive_type == "list_reply":
-                        # Handle branch selection from list
-                        selected_branch = msg.get("interactive", {}).get("list_reply", {}).get("id")
-                        handle_branch_selection(sender, selected_branch, current_state)
-                    elif interactive_type == "button_reply":
-                        # Handle button responses
-                        button_id = msg.get("interactive", {}).get("button_reply", {}).get("id")
-                        handle_button_response(sender, button_id, current_state)
-                    elif interactive_type == "catalog_message":
-                        # Handle catalog selection
-                        catalog_id = msg.get("interactive", {}).get("catalog_message", {}).get("catalog_id")
-                        product_retailer_id = msg.get("interactive", {}).get("catalog_message", {}).get("product_retailer_id")
-                        handle_catalog_selection(sender, product_retailer_id, current_state)
-                
-                # TEXT MESSAGE HANDLING
-                elif message_type == "text":
-                    text = msg.get("text", {}).get("body", "").strip().lower()
-                    handle_text_message(sender, text, current_state)
-                
-                # ORDER MESSAGE HANDLING
-                elif message_type == "order":
-                    items = msg.get("order", {}).get("product_items", [])
-                    handle_catalog_order(sender, items)
-                
-                # LOCATION MESSAGE HANDLING
-                elif message_type == "location":
-                    # Handle location sharing
-                    latitude = msg.get("location", {}).get("latitude")
-                    longitude = msg.get("location", {}).get("longitude")
-                    handle_location(sender, latitude, longitude, current_state)
+                brand = resolve_brand(value.get("metadata", {}).get("phone_number_id"))
+                for msg in value.get("messages", []):
+                    sender = msg.get("from").lstrip('+')  # Normalize sender ID
+                    messages_by_sender.setdefault((brand, sender), []).append(msg)
+        
+        if not messages_by_sender:
+            return "OK", 200
+        
+        # Each sender's messages run in order; different senders run concurrently
+        if len(messages_by_sender) == 1:
+            (brand, sender), messages = next(iter(messages_by_sender.items()))
+            ok = handle_sender_messages(brand, sender, messages)
+        else:
+            futures = [
+                _sender_pool.submit(handle_sender_messages, brand, sender, messages)
+                for (brand, sender), messages in messages_by_sender.items()
+            ]
+            ok = all([future.result() for future in futures])
         
+        if not ok:
+            return "Error processing message", 500
         return "OK", 200
     except Exception as e:
         logger.error(f"Message handler error: {str(e)}\n{traceback.format_exc()}")
+        # Let Meta's redelivery through the de-duplication claim
+        redis_state.release_events("whatsapp", [
+            msg.get("id")
+            for entry in data.get("entry", [])
+            for change in entry.get("changes", [])
+            for msg in change.get("value", {}).get("messages", [])
+        ])
         return "Error processing message", 500
 
+def resolve_brand(phone_number_id):
+    """Brand context for the business number a webhook was delivered to"""
+    brand = brand_registry.for_phone_number_id(phone_number_id)
+    if not brand:
+        logger.warning("Unknown phone_number_id %s, using default brand", phone_number_id)
+        brand = brand_registry.default
+    return brand
+
+def handle_sender_messages(brand, sender, messages):
+    """Handle one sender's messages to a brand from a delivery in timestamp order"""
+    ok = True
+    with use_brand(brand):
+        for msg in sorted(messages, key=lambda m: int(m.get("timestamp") or 0)):
+            try:
+                handle_message(sender, msg)
+            except Exception as e:
+                logger.error(f"Message handler error for {sender}: {str(e)}\n{traceback.format_exc()}")
+                # handle_message discarded this message's writes and side effects
+                # (see RedisState.unit_of_work), so it is safe to let Meta's
+                # redelivery through the claim and handle it from scratch
+                redis_state.release_events("whatsapp", [msg.get("id")])
+                ok = False
+    return ok
+
+def handle_message(sender, msg):
+    """Handle a single WhatsApp message"""
+    message_type = msg.get("type")
+    
+    with redis_state.unit_of_work(sender) as uow:
+        # Log activity
+        if message_type == "text":
+            text = msg.get("text", {}).get("body", "").strip().lower()
+            logger.info("Message received from %s: %s", sender, text)
+            log_user_activity(sender, "message_received", f"Text: {text}")
+    
+        # Get current state (served from the unit of work)
+        current_state = redis_state.get_user_state(sender)
+        logger.debug("Current state for %s: %s", sender, current_state)
+    
+        # INTERACTIVE MESSAGE HANDLING
+        if message_type == "interactive":
+            interactive_type = msg.get("interactive", {}).get("type")
+            if interactive_type == "list_reply":
+                # Handle branch selection from list
+                selected_branch = msg.get("interactive", {}).get("list_reply", {}).get("id")
+                handle_branch_selection(sender, selected_branch, current_state)
+            elif interactive_type == "button_reply":
+                # Handle button responses
+                button_id = msg.get("interactive", {}).get("button_reply", {}).get("id")
+                handle_button_response(sender, button_id, current_state)
+            elif interactive_type == "catalog_message":
+                # Handle catalog selection
+                catalog_id = msg.get("interactive", {}).get("catalog_message", {}).get("catalog_id")
+                product_retailer_id = msg.get("interactive", {}).get("catalog_message", {}).get("product_retailer_id")
+                handle_catalog_selection(sender, product_retailer_id, current_state)
+    
+        # TEXT MESSAGE HANDLING
+        elif message_type == "text":
+            text = msg.get("text", {}).get("body", "").strip().lower()
+            handle_text_message(sender, text, current_state)
+    
+        # ORDER MESSAGE HANDLING
+        elif message_type == "order":
+            items = msg.get("order", {}).get("product_items", [])
+            handle_catalog_order(sender, items)
+    
+        # LOCATION MESSAGE HANDLING
+        elif message_type == "location":
+            # Handle location sharing
+            latitude = msg.get("location", {}).get("latitude")
+            longitude = msg.get("location", {}).get("longitude")
+            handle_location(sender, latitude, longitude, current_state)
+
+    logger.info("Handled %s message from %s in %s Redis round trips", message_type, sender, uow.round_trips)
+
+
 def handle_branch_selection(sender, selected_branch, current_state):
     """Handle branch selection from interactive list"""
-    logger.info(f"Handling branch selection for {sender}: {selected_branch}")
+    logger.info("Handling branch selection for %s: %s", sender, selected_branch)
     
     # Validate branch
     valid_branch = None
-    for b in BRANCH_COORDINATES.keys():
+    for b in get_current_brand().branch_coordinates.keys():
         if b.lower() == selected_branch.lower():
             valid_branch = b
             break
@@ -131,7 +192,7 @@ def handle_branch_selection(sender, selected_branch, current_state):
 
 def handle_button_response(sender, button_id, current_state):
     """Handle button responses from user"""
-    logger.info(f"Handling button response for {sender}: {button_id}")
+    logger.info("Handling button response for %s: %s", sender, button_id)
     
     # Handle main menu options
     if button_id == "ORDER_NOW":
@@ -187,7 +248,7 @@ def handle_button_response(sender, button_id, current_state):
 
 def handle_location(sender, latitude, longitude, current_state):
     """Handle location sharing from user"""
-    logger.info(f"Handling location for {sender}: {latitude}, {longitude}")
+    logger.info("Handling location for %s: %s, %s", sender, latitude, longitude)
     
     # Set location in cart
     redis_state.set_location(sender, latitude, longitude)
@@ -208,15 +269,12 @@ def handle_location(sender, latitude, longitude, current_state):
         send_text_message(sender, message)
 
 def handle_location_by_text(sender, text):
-    gmaps = googlemaps.Client(GOOGLE_MAPS_API_KEY)
-    geocode = gmaps.geocode(text)
-    if not geocode:
+    location = geocode_address(text)
+    if not location:
         send_text_message(sender, "❌ Sorry, we couldn't find your location. We may not deliver there.")
         return 
-    location = geocode[0]["geometry"]["location"]
-    latitude = location["lat"]
-    longitude = location["lng"]
-    logger.info(f"Handling location for {sender}: {latitude}, {longitude}")
+    latitude, longitude = location
+    logger.info("Handling location for %s: %s, %s", sender, latitude, longitude)
     
     # Set location in cart
     redis_state.set_location(sender, latitude, longitude)
@@ -240,13 +298,13 @@ def handle_location_by_text(sender, text):
 def send_discount(sender):
      # Get brand-specific discount
     discount_percentage = redis_state.get_brand_discount()
-    logger.info(f"Applying brand discount of {discount_percentage:.2f}% to order for {sender}")
+    logger.info("Applying brand discount of %.2f%% to order for %s", discount_percentage, sender)
     if discount_percentage > 0:
         send_text_message(sender, f"🎉 Congratulations! You've unlocked a {discount_percentage:.2f}% discount.")
 
 def handle_text_message(sender, text, current_state):
     """Handle text messages from users"""
-    logger.info(f"Handling text message from {sender}: {text}")
+    logger.info("Handling text message from %s: %s", sender, text)
      # Handle admin discount commands
     if is_admin(sender):
         # Set discount command (e.g., "set discount 10")
@@ -258,7 +316,7 @@ def handle_text_message(sender, text, current_state):
                 if success:
                     message = f"✅ Discount set to {discount_percentage}%"
                     send_text_message(sender, message)
-                    logger.info(f"Admin {sender} set discount to {discount_percentage}%")
+                    logger.info("Admin %s set discount to %s%%", sender, discount_percentage)
                 else:
                     send_text_message(sender, "❌ Failed to set discount. Please try again.")
             else:
@@ -270,7 +328,7 @@ def handle_text_message(sender, text, current_state):
             success = redis_state.clear_brand_discount()
             if success:
                 send_text_message(sender, "✅ Discount has been cleared")
-                logger.info(f"Admin {sender} cleared discount")
+                logger.info("Admin %s cleared discount", sender)
             else:
                 send_text_message(sender, "❌ Failed to clear discount. Please try again.")
             return
@@ -331,9 +389,10 @@ def handle_text_message(sender, text, current_state):
                 "delivery_type": delivery_type,
                 "delivery_address": address,
                 "status": "PENDING_PAYMENT",
-                "payment_method": "online"
+                "payment_method": "online",
+                "brand_id": get_current_brand().brand_id
             }
-            redis_state.redis.setex(f"pending_order:{order_id}", 3600, json.dumps(pending_order))
+            redis_state.set_pending_order(order_id, pending_order)
             
             # Process payment (generates link)
             success, message = process_payment(sender, order_id)
@@ -341,7 +400,7 @@ def handle_text_message(sender, text, current_state):
             if not success:
                 send_text_message(sender, f"❌ Failed to generate payment link: {message}")
                 # Clear pending order
-                redis_state.redis.delete(f"pending_order:{order_id}")
+                redis_state.delete_pending_order(order_id)
                 # Reset state
                 redis_state.clear_user_state(sender)
         
@@ -349,7 +408,7 @@ def handle_text_message(sender, text, current_state):
     
     # Reset to main menu if state is invalid or missing
     if not current_state or current_state.get("step") not in ["VIEWING_CATALOG", "VIEWING_CART", "SELECTING_DELIVERY_TYPE", "WAITING_FOR_LOCATION", "SELECTING_BRANCH", "SELECTING_PAYMENT_METHOD", "WAITING_FOR_ADDRESS"]:
-        logger.info(f"Resetting state for {sender} - invalid or missing state: {current_state}")
+        logger.info("Resetting state for %s - invalid or missing state: %s", sender, current_state)
         redis_state.clear_user_state(sender)
         send_main_menu(sender)
         redis_state.set_user_state(sender, {"step": "MAIN_MENU"})
@@ -358,7 +417,7 @@ def handle_text_message(sender, text, current_state):
     # Handle common greetings in any state
     greetings = ["hi", "hello", "hey", "hii", "namaste"]
     if any(greeting in text for greeting in greetings):
-        logger.info(f"User {sender} sent greeting '{text}', resetting to main menu")
+        logger.info("User %s sent greeting '%s', resetting to main menu", sender, text)
         redis_state.clear_user_state(sender)
         send_main_menu(sender)
         redis_state.set_user_state(sender, {"step": "MAIN_MENU"})
@@ -398,17 +457,19 @@ def handle_text_message(sender, text, current_state):
 
 def handle_catalog_selection(sender, product_retailer_id, current_state):
     """Handle product selection from catalog"""
-    logger.info(f"Handling catalog selection for {sender}: {product_retailer_id}")
+    logger.info("Handling catalog selection for %s: %s", sender, product_retailer_id)
     
     if not current_state or current_state.get("step") != "VIEWING_CATALOG":
         send_catalog(sender)
         redis_state.set_user_state(sender, {"step": "VIEWING_CATALOG"})
         return
     
-    # Get product info from catalog mapping (case-insensitive lookup)
-    product_info = PRODUCT_CATALOG.get(str(product_retailer_id).lower())
+    # Get product info from the synced catalog (case-insensitive lookup)
+    product_info = lookup_product(product_retailer_id)
     
-    if product_info:
+    if product_info and not product_info["available"]:
+        send_text_message(sender, f"❌ {product_info['name']} is currently out of stock.")
+    elif product_info:
         # Add to cart (quantity 1 by default)
         cart = redis_state.add_to_cart(sender, str(product_retailer_id).lower(), 1)
         
@@ -416,18 +477,18 @@ def handle_catalog_selection(sender, product_retailer_id, current_state):
         send_cart_summary(sender)
         redis_state.set_user_state(sender, {"step": "VIEWING_CART"})
         
-        logger.info(f"Added 1x {product_info['name']} (ID: {product_retailer_id}) to cart for {sender}")
+        logger.info("Added 1x %s (ID: %s) to cart for %s", product_info['name'], product_retailer_id, sender)
     else:
         logger.warning(f"Unknown product ID selected: {product_retailer_id} for sender {sender}")
         send_text_message(sender, "❌ Product not found. Please try again.")
 
 def handle_catalog_order(sender, items):
     """Handle catalog orders (when user selects from WhatsApp catalog)"""
-    logger.info(f"Handling catalog order from {sender}")
+    logger.info("Handling catalog order from %s", sender)
     
     # Get user's current state
     current_state = redis_state.get_user_state(sender)
-    logger.debug(f"[CATALOG ITEMS]: {items}")
+    logger.debug("[CATALOG ITEMS]: %s", items)
     
     # If not in catalog view, prompt for catalog
     if not current_state or current_state.get("step") != "VIEWING_CATALOG":
@@ -436,52 +497,34 @@ def handle_catalog_order(sender, items):
         return
     
     # Add catalog items to cart
+    to_add = []
+    out_of_stock = []
     for item in items:
         product_id = str(item.get("product_retailer_id", "")).lower()
         quantity = int(item.get("quantity", 1))
 
-        # Get product info from catalog mapping
-        product_info = PRODUCT_CATALOG.get(product_id)
+        # Get product info from the synced catalog
+        product_info = lookup_product(product_id)
 
-        if product_info:
-            # Add to cart
-            redis_state.add_to_cart(sender, product_id, quantity)
-            logger.info(f"Added {quantity}x {product_info['name']} (ID: {product_id}) to cart for {sender}")
+        if product_info and not product_info["available"]:
+            out_of_stock.append(product_info["name"])
+        elif product_info:
+            to_add.append((product_id, quantity))
+            logger.info("Adding %sx %s (ID: %s) to cart for %s", quantity, product_info['name'], product_id, sender)
         else:
             logger.warning(f"Unknown product ID: {product_id} for sender {sender}")
     
+    # All items go into the cart in one Redis call
+    if to_add:
+        redis_state.add_items_to_cart(sender, to_add)
+    
+    if out_of_stock:
+        send_text_message(sender, "❌ Currently out of stock: " + ", ".join(out_of_stock))
+    
     # Send cart summary
     send_cart_summary(sender)
     redis_state.set_user_state(sender, {"step": "VIEWING_CART"})
 
-def is_within_delivery_radius(latitude, longitude):
-    """Check if location is within delivery radius of any branch"""
-    nearest_branch = None
-    min_distance = float('inf')
-    
-    for branch, coords in BRANCH_COORDINATES.items():
-        distance = calculate_distance(
-            latitude, longitude, coords[0], coords[1]
-        )
-        if distance < min_distance:
-            min_distance = distance
-            nearest_branch = branch
-    
-    return min_distance <= DELIVERY_RADIUS_KM, nearest_branch, min_distance
-
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points in km using Haversine formula"""
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    r = 6371  # Radius of earth in kilometers
-    return c * r
-
 def generate_order_id():
     """Generate a unique order ID"""
     return f"ORD{get_current_ist().strftime('%Y%m%d')}{str(uuid.uuid4())[:4].upper()}"
@@ -1,9 +1,17 @@
 # handlers/reminder_handler.py
-import json
-import os
-from config.settings import DAILY_REMINDER_TIME
+from config.brand_registry import brand_registry, use_brand
+from config.settings import (
+    CART_REMINDER_POLL_SECONDS,
+    CART_REMINDER_RETRY_SECONDS,
+    CATALOG_REFRESH_SECONDS,
+    CART_REMINDER_SENDS_PER_SECOND,
+    DAILY_REMINDER_TIME,
+    SCHEDULER_LEASE_SECONDS
+)
+from services.catalog_service import sync_catalog_if_due
+from services.leader_lease import LeaderLease
 from services.whatsapp_service import send_cart_reminder
-from stateHandlers.redis_state import redis_state
+from stateHandlers.redis_state import BRAND_ID, redis_state
 from utils.logger import get_logger
 from datetime import datetime, time, timedelta
 import threading
@@ -12,56 +20,122 @@ import time as time_module
 from utils.time_utils import get_current_ist
 
 logger = get_logger("reminder_handler")
-BRAND_ID = os.getenv("BRAND_ID", "default").lower()
+
+# Every process runs the scheduler loop, but only the lease holder runs the jobs
+scheduler_lease = LeaderLease(redis_state.redis, f"scheduler:{BRAND_ID}:leader")
 
 def process_cart_reminders():
-    """Process pending cart reminders"""
-    logger.info("Processing cart reminders")
-    
-    # Get all pending reminders
-    reminders = redis_state.get_pending_cart_reminders()
+    """Send abandonment reminders for carts that are due, returning how many were sent"""
+    from utils.csv_utils import log_cart_reminder
+    sent = 0
     
-    for reminder in reminders:
-        user_id = reminder["user_id"]
-        order_id = reminder["order_id"]
+    while True:
+        # Claim at most one second's worth of sends at a time; claimed reminders
+        # are removed from Redis, so no other worker sees them, and any that
+        # cannot be queued are put back to be retried
+        batch_started = time_module.monotonic()
+        reminders = redis_state.claim_due_cart_reminders(CART_REMINDER_SENDS_PER_SECOND)
+        if not reminders:
+            break
         
-        # Send reminder
-        # send_cart_reminder(user_id, order_id)
+        user_ids = [reminder["user_id"] for reminder in reminders]
+        try:
+            carts = redis_state.get_carts(user_ids)
+        except Exception as e:
+            logger.error(f"Error reading carts for {len(user_ids)} reminders: {str(e)}")
+            redis_state.restore_cart_reminders(user_ids, CART_REMINDER_RETRY_SECONDS)
+            break
         
-        # Log reminder
-        from utils.csv_utils import log_cart_reminder
-        log_cart_reminder(user_id, order_id)
+        failed = []
+        for reminder in reminders:
+            user_id = reminder["user_id"]
+            cart = carts[user_id]
+            
+            # Checking out clears the cart, so an empty cart means nothing to remind about
+            if not cart["items"]:
+                continue
+            
+            try:
+                queued = send_cart_reminder(user_id, cart)
+            except Exception as e:
+                logger.error(f"Error sending cart reminder to {user_id}: {str(e)}")
+                queued = None
+            if not queued:
+                failed.append(user_id)
+                continue
+            log_cart_reminder(user_id)
+            sent += 1
         
-        # Remove from pending reminders
-        redis_state.redis.lrem(
-            f"cart:{BRAND_ID}:reminders", 0, json.dumps(reminder)
-        )
+        if failed:
+            redis_state.restore_cart_reminders(failed, CART_REMINDER_RETRY_SECONDS)
+        
+        if len(reminders) < CART_REMINDER_SENDS_PER_SECOND:
+            break
+        
+        # Stay within the per-second send budget
+        time_module.sleep(max(batch_started + 1 - time_module.monotonic(), 0))
+    
+    if sent:
+        logger.info("Sent %s cart reminders", sent)
+    return sent
+
+def run_daily_tasks(now=None):
+    """Run the daily job once per day, at or after DAILY_REMINDER_TIME"""
+    now = now or get_current_ist()
+    daily_reminder_time = datetime.strptime(DAILY_REMINDER_TIME, "%H:%M").time()
+    if now.time() < daily_reminder_time:
+        return False
+    
+    # Guards against running twice if leadership changes hands during the day
+    if not redis_state.claim_daily_run("daily_reminders", now.strftime("%Y-%m-%d")):
+        return False
     
-    logger.info(f"Processed {len(reminders)} cart reminders")
+    # This would send daily reminders to users with items in cart
+    logger.info("Sending daily reminders")
+    return True
 
-def schedule_daily_tasks():
-    """Schedule daily tasks to run at specific times"""
-    logger.info("Starting daily tasks scheduler")
+def run_scheduler():
+    """Run the scheduled jobs in whichever process currently holds the scheduler lease"""
+    logger.info("Starting scheduler as %s", scheduler_lease.token)
+    scheduler_lease.start()
+    heartbeat_seconds = SCHEDULER_LEASE_SECONDS / 3
     
-    # Run continuously
     while True:
-        now = get_current_ist()
-        
-        # Process cart reminders every 15 minutes
-        if now.minute % 15 == 0:
-            process_cart_reminders()
+        delay = heartbeat_seconds
+        if scheduler_lease.is_leader:
+            try:
+                # Cart reminders are kept per brand and sent from that brand's number
+                delay = min(CART_REMINDER_POLL_SECONDS, heartbeat_seconds)
+                for brand in brand_registry.brands():
+                    with use_brand(brand):
+                        process_cart_reminders()
+                        # Sleep until the next reminder is due, but check back regularly
+                        # for reminders scheduled by other processes in the meantime
+                        next_due = redis_state.next_cart_reminder_due()
+                    if next_due is not None:
+                        delay = min(max(next_due - get_current_ist().timestamp(), 0), delay)
+                run_daily_tasks()
+            except Exception as e:
+                logger.error(f"Error running scheduled jobs: {str(e)}")
         
-        # Daily reminder at specified time
-        daily_reminder_time = datetime.strptime(DAILY_REMINDER_TIME, "%H:%M").time()
-        if now.time() >= daily_reminder_time and now.time() < (datetime.combine(now.date(), daily_reminder_time) + timedelta(minutes=1)).time():
-            # This would send daily reminders to users with items in cart
-            logger.info("Sending daily reminders")
-        
-        # Sleep for 1 minute before checking again
-        time_module.sleep(60)
+        time_module.sleep(delay)
+
+def run_catalog_sync():
+    """Keep each brand's synced Commerce catalog fresh while holding the scheduler lease"""
+    while True:
+        if scheduler_lease.is_leader:
+            for brand in brand_registry.brands():
+                try:
+                    sync_catalog_if_due(brand)
+                except Exception as e:
+                    logger.error(f"Error syncing catalog for {brand.brand_id}: {str(e)}")
+        time_module.sleep(CATALOG_REFRESH_SECONDS)
 
 def start_scheduler():
-    """Start the scheduler in a separate thread"""
-    scheduler_thread = threading.Thread(target=schedule_daily_tasks, daemon=True)
+    """Start the scheduler in a separate thread; safe to call in every worker"""
+    scheduler_thread = threading.Thread(target=run_scheduler, name="scheduler", daemon=True)
     scheduler_thread.start()
-    logger.info("Scheduler started")
\ No newline at end of file
+    # Paging a large catalog can take a while, so it does not share the reminder loop
+    catalog_thread = threading.Thread(target=run_catalog_sync, name="catalog-sync", daemon=True)
+    catalog_thread.start()
+    logger.info("Scheduler started")
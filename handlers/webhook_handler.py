@@ -217,10 +217,11 @@
 import json
 from flask import Blueprint, request, jsonify
 from handlers.message_handler import handle_incoming_message
-from services.order_service import confirm_order
+from services.order_service import confirm_order, pending_order_brand
 from services.whatsapp_service import send_text_message
 from config.credentials import META_VERIFY_TOKEN
-from stateHandlers import redis_state
+from config.brand_registry import use_brand
+from stateHandlers.redis_state import redis_state
 from utils.logger import get_logger
 from handlers.reminder_handler import start_scheduler
 
@@ -228,12 +229,42 @@ logger = get_logger("webhook_handler")
 
 webhook_bp = Blueprint('webhook', __name__)
 
+def drop_duplicate_messages(data):
+    """Remove messages that were already processed (Meta redeliveries) from a webhook payload"""
+    message_ids = [
+        msg.get("id")
+        for entry in data.get("entry", [])
+        for change in entry.get("changes", [])
+        for msg in change.get("value", {}).get("messages", [])
+        if msg.get("id")
+    ]
+    if not message_ids:
+        return data
+    
+    new_ids = set(redis_state.claim_events("whatsapp", message_ids))
+    duplicates = len(set(message_ids)) - len(new_ids)
+    if duplicates:
+        logger.info("Skipping %s already processed message(s)", duplicates)
+    
+    for entry in data.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            if "messages" in value:
+                value["messages"] = [
+                    msg for msg in value["messages"]
+                    if not msg.get("id") or msg.get("id") in new_ids
+                ]
+    return data
+
 @webhook_bp.route("/webhook", methods=["POST"])
 def webhook():
     """Handle incoming webhook POST requests"""
     logger.info("Incoming POST request received.")
     data = request.get_json()
-    logger.debug(f"Data received: {data}")
+    logger.debug("Data received: %s", data)
+    
+    # Short-circuit redelivered messages before any state is touched
+    data = drop_duplicate_messages(data or {})
     
     # Process the incoming message
     status, code = handle_incoming_message(data)
@@ -263,7 +294,9 @@ def payment_success():
     order_id = request.args.get("order_id")
 
     if whatsapp_number and order_id:
-        confirm_order(whatsapp_number, order_id, "Pay Now")
+        # Confirm under the brand the order was placed with
+        with use_brand(pending_order_brand(order_id)):
+            confirm_order(whatsapp_number, order_id, "Pay Now")
         return "Payment confirmed", 200
     else:
         logger.error("Missing parameters in payment success callback")
@@ -315,18 +348,30 @@ def payment_success():
 def payment_made():
     """Handle Razorpay payment webhook when payment is completed"""
     logger.info("Razorpay webhook received.")
+    # Razorpay sends a unique id per event and reuses it on retries
+    event_id = request.headers.get("X-Razorpay-Event-Id")
     try:
         data = request.get_json() or {}
 
+        if event_id and not redis_state.claim_events("razorpay", [event_id]):
+            logger.info("Skipping already processed Razorpay event %s", event_id)
+            return "OK", 200
+
         if data.get("event") == "payment_link.paid":
             payment_data = data.get("payload", {}).get("payment_link", {}).get("entity", {})
             whatsapp_number = payment_data.get("customer", {}).get("contact")
             order_id = payment_data.get("reference_id")
 
             if whatsapp_number and order_id:
-                send_text_message(whatsapp_number, "✅ Your payment is confirmed! Your order is being processed.")
-                confirm_order(whatsapp_number, order_id, "Pay Now")
+                # Reply from the number of the brand the order was placed with
+                with use_brand(pending_order_brand(order_id)):
+                    send_text_message(whatsapp_number, "✅ Your payment is confirmed! Your order is being processed.")
+                    confirm_order(whatsapp_number, order_id, "Pay Now")
     except Exception as e:
         logger.error(f"Error processing Razorpay webhook: {e}")
+        # Release the claim and fail so Razorpay's retry is processed
+        if event_id:
+            redis_state.release_events("razorpay", [event_id])
+        return "Error", 500
 
     return "OK", 200
@@ -1,47 +1,154 @@
 # services/brand_service.py
-import json
 import os
-from config.settings import Settings
+import socket
+import threading
+import time
+import uuid
+
+from config.brand_registry import brand_registry
+from config.settings import BRAND_CONFIG_CHANNEL, BRAND_CONFIG_POLL_SECONDS
+from stateHandlers.redis_state import redis_state
+from utils.json_utils import dumps, loads
 from utils.logger import get_logger
 
 logger = get_logger("brand_service")
 
+RESUBSCRIBE_DELAY_SECONDS = 5
+
+
+class BrandConfigWatcher:
+    """Keeps the in-memory brand registry in step with config/brands/*.json.
+
+    A poll thread compares file mtimes/sizes every `poll_seconds` and reloads
+    when they change, then announces the digest of the new files on a Redis
+    channel. A listener thread reloads straight away on any announcement
+    whose digest differs from its own, and always on one without a digest
+    (publish_reload), instead of waiting for its next poll. Lookups
+    themselves never touch the disk.
+    """
+
+    def __init__(self, registry, redis_client, channel=BRAND_CONFIG_CHANNEL, poll_seconds=BRAND_CONFIG_POLL_SECONDS):
+        self.registry = registry
+        self.redis = redis_client
+        self.channel = channel
+        self.poll_seconds = poll_seconds
+        self.token = _new_token()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def start(self):
+        """Start the poll and listener threads (idempotent; restarted in a forked child)"""
+        with self._start_lock:
+            # Threads inherited through fork() are reported as not alive
+            if any(thread.is_alive() for thread in self._threads):
+                return
+            self._threads = [
+                threading.Thread(target=target, name=name, daemon=True)
+                for target, name in ((self._poll, "brand-config-poll"), (self._listen, "brand-config-listen"))
+            ]
+            for thread in self._threads:
+                thread.start()
+            logger.info("Watching brand config (version %s)", self.registry.version)
+
+    def _after_fork_in_child(self):
+        # The child inherits our state but none of our threads, and needs its
+        # own token so it does not ignore the parent's announcements
+        self.token = _new_token()
+        self._start_lock = threading.Lock()
+        if self._threads:
+            self.start()
+
+    def check(self):
+        """Reload if the brand files changed and tell the other workers; returns True if reloaded"""
+        try:
+            if not self.registry.reload_if_changed():
+                return False
+        except Exception as e:
+            logger.error(f"Error reloading brand config: {str(e)}")
+            return False
+        publish_reload(self.redis, self.channel, self.token, self.registry.digest)
+        return True
+
+    def _poll(self):
+        while True:
+            self.check()
+            time.sleep(self.poll_seconds)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self.handle_notice(message.get("data"))
+            except Exception as e:
+                logger.error(f"Brand config subscription failed, retrying: {str(e)}")
+            time.sleep(RESUBSCRIBE_DELAY_SECONDS)
+
+    def handle_notice(self, data):
+        """Reload for an announcement from another process; returns True if reloaded"""
+        try:
+            notice = loads(data)
+        except Exception:
+            notice = None
+        if not isinstance(notice, dict):
+            # A bare sender name (the older format) asks for an unconditional reload
+            notice = {"sender": data.decode('utf-8') if isinstance(data, bytes) else data}
+        if notice.get("sender") == self.token:
+            return False
+        # Processes that already hold the announced files skip the reload, so
+        # one edit does not make every process reload (and drop its caches)
+        if notice.get("digest") and notice["digest"] == self.registry.digest:
+            return False
+        try:
+            self.registry.load()
+        except Exception as e:
+            logger.error(f"Error reloading brand config: {str(e)}")
+            return False
+        logger.info("Brand config reloaded after notice from %s", notice.get("sender"))
+        return True
+
+
+def _new_token():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def publish_reload(redis_client=None, channel=BRAND_CONFIG_CHANNEL, sender="admin", digest=None):
+    """Make every worker reload the brand files now (e.g. after deploying new ones).
+
+    Without a `digest` every worker reloads; with one, only workers whose
+    files hash differently do.
+    """
+    try:
+        (redis_client or redis_state.redis).publish(channel, dumps({"sender": sender, "digest": digest}))
+        return True
+    except Exception as e:
+        logger.error(f"Error publishing brand config reload: {str(e)}")
+        return False
+
+
+brand_config_watcher = BrandConfigWatcher(brand_registry, redis_state.redis)
+
+
 class BrandService:
-    def __init__(self):
-        self.settings = Settings()
-    
+    """Brand lookups served from the in-memory registry"""
+
     def get_brand_config(self, brand_id: str) -> dict:
-        """Load brand configuration from file system"""
-        config_path = os.path.join(
-            self.settings.BRAND_CONFIG_PATH, 
-            f"{brand_id}.json"
-        )
-        
-        try:
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-            logger.info(f"Loaded config for brand: {brand_id}")
-            return config
-        except FileNotFoundError:
+        """Configuration of a brand, as last loaded from its JSON file"""
+        brand = brand_registry.get(brand_id)
+        if not brand:
             logger.error(f"Brand config not found: {brand_id}")
             raise ValueError("Invalid brand selection")
-        except json.JSONDecodeError:
-            logger.error(f"Invalid JSON in brand config: {brand_id}")
-            raise ValueError("Brand configuration error")
-    
+        return dict(brand.config)
+
     def get_available_brands(self) -> list:
-        """List all available brands from config directory"""
-        brands = []
-        for filename in os.listdir(self.settings.BRAND_CONFIG_PATH):
-            if filename.endswith(".json"):
-                brand_id = filename[:-5]
-                try:
-                    config = self.get_brand_config(brand_id)
-                    brands.append({
-                        "id": brand_id,
-                        "name": config.get("name", brand_id),
-                        "logo": config.get("logo_url")
-                    })
-                except:
-                    continue
-        return brands
\ No newline at end of file
+        """List all available brands"""
+        return [
+            {
+                "id": brand.brand_id,
+                "name": brand.name,
+                "logo": brand.config.get("logo_url")
+            }
+            for brand in brand_registry.brands()
+        ]
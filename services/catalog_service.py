@@ -0,0 +1,201 @@
+# services/catalog_service.py
+import json
+import re
+import threading
+import time
+
+from config.brand_registry import get_current_brand
+from config.settings import CATALOG_REFRESH_SECONDS, CATALOG_SYNC_INTERVAL_SECONDS, CATALOG_SYNC_PAGE_SIZE
+from stateHandlers.redis_state import redis_state
+from utils.http_client import bearer_headers, get_json
+from utils.logger import get_logger
+from utils.price_utils import to_amount
+
+logger = get_logger("catalog_service")
+
+GRAPH_API_URL = "https://graph.facebook.com/v23.0"
+PRODUCT_FIELDS = "retailer_id,name,price,availability"
+UNAVAILABLE = ("out of stock", "discontinued")
+
+
+def _products_key(brand_id):
+    return f"catalog:{brand_id}:products"
+
+
+def _version_key(brand_id):
+    return f"catalog:{brand_id}:version"
+
+
+def parse_price(value):
+    """Graph API prices are display strings such as "₹1,200.00"; returns an amount (see to_amount) or None"""
+    if isinstance(value, (int, float)):
+        return to_amount(value)
+    match = re.search(r"\d[\d,]*(?:\.\d+)?", str(value or ""))
+    return to_amount(match.group().replace(",", "")) if match else None
+
+
+class GraphCatalogClient:
+    """Pages through the products of a Meta Commerce catalog"""
+
+    def __init__(self, catalog_id, access_token, page_size=CATALOG_SYNC_PAGE_SIZE):
+        self.catalog_id = catalog_id
+        self.access_token = access_token
+        self.page_size = page_size
+
+    def iter_products(self):
+        url = f"{GRAPH_API_URL}/{self.catalog_id}/products"
+        params = {"fields": PRODUCT_FIELDS, "limit": self.page_size}
+        while url:
+            response = get_json("graph", url, params=params, headers=bearer_headers(self.access_token))
+            response.raise_for_status()
+            page = response.json()
+            yield from page.get("data", [])
+            # The next link already carries the fields, limit and cursor
+            url = page.get("paging", {}).get("next")
+            params = None
+
+
+class FakeCatalogClient:
+    """In-memory stand-in for GraphCatalogClient (local runs and tests)"""
+
+    def __init__(self, products, page_size=CATALOG_SYNC_PAGE_SIZE):
+        self.products = list(products)
+        self.page_size = page_size
+        self.pages_served = 0
+
+    def iter_products(self):
+        for start in range(0, len(self.products), self.page_size):
+            self.pages_served += 1
+            yield from self.products[start:start + self.page_size]
+
+
+def client_for(brand):
+    """Catalog client for a brand, or None if it has no catalog configured"""
+    if not brand.catalog_id or not brand.access_token:
+        return None
+    return GraphCatalogClient(brand.catalog_id, brand.access_token)
+
+
+def sync_catalog(brand, client=None):
+    """Pull the brand's full Commerce catalog and publish it as the synced copy.
+
+    The copy is built under a temporary key and renamed into place, so
+    readers see either the old or the new catalog, never a partial one.
+    Returns the number of products stored, or None if the sync failed.
+    """
+    client = client or client_for(brand)
+    if client is None:
+        return None
+
+    try:
+        products = {}
+        for product in client.iter_products():
+            retailer_id = str(product.get("retailer_id") or "").lower()
+            price = parse_price(product.get("price"))
+            if not retailer_id or price is None:
+                continue
+            products[retailer_id] = json.dumps({
+                "name": product.get("name", retailer_id),
+                "price": price,
+                "available": str(product.get("availability", "in stock")).lower() not in UNAVAILABLE,
+            })
+    except Exception as e:
+        logger.error(f"Catalog sync failed for {brand.brand_id}: {str(e)}")
+        return None
+
+    if not products:
+        # An empty catalog is far more likely an API problem than a real catalog
+        logger.warning("Catalog sync for %s returned no products, keeping the previous copy", brand.brand_id)
+        return None
+
+    try:
+        staging_key = f"{_products_key(brand.brand_id)}:syncing"
+        pipe = redis_state.redis.pipeline()
+        pipe.delete(staging_key)
+        pipe.hset(staging_key, mapping=products)
+        pipe.rename(staging_key, _products_key(brand.brand_id))
+        pipe.set(_version_key(brand.brand_id), repr(time.time()))
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Error storing synced catalog for {brand.brand_id}: {str(e)}")
+        return None
+
+    logger.info("Synced %s catalog products for %s", len(products), brand.brand_id)
+    return len(products)
+
+
+def sync_catalog_if_due(brand, interval=CATALOG_SYNC_INTERVAL_SECONDS):
+    """Sync the brand's catalog if the stored copy is older than `interval`"""
+    try:
+        version = redis_state.redis.get(_version_key(brand.brand_id))
+        if version is not None and time.time() - float(version) < interval:
+            return None
+    except Exception as e:
+        logger.error(f"Error reading catalog version for {brand.brand_id}: {str(e)}")
+        return None
+    return sync_catalog(brand)
+
+
+class CatalogIndex:
+    """Per-process copy of each brand's synced catalog, keyed by retailer id.
+
+    Lookups are plain dict reads. At most every `refresh_seconds` a lookup
+    also checks the synced version in Redis and reloads the copy if the
+    sync job has published a newer one.
+    """
+
+    def __init__(self, redis_client, refresh_seconds=CATALOG_REFRESH_SECONDS):
+        self.redis = redis_client
+        self.refresh_seconds = refresh_seconds
+        self._products = {}
+        self._versions = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+
+    def products(self, brand_id):
+        """Synced products of a brand (retailer id -> {name, price, available})"""
+        if time.monotonic() - self._checked_at.get(brand_id, float("-inf")) >= self.refresh_seconds:
+            self.refresh(brand_id)
+        return self._products.get(brand_id, {})
+
+    def refresh(self, brand_id):
+        with self._lock:
+            self._checked_at[brand_id] = time.monotonic()
+            try:
+                version = self.redis.get(_version_key(brand_id))
+                if version is None or version == self._versions.get(brand_id):
+                    return
+                raw = self.redis.hgetall(_products_key(brand_id))
+            except Exception as e:
+                # Keep serving the copy we have
+                logger.error(f"Error refreshing catalog for {brand_id}: {str(e)}")
+                return
+
+            products = {}
+            for retailer_id, value in raw.items():
+                if isinstance(retailer_id, bytes):
+                    retailer_id = retailer_id.decode('utf-8')
+                products[retailer_id] = json.loads(value)
+            self._products[brand_id] = products
+            self._versions[brand_id] = version
+            logger.info("Loaded %s synced catalog products for %s", len(products), brand_id)
+
+
+catalog_index = CatalogIndex(redis_state.redis)
+
+
+def lookup_product(retailer_id, brand=None):
+    """Current brand's product as {name, price, available}, or None if unknown.
+
+    The synced Commerce catalog wins; products it does not (yet) have fall
+    back to the brand's JSON catalog.
+    """
+    brand = brand or get_current_brand()
+    retailer_id = str(retailer_id).lower()
+    product = catalog_index.products(brand.brand_id).get(retailer_id)
+    if product:
+        return product
+    product = brand.catalog.get(retailer_id)
+    if product:
+        return {"name": product["name"], "price": to_amount(product["price"]), "available": True}
+    return None
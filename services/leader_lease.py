@@ -0,0 +1,87 @@
+# services/leader_lease.py
+import os
+import socket
+import threading
+import uuid
+
+from config.settings import SCHEDULER_LEASE_SECONDS
+from utils.logger import get_logger
+
+logger = get_logger("leader_lease")
+
+# Extend the lease only if we still hold it.
+# KEYS[1] lease. ARGV[1] owner token, ARGV[2] ttl in ms. Returns 1 if renewed.
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Delete the lease only if we still hold it. KEYS[1] lease, ARGV[1] owner token.
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderLease:
+    """Redis lease that elects one leader among all processes sharing `key`.
+
+    A heartbeat thread renews the lease every third of its lifetime while
+    we hold it and otherwise tries to take it over, so when the leader dies
+    another process becomes leader within one lease period.
+    """
+
+    def __init__(self, redis_client, key, lease_seconds=SCHEDULER_LEASE_SECONDS):
+        self.redis = redis_client
+        self.key = key
+        self.lease_ms = int(lease_seconds * 1000)
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._renew_script = self.redis.register_script(RENEW_LEASE_SCRIPT)
+        self._release_script = self.redis.register_script(RELEASE_LEASE_SCRIPT)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def heartbeat(self):
+        """Renew the lease if we hold it, otherwise try to acquire it; returns leadership"""
+        try:
+            if self.is_leader and self._renew_script(keys=[self.key], args=[self.token, self.lease_ms]):
+                return True
+            acquired = bool(self.redis.set(self.key, self.token, nx=True, px=self.lease_ms))
+            if acquired != self.is_leader:
+                logger.info("%s %s leadership of %s", self.token, "acquired" if acquired else "lost", self.key)
+            self.is_leader = acquired
+        except Exception as e:
+            logger.error(f"Lease heartbeat for {self.key} failed: {str(e)}")
+            # Without Redis we cannot prove we still hold the lease
+            self.is_leader = False
+        return self.is_leader
+
+    def start(self):
+        """Start the heartbeat thread (idempotent)"""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="leader-lease", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop heartbeating and hand the lease over immediately"""
+        self._stopping.set()
+        if self.is_leader:
+            self.is_leader = False
+            try:
+                self._release_script(keys=[self.key], args=[self.token])
+            except Exception as e:
+                logger.error(f"Failed to release lease {self.key}: {str(e)}")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.heartbeat()
+            self._stopping.wait(self.lease_ms / 3000)
@@ -0,0 +1,154 @@
+# services/message_templates.py
+from config.brand_registry import get_current_brand
+from utils.price_utils import to_amount
+
+# Fixed message texts
+CATALOG_TEXT = (
+    "🌟 *EXPLORE OUR PRODUCTS*\n\n"
+    "Discover our catalog and add items you love to your cart.\n\n"
+    "👇 Tap the button below to start shopping!"
+)
+EMPTY_CART_TEXT = (
+    "🛒 *YOUR CART IS EMPTY*\n\n"
+    "Browse our catalog to add items to your cart."
+)
+DELIVERY_OPTIONS_TEXT = (
+    "📍 *DELIVERY OPTIONS*\n\n"
+    "How would you like to receive your order?"
+)
+LOCATION_REQUEST_TEXT = (
+    "📍 *SHARE YOUR LOCATION*\n\n"
+    "Please share your current location so we can check if we deliver to your area.\n\n"
+    "We deliver within 4km radius of our branches."
+)
+PAYMENT_OPTIONS_TEXT = (
+    "💳 *PAYMENT OPTIONS*\n\n"
+    "How would you like to pay for your order?"
+)
+PAYMENT_PROCESSING_TEXT = (
+    "🔄 *GENERATING PAYMENT LINK*\n\n"
+    "Please wait a moment while we create your secure payment link..."
+)
+ADDRESS_REQUEST_TEXT = (
+    "📍 *DELIVERY ADDRESS*\n\n"
+    "Please enter your full delivery address:\n\n"
+    "Example:\n"
+    "House No. 123, Street Name\n"
+    "Area, Landmark\n"
+    "City, PIN Code"
+)
+CART_REMINDER_HEADER = (
+    "⏰ *CART REMINDER*\n\n"
+    "You have items in your cart. Would you like to complete your order?\n\n"
+)
+
+
+def _buttons(*buttons):
+    return {
+        "buttons": [
+            {"type": "reply", "reply": {"id": button_id, "title": title}}
+            for button_id, title in buttons
+        ]
+    }
+
+
+# Button sets shared by every brand
+CART_ACTIONS = _buttons(
+    ("CONTINUE_SHOPPING", "🛍️ Continue"),
+    ("PROCEED_TO_CHECKOUT", "✅ Checkout"),
+    ("CLEAR_CART", "🗑️ Clear Cart"),
+)
+CART_REMINDER_ACTIONS = _buttons(("PROCEED_TO_CHECKOUT", "🛍️ Order Now"))
+
+
+def interactive_payload(to, interactive):
+    return {
+        "messaging_product": "whatsapp",
+        "recipient_type": "individual",
+        "to": to,
+        "type": "interactive",
+        "interactive": interactive,
+    }
+
+
+def text_payload(to, body):
+    return {
+        "messaging_product": "whatsapp",
+        "to": to,
+        "type": "text",
+        "text": {"preview_url": False, "body": body},
+    }
+
+
+def button_message(body, action):
+    """Interactive button message body around a prebuilt action"""
+    return {"type": "button", "body": {"text": body}, "action": action}
+
+
+def item_lines(items, with_totals=True):
+    """One "• name xqty[ = ₹total]" line per item, newline terminated"""
+    if with_totals:
+        lines = [f"• {item['name']} x{item['quantity']} = ₹{to_amount(item['quantity'] * item['price'])}\n" for item in items]
+    else:
+        lines = [f"• {item['name']} x{item['quantity']}\n" for item in items]
+    return "".join(lines)
+
+
+class MessageTemplates:
+    """A brand's fixed interactive messages, built once when the brand is loaded.
+
+    The dicts are shared by every payload built from them (only the
+    recipient is filled in per send), so they must never be mutated.
+    """
+
+    def __init__(self, brand):
+        self.brand = brand
+        self.main_menu = button_message(brand.greeting_message, _buttons(("ORDER_NOW", "🛍️ Order Now")))
+        self.catalog = {
+            "type": "catalog_message",
+            "body": {"text": CATALOG_TEXT},
+            "action": {"name": "catalog_message", "catalog_id": brand.catalog_id},
+        }
+        self.delivery_options = button_message(DELIVERY_OPTIONS_TEXT, _buttons(("DELIVERY", "🚚 Home Delivery")))
+        self.payment_options = button_message(PAYMENT_OPTIONS_TEXT, _buttons(
+            ("PAY_NOW", "💳 Pay Now"),
+            ("CASH_ON_DELIVERY", "💵 Cash on Delivery"),
+        ))
+        self.branch_list = {
+            "type": "list",
+            "header": {"type": "text", "text": "🏪 SELECT A BRANCH"},
+            "body": {"text": "Please select a branch for pickup:"},
+            "footer": {"text": "Tap to select your preferred branch"},
+            "action": {
+                "button": "Select Branch",
+                "sections": [{
+                    "title": "Select Branch",
+                    "rows": [
+                        {"id": branch, "title": branch, "description": ""}
+                        for branch in brand.branch_coordinates.keys()
+                    ]
+                }]
+            }
+        }
+        bulk_contact = brand.bulk_contact
+        self.bulk_order_text = (
+            "📞 *BULK ORDER INFORMATION*\n\n"
+            "For bulk orders (more than 10 items), please contact us directly:\n\n"
+            f"📱 Phone: {bulk_contact.get('phone')}\n"
+            f"✉️ Email: {bulk_contact.get('email')}\n\n"
+            "Our sales team will assist you with special pricing and delivery options."
+        )
+        self.thank_you_text = f"Your order will be processed shortly. Thank you for shopping with {brand.name}!"
+
+
+# Templates per brand id, rebuilt when a config reload replaces the brand's context
+_templates = {}
+
+
+def get_templates(brand=None):
+    """Templates of `brand` (default: the current brand)"""
+    brand = brand or get_current_brand()
+    templates = _templates.get(brand.brand_id)
+    if templates is None or templates.brand is not brand:
+        templates = _templates[brand.brand_id] = MessageTemplates(brand)
+    return templates
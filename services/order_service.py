@@ -4,9 +4,13 @@ import uuid
 import json
 from datetime import datetime
 from utils.logger import get_logger
+from utils.price_utils import to_amount
 from utils.csv_utils import log_order
-from config.settings import BRANCH_CONTACTS, ORDER_STATUS, BRANCH_COORDINATES, DELIVERY_RADIUS_KM, PRODUCT_CATALOG
-from stateHandlers.redis_state import redis_state
+from utils.location_utils import is_within_delivery_radius
+from utils.payment_utils import generate_payment_link_async
+from config.brand_registry import get_current_brand
+from config.settings import ORDER_STATUS, DELIVERY_RADIUS_KM
+from stateHandlers.redis_state import redis_state, allowed_previous_statuses
 from services.whatsapp_service import (
     send_order_confirmation,
     send_order_status_update,
@@ -25,51 +29,13 @@ def generate_order_id():
     """Generate a unique order ID"""
     return f"ORD{get_current_ist().strftime('%Y%m%d')}{str(uuid.uuid4())[:4].upper()}"
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points in km using Haversine formula"""
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    r = 6371  # Radius of earth in kilometers
-    return c * r
-
-def find_nearest_branch(latitude, longitude):
-    """Find the nearest branch based on coordinates"""
-    nearest_branch = None
-    min_distance = float('inf')
-    
-    for branch, coords in BRANCH_COORDINATES.items():
-        distance = calculate_distance(
-            latitude, longitude, coords[0], coords[1]
-        )
-        if distance < min_distance:
-            min_distance = distance
-            nearest_branch = branch
-    
-    return nearest_branch, min_distance
-
-def is_within_delivery_radius(latitude, longitude):
-    """Check if location is within delivery radius of any branch"""
-    nearest_branch, distance = find_nearest_branch(latitude, longitude)
-    return distance <= DELIVERY_RADIUS_KM, nearest_branch, distance
-
 def process_payment(user_id, order_id):
-    """Process payment for an order"""
-    logger.info(f"Processing payment for user {user_id}, order {order_id}")
+    """Start payment for an order; the link is sent once it has been generated"""
+    logger.info("Processing payment for user %s, order %s", user_id, order_id)
     
     # Send "payment link is generating" message
     send_payment_processing(user_id)
     
-    # In a real implementation, this would call Razorpay API
-    # For this example, we'll simulate a delay
-    import time
-    time.sleep(1)  # Simulate API delay
-    
      # Get cart
     cart = redis_state.get_cart(user_id)
     
@@ -87,10 +53,23 @@ def process_payment(user_id, order_id):
         discount_amount = (original_total * discount_percentage) / 100
         discounted_total = original_total - discount_amount
     
-    # Send payment link
-    send_payment_link(user_id, order_id,discounted_total)
+    # Generate the link in the background and send it as soon as it is ready
+    generate_payment_link_async(
+        user_id,
+        discounted_total,
+        order_id,
+        on_success=send_payment_link,
+        on_failure=payment_link_failed,
+    )
     
-    return True, "Payment link generated successfully"
+    return True, "Payment link is being generated"
+
+def payment_link_failed(user_id, order_id):
+    """Tell the user the payment link could not be created and drop the pending order"""
+    logger.error(f"Payment link generation failed for user {user_id}, order {order_id}")
+    send_text_message(user_id, "❌ Failed to generate payment link. Please try again.")
+    redis_state.delete_pending_order(order_id)
+    redis_state.clear_user_state(user_id)
 
 # def update_order_status_from_command(command):
 #     """Process order status update commands"""
@@ -142,7 +121,7 @@ def process_payment(user_id, order_id):
 
 def update_order_status_from_command(command):
     """Process order status update commands from staff"""
-    logger.info(f"Processing order status command: {command}")
+    logger.info("Processing order status command: %s", command)
     
     # Normalize command
     command = command.lower().strip()
@@ -165,7 +144,7 @@ def update_order_status_from_command(command):
         logger.warning(f"Invalid status update command: {command}")
         return False, "Invalid command format. Use: [status] [order_id]\n\nExample: 'ready FCT20250808E8BF'"
     
-    logger.info(f"Attempting to update order {order_id} to status: {status}")
+    logger.info("Attempting to update order %s to status: %s", order_id, status)
     
     # Get order
     order = redis_state.get_order(order_id)
@@ -173,15 +152,22 @@ def update_order_status_from_command(command):
         logger.warning(f"Order {order_id} not found for status update")
         return False, f"Order {order_id} not found. Please check the order ID."
     
+    # A command redelivered after a failed attempt finds the status already
+    # applied; it still sends the (discarded) customer update
+    already_applied = order["status"] == status
+    if not already_applied and order["status"] not in allowed_previous_statuses(status):
+        logger.warning(f"Order {order_id} cannot move from {order['status']} to {status}")
+        return False, f"⚠️ Order #{order_id} is already *{order['status']}* and cannot be marked *{status}*."
+    
     # Update order status
-    if redis_state.update_order_status(order_id, status):
+    if already_applied or redis_state.update_order_status(order_id, status):
         # Send status update to customer
         send_order_status_update(order["user_id"], order_id, status)
         
         # Special handling for delivered status
         if status == ORDER_STATUS["DELIVERED"]:
             redis_state.archive_order(order_id)
-            logger.info(f"Order {order_id} archived after delivery")
+            logger.info("Order %s archived after delivery", order_id)
             
         return True, f"✅ Order #{order_id} status updated to *{status}*."
     else:
@@ -189,7 +175,7 @@ def update_order_status_from_command(command):
 
 def send_final_order_confirmation(to, order_id, address,branch_number,discount_percentage,discount_amount):
     """Send final order confirmation with address details"""
-    logger.info(f"Sending final order confirmation to {to} for order {order_id}")
+    logger.info("Sending final order confirmation to %s for order %s", to, order_id)
     
     # Get order
     order = redis_state.get_order(order_id)
@@ -208,7 +194,7 @@ def send_final_order_confirmation(to, order_id, address,branch_number,discount_p
     
     message += "ORDER ITEMS:\n"
     for item in order["items"]:
-        item_total = item["quantity"] * item["price"]
+        item_total = to_amount(item["quantity"] * item["price"])
         message += f"• {item['name']} x{item['quantity']} = ₹{item_total}\n"
     if discount_percentage > 0:
         message += f"• | {discount_percentage:.2f}% Discount Applied: -₹{math.ceil(discount_amount)}"
@@ -220,7 +206,7 @@ def send_final_order_confirmation(to, order_id, address,branch_number,discount_p
 
 def place_order(user_id, delivery_type, address=None, payment_method="Cash on Delivery"):
     """Place an order from user's cart - handles everything for COD orders"""
-    logger.info(f"Placing order for user {user_id} with delivery type {delivery_type} and payment method {payment_method}")
+    logger.info("Placing order for user %s with delivery type %s and payment method %s", user_id, delivery_type, payment_method)
     
     # Get cart
     cart = redis_state.get_cart(user_id)
@@ -230,7 +216,7 @@ def place_order(user_id, delivery_type, address=None, payment_method="Cash on De
     
      # Get brand-specific discount
     discount_percentage = redis_state.get_brand_discount()
-    logger.info(f"Applying discount of {discount_percentage}% to order for {user_id}")
+    logger.info("Applying discount of %s%% to order for %s", discount_percentage, user_id)
     
     # Generate order ID
     order_id = generate_order_id()
@@ -296,11 +282,8 @@ def place_order(user_id, delivery_type, address=None, payment_method="Cash on De
         logger.error(f"Failed to save order {order_id} to Redis")
         return False, "Failed to save order. Please try again."
     
-    # Log order to CSV
-    log_order(order_data)
-    
-    # Schedule cart reminder (won't apply since cart is cleared, but good for reference)
-    redis_state.schedule_cart_reminder(user_id, order_id)
+    # Log order to CSV once the order is committed with the rest of the request
+    redis_state.after_commit(lambda: log_order(order_data))
     
     # Send order alert to branch
     send_order_alert(
@@ -316,13 +299,22 @@ def place_order(user_id, delivery_type, address=None, payment_method="Cash on De
     )
     
     # Send order confirmation to customer
-    send_final_order_confirmation(user_id, order_id, address,BRANCH_CONTACTS[branch][0],discount_percentage,discount_amount)
+    send_final_order_confirmation(user_id, order_id, address,get_current_brand().branch_contacts[branch][0],discount_percentage,discount_amount)
     
     return True, f"Order #{order_id} placed successfully!"
 
+def pending_order_brand(order_id):
+    """Brand a pending online order was placed with, or None"""
+    pending_order_data = redis_state.redis.get(f"pending_order:{order_id}")
+    if not pending_order_data:
+        return None
+    if isinstance(pending_order_data, bytes):
+        pending_order_data = pending_order_data.decode('utf-8')
+    return json.loads(pending_order_data).get("brand_id")
+
 def confirm_order(whatsapp_number, order_id, payment_method):
     """Confirm order after payment - only for online payments"""
-    logger.info(f"Confirming order {order_id} for {whatsapp_number}")
+    logger.info("Confirming order %s for %s", order_id, whatsapp_number)
     
     # Get pending order
     pending_order_data = redis_state.redis.get(f"pending_order:{order_id}")
@@ -348,7 +340,7 @@ def confirm_order(whatsapp_number, order_id, payment_method):
         
         if success:
             # Delete pending order
-            redis_state.redis.delete(f"pending_order:{order_id}")
+            redis_state.delete_pending_order(order_id)
             
             # CRITICAL FIX: Clear the cart and reset state
             redis_state.clear_cart(user_id)
@@ -0,0 +1,353 @@
+# services/outbound_queue.py
+import os
+import queue
+import threading
+import time
+import uuid
+
+from config.settings import OUTBOUND_BUFFER_SIZE, OUTBOUND_MAX_ATTEMPTS, OUTBOUND_RETRY_BACKOFF, OUTBOUND_WORKERS
+from utils.json_utils import dumps, loads
+from utils.logger import get_logger
+
+logger = get_logger("outbound_queue")
+
+LOCK_TTL_SECONDS = 60
+READY_POLL_SECONDS = 1
+SWEEP_INTERVAL_SECONDS = 30
+BUFFER_RETRY_SECONDS = 1
+
+# Release a recipient lock only if we still own it and nothing is left to send.
+# KEYS[1] lock, KEYS[2] recipient queue. ARGV[1] owner token.
+# Returns 1 when the caller should stop draining, 0 when more jobs arrived.
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 1
+end
+if redis.call('LLEN', KEYS[2]) == 0 then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+return 0
+"""
+
+# Extend a recipient lock only if we still own it.
+# KEYS[1] lock. ARGV[1] owner token, ARGV[2] ttl in seconds. Returns 1 if renewed.
+RENEW_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Forget a registered recipient whose queue is empty.
+# KEYS[1] recipient registry, KEYS[2] recipient queue. ARGV[1] recipient.
+FORGET_RECIPIENT_SCRIPT = """
+if redis.call('LLEN', KEYS[2]) == 0 then
+    return redis.call('SREM', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+SENT = "sent"
+RETRY = "retry"
+FAILED = "failed"
+
+
+class LockLost(Exception):
+    """The recipient lock expired or was taken over while a job was being sent"""
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(_decode(item))
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _classify(response):
+    """Map a Graph API response (or None on exception) to SENT / RETRY / FAILED"""
+    if response is None:
+        return RETRY
+    if response.status_code == 200:
+        return SENT
+    if response.status_code == 429 or response.status_code >= 500:
+        return RETRY
+    return FAILED
+
+
+class OutboundQueue:
+    """Durable Redis-backed queue of outbound WhatsApp payloads.
+
+    Each recipient has its own FIFO list, and a worker must hold the
+    recipient's lock to drain it, so messages to one user are delivered in
+    order while different users are served in parallel by the worker pool.
+    A job stays at the head of its list until it is sent or dead-lettered.
+    The lock is renewed before every send attempt, and a sweeper re-readies
+    registered recipients whose list is non-empty but unlocked, so a crashed
+    worker's jobs are picked up again once its lock expires.
+
+    While Redis is unreachable, new jobs wait in a bounded in-process buffer
+    that a background thread pushes to Redis once it is back; enqueueing
+    never blocks the caller on sends or backoff.
+    """
+
+    def __init__(self, redis_client, deliver, namespace, workers=OUTBOUND_WORKERS,
+                 max_attempts=OUTBOUND_MAX_ATTEMPTS, retry_backoff=OUTBOUND_RETRY_BACKOFF):
+        self.redis = redis_client
+        self.deliver = deliver
+        self.namespace = namespace
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._release_lock_script = self.redis.register_script(RELEASE_LOCK_SCRIPT)
+        self._renew_lock_script = self.redis.register_script(RENEW_LOCK_SCRIPT)
+        self._forget_recipient_script = self.redis.register_script(FORGET_RECIPIENT_SCRIPT)
+        self._buffer = queue.Queue(maxsize=OUTBOUND_BUFFER_SIZE)
+        self._threads = []
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _queue_key(self, recipient):
+        return f"{self.namespace}:to:{recipient}"
+
+    def _lock_key(self, recipient):
+        return f"{self.namespace}:lock:{recipient}"
+
+    @property
+    def ready_key(self):
+        return f"{self.namespace}:ready"
+
+    @property
+    def dead_letter_key(self):
+        return f"{self.namespace}:dead"
+
+    @property
+    def sweep_key(self):
+        return f"{self.namespace}:sweep"
+
+    @property
+    def recipients_key(self):
+        """Set of recipients that may have queued jobs, walked by the sweeper"""
+        return f"{self.namespace}:recipients"
+
+    def enqueue(self, recipient, payload, fallback=None, context=None):
+        """Queue `payload` for `recipient`; `fallback` is sent instead if it is rejected.
+
+        `context` is stored with the job and handed back to `deliver` as its
+        second argument (e.g. which brand's number to send from).
+        """
+        return self.enqueue_many([(recipient, payload)], fallback=fallback, context=context)[0]
+
+    def enqueue_many(self, messages, fallback=None, context=None):
+        """Queue (recipient, payload) pairs in one round trip; returns their job ids in order"""
+        now = time.time()
+        jobs = [
+            {
+                "id": uuid.uuid4().hex,
+                "to": recipient,
+                "payload": payload,
+                "fallback": fallback,
+                "context": context,
+                "queued_at": now,
+            }
+            for recipient, payload in messages
+        ]
+        self.start()
+        try:
+            self._push(jobs)
+        except Exception as e:
+            # Keep the request fast: park the jobs until Redis is back
+            logger.error(f"Failed to queue {len(jobs)} messages, buffering them: {str(e)}")
+            return [job["id"] if self._buffer_job(job) else None for job in jobs]
+        return [job["id"] for job in jobs]
+
+    def _push(self, jobs):
+        pipe = self.redis.pipeline()
+        for job in jobs:
+            pipe.rpush(self._queue_key(job["to"]), dumps(job))
+            pipe.sadd(self.recipients_key, job["to"])
+            pipe.rpush(self.ready_key, job["to"])
+        pipe.execute()
+
+    def _buffer_job(self, job):
+        try:
+            self._buffer.put_nowait(job)
+            return True
+        except queue.Full:
+            logger.error(f"Outbound buffer full, dropping message {job['id']} to {job['to']}")
+            return False
+
+    def _running(self):
+        # Threads inherited through fork() are reported as not alive
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        """Start the worker pool (idempotent; restarted in a forked child)"""
+        if self._running():
+            return
+        with self._start_lock:
+            if self._running():
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f"outbound-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            self._threads.append(threading.Thread(target=self._sweep_loop, name="outbound-sweeper", daemon=True))
+            self._threads.append(threading.Thread(target=self._drain_buffer, name="outbound-buffer", daemon=True))
+            for thread in self._threads:
+                thread.start()
+            self._started = True
+            logger.info("Started %s outbound workers for %s", self.workers, self.namespace)
+
+    def _after_fork_in_child(self):
+        # The child inherits our state but none of our threads (or a lock
+        # another thread may have held), e.g. under gunicorn --preload
+        self._start_lock = threading.Lock()
+        if self._started:
+            self.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                item = self.redis.blpop(self.ready_key, timeout=READY_POLL_SECONDS)
+                if item:
+                    self._drain(_decode(item[1]))
+            except Exception as e:
+                logger.error(f"Outbound worker error: {str(e)}")
+                time.sleep(READY_POLL_SECONDS)
+
+    def _drain_buffer(self):
+        """Push buffered jobs to Redis, in order, once it is reachable again"""
+        while not self._stopping.is_set():
+            try:
+                job = self._buffer.get(timeout=READY_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            while not self._stopping.is_set():
+                try:
+                    self._push([job])
+                    break
+                except Exception as e:
+                    logger.warning(f"Redis still unavailable for buffered message {job['id']}: {str(e)}")
+                    time.sleep(BUFFER_RETRY_SECONDS)
+
+    def _sweep_loop(self):
+        while not self._stopping.wait(SWEEP_INTERVAL_SECONDS):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Outbound sweep failed: {str(e)}")
+
+    def sweep(self):
+        """Re-ready recipients with queued jobs and no live lock (their worker died); returns how many"""
+        # One sweep per interval across all processes
+        if not self.redis.set(self.sweep_key, 1, nx=True, ex=SWEEP_INTERVAL_SECONDS):
+            return 0
+        stranded = []
+        for recipients in _batches(self.redis.sscan_iter(self.recipients_key, count=500), 500):
+            pipe = self.redis.pipeline(transaction=False)
+            for recipient in recipients:
+                pipe.llen(self._queue_key(recipient))
+                pipe.exists(self._lock_key(recipient))
+            results = pipe.execute()
+            for i, recipient in enumerate(recipients):
+                queued, locked = results[2 * i], results[2 * i + 1]
+                if not queued:
+                    self._forget_recipient_script(keys=[self.recipients_key, self._queue_key(recipient)], args=[recipient])
+                elif not locked:
+                    stranded.append(recipient)
+        if stranded:
+            self.redis.rpush(self.ready_key, *stranded)
+            logger.warning("Re-readied %s stranded outbound recipients", len(stranded))
+        return len(stranded)
+
+    def _renew_lock(self, lock_key, token):
+        return bool(self._renew_lock_script(keys=[lock_key], args=[token, LOCK_TTL_SECONDS]))
+
+    def _drain(self, recipient):
+        """Send every queued job for `recipient`, in order, while holding its lock"""
+        lock_key = self._lock_key(recipient)
+        queue_key = self._queue_key(recipient)
+        token = uuid.uuid4().hex
+        if not self.redis.set(lock_key, token, nx=True, ex=LOCK_TTL_SECONDS):
+            # Another worker is draining this recipient and will see our job
+            return
+
+        while True:
+            raw = self.redis.lindex(queue_key, 0)
+            if raw is None:
+                if self._release_lock_script(keys=[lock_key, queue_key], args=[token]):
+                    return
+                continue
+
+            try:
+                job = loads(raw)
+            except Exception as e:
+                logger.error(f"Dropping unreadable outbound job for {recipient}: {str(e)}")
+                self.redis.rpush(self.dead_letter_key, raw)
+                self.redis.lpop(queue_key)
+                continue
+
+            try:
+                self._process(job, keep_alive=lambda: self._renew_lock(lock_key, token))
+            except LockLost:
+                # Another worker owns the recipient now and will resend this job
+                logger.warning("Lost outbound lock for %s while sending %s", recipient, job["id"])
+                return
+            self.redis.lpop(queue_key)
+
+    def _process(self, job, keep_alive=None):
+        """Deliver one job with retry/backoff; dead-letter it if it cannot be sent.
+
+        `keep_alive` is called before every send and must return False once
+        the caller no longer holds the recipient, which aborts with LockLost.
+        """
+        recipient = job["to"]
+        outcome = FAILED
+        for attempt in range(1, self.max_attempts + 1):
+            if keep_alive and not keep_alive():
+                raise LockLost(recipient)
+            try:
+                response = self.deliver(job["payload"], job.get("context"))
+            except Exception as e:
+                logger.warning(f"Send to {recipient} raised on attempt {attempt}: {str(e)}")
+                response = None
+            outcome = _classify(response)
+            if outcome == SENT:
+                logger.info("Delivered outbound message %s to %s", job['id'], recipient)
+                return job["id"]
+            if outcome == FAILED:
+                logger.error(f"Graph API rejected message {job['id']} to {recipient}: {response.text}")
+                break
+            if attempt < self.max_attempts:
+                time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+
+        if job.get("fallback"):
+            logger.info("Sending fallback for message %s to %s", job['id'], recipient)
+            if keep_alive and not keep_alive():
+                raise LockLost(recipient)
+            try:
+                if _classify(self.deliver(job["fallback"], job.get("context"))) == SENT:
+                    return job["id"]
+            except Exception as e:
+                logger.error(f"Fallback send to {recipient} failed: {str(e)}")
+
+        logger.error(f"Moving message {job['id']} to {recipient} to the dead-letter list")
+        try:
+            self.redis.rpush(self.dead_letter_key, dumps(dict(job, failed_at=time.time())))
+        except Exception as e:
+            logger.error(f"Failed to dead-letter message {job['id']}: {str(e)}")
+        return None
@@ -1,479 +1,186 @@
 # services/whatsapp_service.py
 import math
-import requests
 import json
-from config.credentials import META_ACCESS_TOKEN, WHATSAPP_API_URL, WHATSAPP_CATALOG_ID
-from config.settings import BRANCH_COORDINATES, BRAND_NAME, GREETING_MESSAGE, ORDER_STATUS, PRODUCT_CATALOG
+import re
+from config.brand_registry import brand_registry, get_current_brand
+from config.settings import (
+    GRAPH_API_BURST,
+    GRAPH_API_MESSAGES_PER_SECOND,
+    ORDER_STATUS
+)
 from utils.logger import get_logger
+from utils.price_utils import to_amount
 from stateHandlers.redis_state import redis_state
-from utils.payment_utils import generate_payment_link
+from utils.http_client import bearer_headers, post_json
+from utils.rate_limiter import TokenBucket
+from services.message_templates import (
+    ADDRESS_REQUEST_TEXT,
+    CART_ACTIONS,
+    CART_REMINDER_ACTIONS,
+    CART_REMINDER_HEADER,
+    EMPTY_CART_TEXT,
+    LOCATION_REQUEST_TEXT,
+    PAYMENT_PROCESSING_TEXT,
+    button_message,
+    get_templates,
+    interactive_payload,
+    item_lines,
+    text_payload
+)
+from services.outbound_queue import OutboundQueue
+from stateHandlers.redis_state import BRAND_ID
 
 logger = get_logger("whatsapp_service")
 
+# Meta's throughput limit applies per business phone number
+graph_rate_limiters = {}
+
+def get_graph_rate_limiter(phone_number_id):
+    """Token bucket for one business number, created on first use"""
+    limiter = graph_rate_limiters.get(phone_number_id)
+    if limiter is None:
+        limiter = graph_rate_limiters.setdefault(phone_number_id, TokenBucket(
+            redis_state.redis, f"graph:{phone_number_id}", GRAPH_API_MESSAGES_PER_SECOND, GRAPH_API_BURST
+        ))
+    return limiter
+
+def post_message(payload, brand_id=None):
+    """Send a message payload from the brand's number over the shared keep-alive pool"""
+    brand = brand_registry.get(brand_id) or get_current_brand()
+    get_graph_rate_limiter(brand.phone_number_id).acquire()
+    # The outbound queue owns retries and backoff, so the transport must not retry too
+    return post_json("graph", brand.whatsapp_api_url, payload, headers=bearer_headers(brand.access_token), retries=False)
+
+# Outbound messages for every brand are queued in Redis and delivered by background workers
+outbound_queue = OutboundQueue(redis_state.redis, post_message, f"outbound:{BRAND_ID}")
+
+def queue_message(payload, fallback=None):
+    """Queue a message payload for delivery from the current brand's number.
+
+    Inside a request the message is queued only once the request commits
+    (a failed request sends nothing) and None is returned; otherwise it is
+    queued now and the job id is returned.
+    """
+    logger.debug("Queueing %s message to %s", payload.get('type'), payload['to'])
+    context = get_current_brand().brand_id
+    return redis_state.after_commit(
+        lambda: outbound_queue.enqueue(payload["to"], payload, fallback=fallback, context=context)
+    )
+
+def normalize_number(number):
+    """Normalise a phone number to WhatsApp format (digits only, 91 country code)"""
+    digits = re.sub(r"\D", "", str(number))
+    if len(digits) == 10:
+        digits = "91" + digits
+    return digits
+
+def broadcast_message(recipients, build_payload):
+    """Queue a payload built by `build_payload(to)` for every recipient in one Redis round trip.
+
+    Numbers are normalised and de-duplicated first. Returns a dict mapping
+    each recipient to its outbound job id (None inside a request, where the
+    broadcast is queued once the request commits, as in queue_message); the
+    queue workers deliver them in parallel, and undeliverable jobs end up on
+    the dead-letter list.
+    """
+    unique = list(dict.fromkeys(normalize_number(r) for r in recipients if r))
+    messages = [(to, build_payload(to)) for to in unique]
+    context = get_current_brand().brand_id
+
+    def enqueue():
+        job_ids = outbound_queue.enqueue_many(messages, context=context)
+        logger.info("Queued broadcast to %s recipients", len(unique))
+        return dict(zip(unique, job_ids))
+
+    return redis_state.after_commit(enqueue)
+
+def broadcast_text(recipients, message):
+    """Queue the same text message for several recipients"""
+    return broadcast_message(recipients, lambda to: text_payload(to, message))
+
 def send_text_message(to, message):
     """Send a text message via WhatsApp"""
-    logger.info(f"Sending message to {to}")
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to,
-        "type": "text",
-        "text": {
-            "preview_url": False,
-            "body": message
-        }
-    }
-    headers = {
-        "Authorization": f"Bearer {META_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(WHATSAPP_API_URL, json=payload, headers=headers)
-        logger.info(f"WhatsApp API response status: {response.status_code}")
-        
-        if response.status_code != 200:
-            logger.error(f"WhatsApp API error: {response.text}")
-        
-        return response
-    except Exception as e:
-        logger.error(f"Failed to send WhatsApp message: {str(e)}")
-        return None
+    logger.info("Sending message to %s", to)
+    return queue_message(text_payload(to, message))
 
 def send_main_menu(to):
     """Send main menu with interactive buttons"""
-    logger.info(f"Sending main menu to {to}")
-    
-    message = GREETING_MESSAGE
-    
-    payload = {
-        "messaging_product": "whatsapp",
-        "recipient_type": "individual",
-        "to": to,
-        "type": "interactive",
-        "interactive": {
-            "type": "button",
-            "body": {
-                "text": message
-            },
-            "action": {
-                "buttons": [
-                    {
-                        "type": "reply",
-                        "reply": {
-                            "id": "ORDER_NOW",
-                            "title": "🛍️ Order Now"
-                        }
-                    },
-                    # {
-                    #     "type": "reply",
-                    #     "reply": {
-                    #         "id": "BULK_ORDERS",
-                    #         "title": "📦 Bulk Orders"
-                    #     }
-                    # }
-                ]
-            }
-        }
-    }
-    
-    headers = {
-        "Authorization": f"Bearer {META_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(WHATSAPP_API_URL, json=payload, headers=headers)
-        logger.info(f"Main menu sent. Status: {response.status_code}")
-        if response.status_code != 200:
-            logger.error(f"Main menu error: {response.text}")
-        return response
-    except Exception as e:
-        logger.error(f"Failed to send main menu: {str(e)}")
-        return None
+    logger.info("Sending main menu to %s", to)
+    return queue_message(interactive_payload(to, get_templates().main_menu))
 
 def send_catalog(to):
     """Send catalog message using WhatsApp Catalog"""
-    logger.info(f"Sending catalog to {to}")
-    
-    message = (
-        "🌟 *EXPLORE OUR PRODUCTS*\n\n"
-        "Discover our catalog and add items you love to your cart.\n\n"
-        "👇 Tap the button below to start shopping!"
-    )
-    
-    payload = {
-        "messaging_product": "whatsapp",
-        "recipient_type": "individual",
-        "to": to,
-        "type": "interactive",
-        "interactive": {
-            "type": "catalog_message",
-            "body": {
-                "text": message
-            },
-            "action": {
-                "name": "catalog_message",
-                "catalog_id": WHATSAPP_CATALOG_ID
-            }
-        }
-    }
-    
-    # Only include catalog_id if we have one configured
-    # if WHATSAPP_CATALOG_ID:
-    #     payload["interactive"]["action"]["catalog_id"] = WHATSAPP_CATALOG_ID
-    
-    headers = {
-        "Authorization": f"Bearer {META_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(WHATSAPP_API_URL, json=payload, headers=headers)
-        logger.info(f"Catalog template sent. Status: {response.status_code}")
-        if response.status_code != 200:
-            logger.error(f"Catalog error: {response.text}")
-        return response
-    except Exception as e:
-        logger.error(f"Failed to send catalog: {str(e)}")
-        return None
+    logger.info("Sending catalog to %s", to)
+    return queue_message(interactive_payload(to, get_templates().catalog))
 
 def send_cart_summary(to):
     """Send cart summary to user with interactive buttons"""
-    logger.info(f"Sending cart summary to {to}")
+    logger.info("Sending cart summary to %s", to)
     cart = redis_state.get_cart(to)
     if not cart["items"]:
-        message = "🛒 *YOUR CART IS EMPTY*\n\n"
-        message += "Browse our catalog to add items to your cart."
-        return send_text_message(to, message)
+        return send_text_message(to, EMPTY_CART_TEXT)
     
-    message = "🛒 *YOUR CART*\n\n"
-    total = 0
+    total = to_amount(sum(item["quantity"] * item["price"] for item in cart["items"]))
+    message = f"🛒 *YOUR CART*\n\n{item_lines(cart['items'])}\n*TOTAL*: ₹{total}\n\n"
     
-    for item in cart["items"]:
-        item_total = item["quantity"] * item["price"]
-        total += item_total
-        message += f"• {item['name']} x{item['quantity']} = ₹{item_total}\n"
-    
-    message += f"\n*TOTAL*: ₹{total}\n\n"
-    
-    payload = {
-        "messaging_product": "whatsapp",
-        "recipient_type": "individual",
-        "to": to,
-        "type": "interactive",
-        "interactive": {
-            "type": "button",
-            "body": {
-                "text": message
-            },
-            "action": {
-                "buttons": [
-                    {
-                        "type": "reply",
-                        "reply": {
-                            "id": "CONTINUE_SHOPPING",
-                            "title": "🛍️ Continue"
-                        }
-                    },
-                    {
-                        "type": "reply",
-                        "reply": {
-                            "id": "PROCEED_TO_CHECKOUT",
-                            "title": "✅ Checkout"
-                        }
-                    },
-                    {
-                        "type": "reply",
-                        "reply": {
-                            "id": "CLEAR_CART",
-                            "title": "🗑️ Clear Cart"
-                        }
-                    }
-                ]
-            }
-        }
-    }
-    
-    headers = {
-        "Authorization": f"Bearer {META_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(WHATSAPP_API_URL, json=payload, headers=headers)
-        logger.info(f"Cart summary template sent. Status: {response.status_code}")
-        if response.status_code != 200:
-            logger.error(f"Cart summary error: {response.text}")
-        return response
-    except Exception as e:
-        logger.error(f"Failed to send cart summary: {str(e)}")
-        return None
+    return queue_message(interactive_payload(to, button_message(message, CART_ACTIONS)))
 
 def send_delivery_options(to):
     """Send delivery options to user with interactive buttons"""
-    logger.info(f"Sending delivery options to {to}")
-    
-    message = "📍 *DELIVERY OPTIONS*\n\n" \
-             "How would you like to receive your order?"
-    
-    payload = {
-        "messaging_product": "whatsapp",
-        "recipient_type": "individual",
-        "to": to,
-        "type": "interactive",
-        "interactive": {
-            "type": "button",
-            "body": {
-                "text": message
-            },
-            "action": {
-                "buttons": [
-                    {
-                        "type": "reply",
-                        "reply": {
-                            "id": "DELIVERY",
-                            "title": "🚚 Home Delivery"
-                        }
-                    },
-                    # {
-                    #     "type": "reply",
-                    #     "reply": {
-                    #         "id": "TAKEAWAY",
-                    #         "title": "🏪 Store Pickup"
-                    #     }
-                    # }
-                ]
-            }
-        }
-    }
-    
-    headers = {
-        "Authorization": f"Bearer {META_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(WHATSAPP_API_URL, json=payload, headers=headers)
-        logger.info(f"Delivery options sent. Status: {response.status_code}")
-        if response.status_code != 200:
-            logger.error(f"Delivery options error: {response.text}")
-        return response
-    except Exception as e:
-        logger.error(f"Failed to send delivery options: {str(e)}")
-        return None
+    logger.info("Sending delivery options to %s", to)
+    return queue_message(interactive_payload(to, get_templates().delivery_options))
 
 def send_location_request(to):
     """Send location request message"""
-    logger.info(f"Sending location request to {to}")
-    
-    message = "📍 *SHARE YOUR LOCATION*\n\n" \
-             "Please share your current location so we can check if we deliver to your area.\n\n" \
-             "We deliver within 4km radius of our branches."
-    
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to,
-        "type": "text",
-        "text": {
-            "preview_url": False,
-            "body": message
-        }
-    }
-    
-    headers = {
-        "Authorization": f"Bearer {META_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(WHATSAPP_API_URL, json=payload, headers=headers)
-        logger.info(f"Location request sent. Status: {response.status_code}")
-        if response.status_code != 200:
-            logger.error(f"Location request error: {response.text}")
-        return response
-    except Exception as e:
-        logger.error(f"Failed to send location request: {str(e)}")
-        return None
+    logger.info("Sending location request to %s", to)
+    return queue_message(text_payload(to, LOCATION_REQUEST_TEXT))
 
 def send_branch_selection(to):
     """Send branch selection menu with interactive list"""
-    logger.info(f"Sending branch selection to {to}")
-    
-    # Create sections for the list
-    sections = [{
-        "title": "Select Branch",
-        "rows": [
-            {"id": branch, "title": branch, "description": ""} 
-            for branch in BRANCH_COORDINATES.keys()
-        ]
-    }]
-    
-    payload = {
-        "messaging_product": "whatsapp",
-        "recipient_type": "individual",
-        "to": to,
-        "type": "interactive",
-        "interactive": {
-            "type": "list",
-            "header": {
-                "type": "text",
-                "text": "🏪 SELECT A BRANCH"
-            },
-            "body": {
-                "text": "Please select a branch for pickup:"
-            },
-            "footer": {
-                "text": "Tap to select your preferred branch"
-            },
-            "action": {
-                "button": "Select Branch",
-                "sections": sections
-            }
-        }
-    }
-    
-    headers = {
-        "Authorization": f"Bearer {META_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(WHATSAPP_API_URL, json=payload, headers=headers)
-        logger.info(f"Branch selection template sent. Status: {response.status_code}")
-        if response.status_code != 200:
-            logger.error(f"Branch selection error: {response.text}")
-        return response
-    except Exception as e:
-        logger.error(f"Failed to send branch selection: {str(e)}")
-        return None
+    logger.info("Sending branch selection to %s", to)
+    return queue_message(interactive_payload(to, get_templates().branch_list))
 
 def send_payment_options(to):
     """Send payment options to user with interactive buttons"""
-    logger.info(f"Sending payment options to {to}")
-    
-    message = "💳 *PAYMENT OPTIONS*\n\n" \
-             "How would you like to pay for your order?"
-    
-    payload = {
-        "messaging_product": "whatsapp",
-        "recipient_type": "individual",
-        "to": to,
-        "type": "interactive",
-        "interactive": {
-            "type": "button",
-            "body": {
-                "text": message
-            },
-            "action": {
-                "buttons": [
-                    {
-                        "type": "reply",
-                        "reply": {
-                            "id": "PAY_NOW",
-                            "title": "💳 Pay Now"
-                        }
-                    },
-                    {
-                        "type": "reply",
-                        "reply": {
-                            "id": "CASH_ON_DELIVERY",
-                            "title": "💵 Cash on Delivery"
-                        }
-                    }
-                ]
-            }
-        }
-    }
-    
-    headers = {
-        "Authorization": f"Bearer {META_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(WHATSAPP_API_URL, json=payload, headers=headers)
-        logger.info(f"Payment options sent. Status: {response.status_code}")
-        if response.status_code != 200:
-            logger.error(f"Payment options error: {response.text}")
-        return response
-    except Exception as e:
-        logger.error(f"Failed to send payment options: {str(e)}")
-        return None
+    logger.info("Sending payment options to %s", to)
+    return queue_message(interactive_payload(to, get_templates().payment_options))
 
 def send_bulk_order_info(to):
     """Send bulk order contact information"""
-    logger.info(f"Sending bulk order info to {to}")
-    
-    from config.settings import BULK_ORDER_CONTACT
-    
-    message = "📞 *BULK ORDER INFORMATION*\n\n" \
-             "For bulk orders (more than 10 items), please contact us directly:\n\n" \
-             f"📱 Phone: {BULK_ORDER_CONTACT['phone']}\n" \
-             f"✉️ Email: {BULK_ORDER_CONTACT['email']}\n\n" \
-             "Our sales team will assist you with special pricing and delivery options."
-    
-    return send_text_message(to, message)
+    logger.info("Sending bulk order info to %s", to)
+    return send_text_message(to, get_templates().bulk_order_text)
 
 def send_order_confirmation(to, order_id, branch, items, total, payment_method):
     """Send order confirmation message with detailed order items"""
-    logger.info(f"Sending order confirmation to {to} for order {order_id}")
-    
-    message = f"✅ *ORDER CONFIRMED*\n\n" \
-             f"Order ID: #{order_id}\n" \
-             f"Branch: {branch}\n" \
-             f"Payment Method: {payment_method}\n\n" \
-             "ORDER ITEMS:\n"
-    
-    for item in items:
-        item_total = item["quantity"] * item["price"]
-        message += f"• {item['name']} x{item['quantity']} = ₹{item_total}\n"
-    
-    message += f"\n*TOTAL*: ₹{total}\n\n"
+    logger.info("Sending order confirmation to %s for order %s", to, order_id)
     
     if payment_method == "Pay Now":
-        message += "Please wait while we generate your payment link..."
+        closing = "Please wait while we generate your payment link..."
     else:
-        message += f"Your order will be processed shortly. Thank you for shopping with {BRAND_NAME}!"
+        closing = get_templates().thank_you_text
+    
+    message = (
+        f"✅ *ORDER CONFIRMED*\n\n"
+        f"Order ID: #{order_id}\n"
+        f"Branch: {branch}\n"
+        f"Payment Method: {payment_method}\n\n"
+        f"ORDER ITEMS:\n{item_lines(items)}"
+        f"\n*TOTAL*: ₹{to_amount(total)}\n\n{closing}"
+    )
     
     return send_text_message(to, message)
 
 def send_payment_processing(to):
     """Send payment processing message"""
-    logger.info(f"Sending payment processing message to {to}")
-    
-    message = "🔄 *GENERATING PAYMENT LINK*\n\n" \
-             "Please wait a moment while we create your secure payment link..."
-    
-    return send_text_message(to, message)
+    logger.info("Sending payment processing message to %s", to)
+    return send_text_message(to, PAYMENT_PROCESSING_TEXT)
 
-def send_payment_link(to, order_id, amount):
-    """Send payment link for online payment"""
-    logger.info(f"Sending payment link to {to} for order {order_id}")
-    
-    # In a real implementation, this would generate a Razorpay payment link
-    payment_link = generate_payment_link(to,amount,order_id)
-    
-    message = "💳 *SECURE PAYMENT*\n\n" \
-             f"Please complete payment for your order #{order_id}:\n\n" \
-             f"Amount: ₹{amount}\n\n" \
-             f"Payment Link: {payment_link}\n\n" \
-             "You will receive order confirmation after payment is successful."
+def send_payment_link(to, order_id, amount, payment_link):
+    """Send an already generated payment link using WhatsApp template"""
+    logger.info("Sending payment link to %s for order %s", to, order_id)
     
-    return send_text_message(to, message)
-
-
-def send_payment_link(to, order_id, amount):
-    """Send payment link for online payment using WhatsApp template"""
-    logger.info(f"Sending payment link to {to} for order {order_id}")
-    
-    # In a real implementation, this would generate a Razorpay payment link
-    payment_link = generate_payment_link(to, amount, order_id)
     token = payment_link.split("/")[-1] if payment_link.startswith("https://rzp.io/rzp/")  else payment_link
 
-    headers = {
-        "Authorization": f"Bearer {META_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
     payload = {
         "messaging_product": "whatsapp",
         "to": to,
@@ -494,34 +201,18 @@ def send_payment_link(to, order_id, amount):
         }
     }
 
-    # Use the same API URL as in send_text_message
-    try:
-        response = requests.post(WHATSAPP_API_URL, headers=headers, json=payload)
-        logger.info(f"Payment link template sent to {to} for order {order_id}. Status: {response.status_code}")
-        if response.status_code != 200:
-            logger.error(f"Payment link template error: {response.text}")
-            # Fallback to text message if template fails
-            message = "💳 *SECURE PAYMENT*\n\n" \
-                     f"Please complete payment for your order #{order_id}:\n\n" \
-                     f"Amount: ₹{amount}\n\n" \
-                     f"Payment Link: {payment_link}\n\n" \
-                     "You will receive order confirmation after payment is successful."
-            return send_text_message(to, message)
-        return response
-    except Exception as e:
-        logger.error(f"Failed to send payment link template: {str(e)}")
-        # Fallback to text message if template fails
-        message = "💳 *SECURE PAYMENT*\n\n" \
-                 f"Please complete payment for your order #{order_id}:\n\n" \
-                 f"Amount: ₹{amount}\n\n" \
-                 f"Payment Link: {payment_link}\n\n" \
-                 "You will receive order confirmation after payment is successful."
-        return send_text_message(to, message)
+    # Fall back to a plain text message if the template is rejected
+    message = "💳 *SECURE PAYMENT*\n\n" \
+             f"Please complete payment for your order #{order_id}:\n\n" \
+             f"Amount: ₹{to_amount(amount)}\n\n" \
+             f"Payment Link: {payment_link}\n\n" \
+             "You will receive order confirmation after payment is successful."
+    return queue_message(payload, fallback=text_payload(to, message))
 
 
 def send_order_status_update(to, order_id, status):
     """Send order status update to customer"""
-    logger.info(f"Sending order status update to {to} for order {order_id}")
+    logger.info("Sending order status update to %s for order %s", to, order_id)
     
     message = f"🔄 *ORDER STATUS UPDATE*\n\n" \
              f"Order ID: #{order_id}\n" \
@@ -536,80 +227,32 @@ def send_order_status_update(to, order_id, status):
     
     return send_text_message(to, message)
 
-def send_cart_reminder(to, order_id):
-    """Send cart reminder with order now button"""
-    logger.info(f"Sending cart reminder to {to} for order {order_id}")
+def send_cart_reminder(to, cart=None):
+    """Send cart reminder with checkout button"""
+    logger.info("Sending cart reminder to %s", to)
     
-    cart = redis_state.get_cart(to)
-    
-    message = "⏰ *CART REMINDER*\n\n" \
-             "You have items in your cart. Would you like to complete your order?\n\n"
-    
-    # Add cart items
-    for item in cart["items"]:
-        message += f"• {item['name']} x{item['quantity']}\n"
-    
-    message += f"\n*TOTAL*: ₹{cart['total']}\n\n" \
-             "Tap the button below to proceed with your order:"
-    
-    payload = {
-        "messaging_product": "whatsapp",
-        "recipient_type": "individual",
-        "to": to,
-        "type": "interactive",
-        "interactive": {
-            "type": "button",
-            "body": {
-                "text": message
-            },
-            "action": {
-                "buttons": [
-                    {
-                        "type": "reply",
-                        "reply": {
-                            "id": f"ORDER_NOW:{order_id}",
-                            "title": "🛍️ Order Now"
-                        }
-                    }
-                ]
-            }
-        }
-    }
+    if cart is None:
+        cart = redis_state.get_cart(to)
     
-    headers = {
-        "Authorization": f"Bearer {META_ACCESS_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    message = (
+        f"{CART_REMINDER_HEADER}{item_lines(cart['items'], with_totals=False)}"
+        f"\n*TOTAL*: ₹{to_amount(cart['total'])}\n\n"
+        "Tap the button below to proceed with your order:"
+    )
     
-    try:
-        response = requests.post(WHATSAPP_API_URL, json=payload, headers=headers)
-        logger.info(f"Cart reminder sent. Status: {response.status_code}")
-        if response.status_code != 200:
-            logger.error(f"Cart reminder error: {response.text}")
-        return response
-    except Exception as e:
-        logger.error(f"Failed to send cart reminder: {str(e)}")
-        return None
+    return queue_message(interactive_payload(to, button_message(message, CART_REMINDER_ACTIONS)))
 
 
 
 def send_address_request(to):
     """Send address request message"""
-    logger.info(f"Sending address request to {to}")
-    
-    message = "📍 *DELIVERY ADDRESS*\n\n" \
-             "Please enter your full delivery address:\n\n" \
-             "Example:\n" \
-             "House No. 123, Street Name\n" \
-             "Area, Landmark\n" \
-             "City, PIN Code"
-    
-    return send_text_message(to, message)
+    logger.info("Sending address request to %s", to)
+    return send_text_message(to, ADDRESS_REQUEST_TEXT)
 
 
 def send_final_order_confirmation(to, order_id, address):
     """Send final order confirmation with address details"""
-    logger.info(f"Sending final order confirmation to {to} for order {order_id}")
+    logger.info("Sending final order confirmation to %s for order %s", to, order_id)
     
     # Get order
     order = redis_state.get_order(order_id)
@@ -617,13 +260,15 @@ def send_final_order_confirmation(to, order_id, address):
         logger.error(f"Order {order_id} not found for final confirmation")
         return
     
-    message = f"✅ *ORDER CONFIRMED*\n\n" \
-             f"Order ID: #{order_id}\n" \
-             f"Branch: {order['branch']}\n" \
-             f"Payment Method: {order['payment_method']}\n\n"
+    parts = [
+        f"✅ *ORDER CONFIRMED*\n\n"
+        f"Order ID: #{order_id}\n"
+        f"Branch: {order['branch']}\n"
+        f"Payment Method: {order['payment_method']}\n\n"
+    ]
     
     if order["delivery_type"] == "Delivery":
-        message += "DELIVERY ADDRESS:\n"
+        parts.append("DELIVERY ADDRESS:\n")
         
         # Check if we have coordinates
         if isinstance(order["delivery_address"], dict) and "latitude" in order["delivery_address"]:
@@ -631,21 +276,18 @@ def send_final_order_confirmation(to, order_id, address):
             longitude = order["delivery_address"]["longitude"]
             maps_link = f"https://www.google.com/maps?q={latitude},{longitude}"
             
-            message += f"📍 {latitude}, {longitude}\n"
-            message += f"🗺️ Map: {maps_link}\n\n"
-            message += "Note: Delivery person will use this location for navigation\n\n"
+            parts.append(
+                f"📍 {latitude}, {longitude}\n"
+                f"🗺️ Map: {maps_link}\n\n"
+                "Note: Delivery person will use this location for navigation\n\n"
+            )
         else:
-            message += f"{address}\n\n"
+            parts.append(f"{address}\n\n")
     
-    message += "ORDER ITEMS:\n"
-    for item in order["items"]:
-        item_total = item["quantity"] * item["price"]
-        message += f"• {item['name']} x{item['quantity']} = ₹{item_total}\n"
+    parts.append(f"ORDER ITEMS:\n{item_lines(order['items'])}")
+    parts.append(f"\n*TOTAL*: ₹{to_amount(order['total'])}\n\n{get_templates().thank_you_text}")
     
-    message += f"\n*TOTAL*: ₹{order['total']}\n\n" \
-             f"Your order will be processed shortly. Thank you for shopping with {BRAND_NAME}!"
-    
-    return send_text_message(to, message)
+    return send_text_message(to, "".join(parts))
 
 
 
@@ -693,61 +335,51 @@ def send_final_order_confirmation(to, order_id, address):
 
 def send_order_alert(branch, order_id, items, total, sender, payment_mode,discount_percentage,discount_amount, delivery_type):
     """Send order alert to branch with delivery address information"""
-    logger.info(f"Sending order alert to {branch} for order {order_id}")
+    logger.info("Sending order alert to %s for order %s", branch, order_id)
     
-    from config.settings import BRANCH_CONTACTS, OTHER_NUMBERS
+    from config.settings import OTHER_NUMBERS
     
-    # Get all recipient numbers
+    branch_contacts = get_current_brand().branch_contacts
+    
+    # Get all recipient numbers (normalised and de-duplicated by broadcast_text)
     recipients = []
     
-    # Add branch contact if exists
-    if branch in BRANCH_CONTACTS:
-        recipients.append(BRANCH_CONTACTS[branch])
+    # Add branch contacts if they exist
+    if branch in branch_contacts:
+        recipients.extend(branch_contacts[branch])
     else:
         logger.error(f"Branch {branch} not found in branch contacts")
     
     # Add all numbers from OTHER_NUMBERS
-    for number in OTHER_NUMBERS:
-        # Format number to WhatsApp format if needed (add country code if missing)
-        if not number.startswith("91"):
-            formatted_number = "91" + number
-        else:
-            formatted_number = number
-        recipients.append(formatted_number)
+    recipients.extend(OTHER_NUMBERS)
     
     # Get complete delivery info
     delivery_info = redis_state.get_complete_delivery_info(sender)
     text_address = delivery_info.get('text_address', 'Address not provided')
     maps_link = delivery_info.get('maps_link', 'Map link not available')
 
-    message = "🔔 *NEW ORDER ALERT*\n\n" \
-             f"Order ID: #{order_id}\n" \
-             f"Customer: {sender}\n" \
-             f"Delivery Type: {delivery_type}\n\n"\
-             f"Payment Method: {payment_mode}\n\n"\
-             f"Branch: {branch}\n\n"\
+    parts = [
+        "🔔 *NEW ORDER ALERT*\n\n"
+        f"Order ID: #{order_id}\n"
+        f"Customer: {sender}\n"
+        f"Delivery Type: {delivery_type}\n\n"
+        f"Payment Method: {payment_mode}\n\n"
+        f"Branch: {branch}\n\n"
+    ]
     
     # Add delivery address information
     if delivery_type == "Delivery":
-        message += "DELIVERY ADDRESS:\n"
-        message += f"{text_address}\n"
-        message += f"{maps_link}\n\n"
-    
-    message += "ORDER ITEMS:\n"
-    for item in items:
-        item_total = item["quantity"] * item["price"]
-        message += f"• {item['name']} x{item['quantity']} = ₹{item_total}\n"
-    if discount_percentage > 0:
-        message += f"• | {math.ceil(discount_percentage)}% Discount Applied: -₹{math.ceil(discount_amount)}"
+        parts.append(f"DELIVERY ADDRESS:\n{text_address}\n{maps_link}\n\n")
     
-    message += f"\n*TOTAL PAYABLE*: ₹{math.ceil(total)}\n\n" \
-             "Please prepare this order as soon as possible."
+    parts.append(f"ORDER ITEMS:\n{item_lines(items)}")
+    if discount_percentage > 0:
+        parts.append(f"• | {math.ceil(discount_percentage)}% Discount Applied: -₹{math.ceil(discount_amount)}")
     
-    # Send to all recipients
-    results = []
-    for recipient in recipients:
-        logger.info(f"Sending order alert to {recipient}")
-        result = send_text_message(recipient, message)
-        results.append(result)
+    parts.append(
+        f"\n*TOTAL PAYABLE*: ₹{math.ceil(total)}\n\n"
+        "Please prepare this order as soon as possible."
+    )
+    message = "".join(parts)
     
-    return results
\ No newline at end of file
+    # Queue for all recipients at once
+    return broadcast_text(recipients, message)
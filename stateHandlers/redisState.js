@@ -4,6 +4,35 @@ const { getLogger } = require('../utils/logger');
 
 const logger = getLogger('redis_state');
 const DEFAULT_BRAND = (process.env.BRAND_ID || 'default').toLowerCase();
+const ORDER_TTL_SECONDS = 604800; // 7 days, same lifetime as the order:{id}:active flag
+
+function orderKey(orderId) {
+  return `order:${orderId}`;
+}
+
+function branchIndexKey(branch) {
+  return `orders:index:branch:${branch.toLowerCase()}`;
+}
+
+function statusIndexKey(status) {
+  return `orders:index:status:${status.toLowerCase().replace(/ /g, '_')}`;
+}
+
+function encodeOrder(order) {
+  const fields = {};
+  for (const [field, value] of Object.entries(order)) {
+    if (value !== undefined) fields[field] = JSON.stringify(value);
+  }
+  return fields;
+}
+
+function decodeOrder(raw) {
+  const order = {};
+  for (const [field, value] of Object.entries(raw)) {
+    order[field] = JSON.parse(value);
+  }
+  return order;
+}
 
 class RedisState {
   constructor() {
@@ -168,44 +197,55 @@ class RedisState {
     }
   }
 
+  // Orders live in a per-order hash (every field JSON encoded) with sorted-set
+  // indexes by branch and status scored by expiry, shared with redis_state.py.
   async createOrder(order) {
-    await this.redis.rpush('orders:all', JSON.stringify(order));
-    await this.redis.setex(`order:${order.order_id}:active`, 604800, '1');
+    const expiresAt = Date.now() / 1000 + ORDER_TTL_SECONDS;
+    const multi = this.redis
+      .multi()
+      .hset(orderKey(order.order_id), encodeOrder(order))
+      .expire(orderKey(order.order_id), ORDER_TTL_SECONDS)
+      .setex(`order:${order.order_id}:active`, ORDER_TTL_SECONDS, '1');
+    if (order.branch) multi.zadd(branchIndexKey(order.branch), expiresAt, order.order_id);
+    if (order.status) multi.zadd(statusIndexKey(order.status), expiresAt, order.order_id);
+    await multi.exec();
   }
 
   async archiveOrder(order) {
     try {
-      await this.redis.rpush('orders:archive', JSON.stringify(order));
+      const multi = this.redis
+        .multi()
+        .rpush('orders:archive', JSON.stringify(order))
+        .del(orderKey(order.order_id), `order:${order.order_id}:active`);
+      if (order.branch) multi.zrem(branchIndexKey(order.branch), order.order_id);
+      if (order.status) multi.zrem(statusIndexKey(order.status), order.order_id);
+      await multi.exec();
     } catch (err) {
       logger.error(`archiveOrder error: ${err}`);
     }
   }
 
   async getOrder(orderId) {
-    const all = await this.redis.lrange('orders:all', 0, -1);
-    for (const str of all) {
-      const o = JSON.parse(str);
-      if (o.order_id === orderId) return o;
-    }
-    return null;
+    const [[, active], [, raw]] = await this.redis
+      .pipeline()
+      .exists(`order:${orderId}:active`)
+      .hgetall(orderKey(orderId))
+      .exec();
+    if (!active || !raw || Object.keys(raw).length === 0) return null;
+    return decodeOrder(raw);
   }
 
   async updateOrderStatus(orderId, status) {
-    const all = await this.redis.lrange('orders:all', 0, -1);
-    let order = null;
-    let orderJson = null;
-    for (const str of all) {
-      const o = JSON.parse(str);
-      if (o.order_id === orderId) {
-        order = o;
-        orderJson = str;
-        break;
-      }
-    }
+    const order = await this.getOrder(orderId);
     if (!order) return false;
-    order.status = status;
-    await this.redis.lrem('orders:all', 0, orderJson);
-    await this.redis.rpush('orders:all', JSON.stringify(order));
+    const ttl = await this.redis.pttl(`order:${orderId}:active`);
+    const expiresAt = Date.now() / 1000 + Math.max(ttl, 0) / 1000;
+    const multi = this.redis
+      .multi()
+      .hset(orderKey(orderId), 'status', JSON.stringify(status))
+      .zadd(statusIndexKey(status), expiresAt, orderId);
+    if (order.status && order.status !== status) multi.zrem(statusIndexKey(order.status), orderId);
+    await multi.exec();
     return true;
   }
 
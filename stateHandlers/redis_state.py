@@ -1,30 +1,494 @@
 # stateHandlers/redis_state.py
+import copy
 import redis
 import json
-import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from config.brand_registry import DEFAULT_KEY_NAMESPACE, brand_registry, get_current_brand
 from config.credentials import REDIS_URL
+from utils.analytics_store import analytics_store
 from utils.logger import get_logger
+from utils.price_utils import to_amount
 from datetime import datetime, timedelta
 
-from utils.time_utils import get_current_ist
+from utils.time_utils import IST, get_current_ist
 
 logger = get_logger("redis_state")
-BRAND_ID = os.getenv("BRAND_ID", "default").lower()
+
+# Deployment-wide namespace (orders, webhook de-duplication, scheduler); per-user
+# keys are namespaced by the brand of the request instead, see _brand_id()
+BRAND_ID = DEFAULT_KEY_NAMESPACE
+
+ORDER_TTL_SECONDS = 604800  # 7 days, same lifetime as the order:{id}:active flag
+ORDER_MIGRATION_BATCH = 500
+ORDER_MIGRATION_LOCK_SECONDS = 300
+
+# Order indexes (orders:index:branch:*, orders:index:status:*) are sorted sets
+# scored by the epoch second the order expires, so expired ids can be trimmed.
+
+# Guarded status transition, applied in one round trip.
+# KEYS[1] order hash, KEYS[2] active flag, KEYS[3] new status index,
+# KEYS[4..n] index of each allowed current status.
+# ARGV[1] new status, ARGV[2] updated_at, ARGV[3] order id,
+# ARGV[4..n] allowed current statuses (aligned with KEYS[4..n]).
+# Returns 1 on success, 0 if the transition is not allowed, -1 if the order is gone.
+UPDATE_ORDER_STATUS_SCRIPT = """
+local ttl = redis.call('PTTL', KEYS[2])
+if ttl < 0 then
+    return -1
+end
+local current = redis.call('HGET', KEYS[1], 'status')
+if not current then
+    return -1
+end
+for i = 4, #ARGV do
+    if ARGV[i] == current then
+        local clock = redis.call('TIME')
+        local expires_at = tonumber(clock[1]) + ttl / 1000
+        redis.call('HSET', KEYS[1], 'status', ARGV[1], 'updated_at', ARGV[2])
+        redis.call('ZREM', KEYS[i], ARGV[3])
+        redis.call('ZADD', KEYS[3], expires_at, ARGV[3])
+        return 1
+    end
+end
+return 0
+"""
+
+
+CART_TTL_SECONDS = 86400  # 24 hours
+
+# Add line items to a cart hash and keep its total up to date, in one round trip.
+# KEYS[1] cart hash, KEYS[2] cart reminder sorted set. ARGV[1] ttl, ARGV[2] reminder
+# due time, ARGV[3] reminder member, then (item id, name, price, quantity) for each
+# item from ARGV[4]. The price recorded when an item first entered the cart is
+# kept, and the abandonment reminder is pushed back to ARGV[2].
+# Returns the whole cart hash.
+ADD_TO_CART_SCRIPT = """
+local added = 0
+for i = 4, #ARGV, 4 do
+    local prefix = 'item:' .. ARGV[i] .. ':'
+    if redis.call('HSETNX', KEYS[1], prefix .. 'name', ARGV[i + 1]) == 1 then
+        local pos = redis.call('HINCRBY', KEYS[1], 'seq', 1)
+        redis.call('HSET', KEYS[1], prefix .. 'price', ARGV[i + 2], prefix .. 'pos', pos)
+    end
+    local price = tonumber(redis.call('HGET', KEYS[1], prefix .. 'price'))
+    local quantity = tonumber(ARGV[i + 3])
+    redis.call('HINCRBY', KEYS[1], prefix .. 'qty', quantity)
+    added = added + price * quantity
+end
+redis.call('HINCRBYFLOAT', KEYS[1], 'total', tostring(added))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# Pending cart reminders live in cart:{brand}:reminders:due, scored by the
+# epoch second they are due
+LEGACY_CART_REMINDERS_KEY = f"cart:{BRAND_ID}:reminders"
+
+# Atomically take up to ARGV[2] members due at or before ARGV[1] out of the ZSET KEYS[1],
+# so each one is handed to exactly one worker (cart reminders, payment link retries).
+CLAIM_DUE_REMINDERS_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+def _brand_id(brand_id=None):
+    """Key namespace of `brand_id` (default: the brand of the request being handled)"""
+    brand = brand_registry.get(brand_id) if brand_id else get_current_brand()
+    return brand.key_namespace if brand else brand_id.lower()
+
+
+def _cart_key(user_id):
+    return f"user:{_brand_id()}:{user_id}:cart"
+
+
+def _state_key(user_id):
+    return f"user:{_brand_id()}:{user_id}:state"
+
+
+def _cart_reminders_key():
+    return f"cart:{_brand_id()}:reminders:due"
+
+
+def _cart_reminder_member(user_id):
+    return json.dumps({"user_id": user_id}, sort_keys=True)
+
+
+def _cart_reminder_due(delay_hours=None):
+    """Epoch second an abandonment reminder for a cart touched now falls due"""
+    from config.settings import CART_REMINDER_INTERVAL_HOURS
+
+    if delay_hours is None:
+        delay_hours = CART_REMINDER_INTERVAL_HOURS
+    return (get_current_ist() + timedelta(hours=delay_hours)).timestamp()
+
+
+def _add_to_cart_args(user_id, lines):
+    """ADD_TO_CART_SCRIPT arguments for (item_id, name, price, quantity) lines"""
+    args = [CART_TTL_SECONDS, _cart_reminder_due(), _cart_reminder_member(user_id)]
+    for item_id, name, price, quantity in lines:
+        args.extend((item_id, name, repr(price), quantity))
+    return args
+
+
+def _decode_cart(raw):
+    """Turn a cart hash into the {"items": [...], "total": ...} dict callers expect"""
+    fields = {}
+    for field, value in raw.items():
+        if isinstance(field, bytes):
+            field = field.decode('utf-8')
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        fields[field] = value
+
+    cart = {"items": [], "total": 0}
+    items = {}
+    for field, value in fields.items():
+        if field.startswith("item:"):
+            item_id, attr = field[len("item:"):].rsplit(":", 1)
+            items.setdefault(item_id, {"id": item_id})[attr] = value
+        elif field == "total":
+            cart["total"] = to_amount(value)
+        elif field == "location":
+            cart["location"] = json.loads(value)
+        elif field != "seq":
+            cart[field] = value
+
+    for item in sorted(items.values(), key=lambda i: int(i.get("pos", 0))):
+        cart["items"].append({
+            "id": item["id"],
+            "name": item.get("name", item["id"]),
+            "quantity": int(item.get("qty", 0)),
+            "price": to_amount(item.get("price", 0)),
+        })
+    return cart
+
+
+def _encode_cart(cart):
+    """Inverse of _decode_cart, used to convert legacy JSON carts"""
+    fields = {}
+    for key, value in cart.items():
+        if key == "items":
+            for pos, item in enumerate(value, start=1):
+                prefix = f"item:{item['id']}:"
+                fields[prefix + "name"] = item["name"]
+                fields[prefix + "price"] = str(to_amount(item["price"]))
+                fields[prefix + "qty"] = int(item["quantity"])
+                fields[prefix + "pos"] = pos
+            fields["seq"] = len(value)
+        elif key == "total":
+            fields["total"] = str(to_amount(value))
+        elif key == "location":
+            fields["location"] = json.dumps(value)
+        elif value is not None:
+            fields[key] = value
+    return fields
+
+
+def _encode_cart_fields(fields):
+    """Encode top-level cart fields for HSET"""
+    return {
+        key: json.dumps(value) if key == "location" else value
+        for key, value in fields.items()
+    }
+
+
+# Per-thread request context: the active unit of work, if any
+_request_local = threading.local()
+
+
+def _current_unit_of_work():
+    return getattr(_request_local, "unit_of_work", None)
+
+
+def _unit_of_work_for(user_id):
+    """The active unit of work if it belongs to `user_id`"""
+    uow = _current_unit_of_work()
+    if uow is not None and uow.user_id == user_id:
+        return uow
+    return None
+
+
+def _record_round_trip():
+    uow = _current_unit_of_work()
+    if uow is not None:
+        uow.round_trips += 1
+
+
+class _CountingPipeline(redis.client.Pipeline):
+    """Pipeline that reports each flush as one round trip"""
+
+    def load_scripts(self):
+        _record_round_trip()
+        return super().load_scripts()
+
+    def execute(self, raise_on_error=True):
+        _record_round_trip()
+        return super().execute(raise_on_error)
+
+
+class _CountingRedis(redis.Redis):
+    """Redis client that counts round trips made inside a unit of work"""
+
+    def execute_command(self, *args, **options):
+        _record_round_trip()
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return _CountingPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+class RequestUnitOfWork:
+    """Request-scoped view of one user's state and cart.
+
+    Both are loaded with a single pipelined read, served from memory for the
+    rest of the request, and every write is buffered and flushed in one
+    MULTI/EXEC pipeline when the request completes. Side effects that
+    cannot be undone (outbound messages, payment links, order logs) are
+    registered with after_commit and run only once that flush succeeds. If
+    the request raises, writes and side effects are both discarded, so a
+    redelivery starts from the same state and nothing is sent twice.
+    """
+
+    def __init__(self, state, user_id):
+        self.state = state
+        self.user_id = user_id
+        self.round_trips = 0
+        self.user_state = None
+        self.cart = {"items": [], "total": 0}
+        self._writes = []
+        self._effects = []
+        # Orders created by this request, readable before they are flushed
+        self.orders = {}
+
+    def load(self):
+        pipe = self.state.redis.pipeline(transaction=False)
+        pipe.get(_state_key(self.user_id))
+        pipe.hgetall(_cart_key(self.user_id))
+        user_state, raw_cart = pipe.execute(raise_on_error=False)
+
+        if isinstance(user_state, Exception):
+            logger.error(f"Error getting user state for {self.user_id}: {str(user_state)}")
+        elif user_state:
+            if isinstance(user_state, bytes):
+                user_state = user_state.decode('utf-8')
+            self.user_state = json.loads(user_state)
+
+        if isinstance(raw_cart, Exception):
+            # Legacy JSON cart: convert it, then read it back as a hash
+            raw_cart = self.state._cart_call(
+                self.user_id, lambda: self.state.redis.hgetall(_cart_key(self.user_id))
+            )
+        self.cart = _decode_cart(raw_cart)
+
+    def get_user_state(self):
+        return copy.deepcopy(self.user_state)
+
+    def set_user_state(self, state):
+        self.user_state = copy.deepcopy(state)
+        key = _state_key(self.user_id)
+        payload = json.dumps(state)
+        self._writes.append(lambda pipe: pipe.setex(key, 3600, payload))
+
+    def clear_user_state(self):
+        self.user_state = None
+        key = _state_key(self.user_id)
+        self._writes.append(lambda pipe: pipe.delete(key))
+
+    def get_cart(self):
+        return copy.deepcopy(self.cart)
+
+    def set_cart_fields(self, fields):
+        self.cart.update(copy.deepcopy(fields))
+        key = _cart_key(self.user_id)
+        mapping = _encode_cart_fields(fields)
+        self._writes.append(lambda pipe: pipe.hset(key, mapping=mapping))
+        self._writes.append(lambda pipe: pipe.expire(key, CART_TTL_SECONDS))
+
+    def add_items(self, lines):
+        """Merge (item_id, name, price, quantity) lines into the cart with one buffered script call"""
+        items = {item["id"]: item for item in self.cart["items"]}
+        for item_id, name, price, quantity in lines:
+            item = items.get(item_id)
+            if item:
+                item["quantity"] += quantity
+                price = item["price"]
+            else:
+                item = items[item_id] = {
+                    "id": item_id,
+                    "name": name,
+                    "quantity": quantity,
+                    "price": price,
+                }
+                self.cart["items"].append(item)
+            self.cart["total"] = to_amount(self.cart["total"] + price * quantity)
+
+        keys = [_cart_key(self.user_id), _cart_reminders_key()]
+        args = _add_to_cart_args(self.user_id, lines)
+        self._writes.append(
+            lambda pipe: self.state._add_to_cart_script(keys=keys, args=args, client=pipe)
+        )
+
+    def clear_cart(self):
+        self.cart = {"items": [], "total": 0}
+        key = _cart_key(self.user_id)
+        reminders_key = _cart_reminders_key()
+        member = _cart_reminder_member(self.user_id)
+        self._writes.append(lambda pipe: pipe.delete(key))
+        self._writes.append(lambda pipe: pipe.zrem(reminders_key, member))
+
+    def flush(self):
+        """Apply all buffered writes in a single pipeline"""
+        if not self._writes:
+            return
+        pipe = self.state.redis.pipeline()
+        for write in self._writes:
+            write(pipe)
+        self._writes = []
+        pipe.execute()
+
+    def buffer(self, write):
+        """Add `write(pipe)` to the writes flushed when the request completes"""
+        self._writes.append(write)
+
+    def after_commit(self, effect):
+        """Run `effect()` once the buffered writes have been flushed"""
+        self._effects.append(effect)
+
+    def run_effects(self):
+        effects, self._effects = self._effects, []
+        for effect in effects:
+            try:
+                effect()
+            except Exception as e:
+                # The writes are committed; one failed effect must not undo the request
+                logger.error(f"Error running post-commit effect for {self.user_id}: {str(e)}")
+
+    def discard(self):
+        """Drop the buffered writes and side effects of a request that failed"""
+        if self._writes or self._effects:
+            logger.warning(
+                "Discarding %s buffered writes and %s side effects for %s",
+                len(self._writes), len(self._effects), self.user_id
+            )
+        self._writes = []
+        self._effects = []
+
+
+def _order_key(order_id):
+    return f"order:{order_id}"
+
+
+def _branch_index_key(branch):
+    return f"orders:index:branch:{branch.lower()}"
+
+
+def _status_index_key(status):
+    return f"orders:index:status:{status.lower().replace(' ', '_')}"
+
+
+def allowed_previous_statuses(status):
+    """Statuses an order may be in for a transition to `status` to be accepted"""
+    from config.settings import ORDER_STATUS, ORDER_STATUS_FLOW
+
+    flow = [ORDER_STATUS[key] for key in ORDER_STATUS_FLOW]
+    if status == ORDER_STATUS["CANCELLED"]:
+        return flow[:-1]
+    if status in flow:
+        return flow[:flow.index(status)]
+    return []
+
+
+def _encode_order(order_data):
+    """Encode every order field as JSON so the hash round-trips exactly"""
+    return {field: json.dumps(value) for field, value in order_data.items()}
+
+
+def _decode_order(raw):
+    """Decode a HGETALL result produced by _encode_order"""
+    order = {}
+    for field, value in raw.items():
+        if isinstance(field, bytes):
+            field = field.decode('utf-8')
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        order[field] = json.loads(value)
+    return order
 
 class RedisState:
     def __init__(self):
         try:
-            self.redis = redis.from_url(REDIS_URL)
+            self.redis = _CountingRedis.from_url(REDIS_URL)
             self.redis.ping()
             logger.info("Connected to Redis successfully")
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {str(e)}")
             raise
+        self._update_order_status_script = self.redis.register_script(UPDATE_ORDER_STATUS_SCRIPT)
+        self._add_to_cart_script = self.redis.register_script(ADD_TO_CART_SCRIPT)
+        self._claim_due_reminders_script = self.redis.register_script(CLAIM_DUE_REMINDERS_SCRIPT)
+        self.migrate_order_index()
+        self.migrate_cart_reminders()
+
+    @contextmanager
+    def unit_of_work(self, user_id):
+        """Scope one request's reads and writes for `user_id` to a RequestUnitOfWork"""
+        uow = RequestUnitOfWork(self, user_id)
+        previous = _current_unit_of_work()
+        _request_local.unit_of_work = uow
+        try:
+            uow.load()
+            yield uow
+            try:
+                uow.flush()
+            except Exception as e:
+                # Fail the request instead of reporting writes that never happened
+                logger.error(f"Error flushing buffered writes for {user_id}: {str(e)}")
+                raise
+        except BaseException:
+            uow.discard()
+            raise
+        finally:
+            _request_local.unit_of_work = previous
+        uow.run_effects()
+
+    def after_commit(self, effect):
+        """Run `effect()` after the current request commits, or now outside a request.
+
+        Returns the effect's result when it runs immediately, otherwise None.
+        """
+        uow = _current_unit_of_work()
+        if uow is not None:
+            uow.after_commit(effect)
+            return None
+        return effect()
+
+    def _write(self, write):
+        """Apply `write(pipe)` with the current request's writes, or now outside a request"""
+        uow = _current_unit_of_work()
+        if uow is not None:
+            uow.buffer(write)
+            return
+        pipe = self.redis.pipeline()
+        write(pipe)
+        pipe.execute()
 
     def get_user_state(self, user_id):
         """Get user state from Redis"""
+        uow = _unit_of_work_for(user_id)
+        if uow:
+            return uow.get_user_state()
         try:
-            state = self.redis.get(f"user:{BRAND_ID}:{user_id}:state")
+            state = self.redis.get(_state_key(user_id))
             if state:
                 # Decode if state is bytes
                 if isinstance(state, bytes):
@@ -40,12 +504,16 @@ class RedisState:
         try:
             # Add timestamp for debugging
             state["last_updated"] = get_current_ist().strftime("%Y-%m-%d %H:%M:%S")
+            uow = _unit_of_work_for(user_id)
+            if uow:
+                uow.set_user_state(state)
+                return True
             self.redis.setex(
-                f"user:{BRAND_ID}:{user_id}:state",
+                _state_key(user_id),
                 3600,
                 json.dumps(state),
             )  # 1 hour expiry
-            logger.debug(f"Set user state for {user_id}: {state}")
+            logger.debug("Set user state for %s: %s", user_id, state)
             return True
         except Exception as e:
             logger.error(f"Error setting user state for {user_id}: {str(e)}")
@@ -53,83 +521,143 @@ class RedisState:
 
     def clear_user_state(self, user_id):
         """Clear user state from Redis"""
+        uow = _unit_of_work_for(user_id)
+        if uow:
+            uow.clear_user_state()
+            return True
         try:
-            self.redis.delete(f"user:{BRAND_ID}:{user_id}:state")
-            logger.debug(f"Cleared user state for {user_id}")
+            self.redis.delete(_state_key(user_id))
+            logger.debug("Cleared user state for %s", user_id)
             return True
         except Exception as e:
             logger.error(f"Error clearing user state for {user_id}: {str(e)}")
             return False
 
+    def _cart_call(self, user_id, operation):
+        """Run a cart operation, converting a legacy JSON cart to a hash first if needed"""
+        try:
+            return operation()
+        except redis.exceptions.ResponseError as e:
+            if "WRONGTYPE" not in str(e):
+                raise
+            self._migrate_legacy_cart(user_id)
+            return operation()
+
+    def _migrate_legacy_cart(self, user_id):
+        """Rewrite a cart stored as a JSON string into the hash layout"""
+        key = _cart_key(user_id)
+        legacy = self.redis.get(key)
+        if isinstance(legacy, bytes):
+            legacy = legacy.decode('utf-8')
+        cart = json.loads(legacy) if legacy else {}
+
+        pipe = self.redis.pipeline()
+        pipe.delete(key)
+        fields = _encode_cart(cart)
+        if fields:
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, CART_TTL_SECONDS)
+        pipe.execute()
+        logger.info("Converted legacy cart for %s to a hash", user_id)
+
+    def _set_cart_fields(self, user_id, fields):
+        """Set top-level cart fields and refresh the cart expiry in one round trip"""
+        uow = _unit_of_work_for(user_id)
+        if uow:
+            uow.set_cart_fields(fields)
+            return
+
+        key = _cart_key(user_id)
+        mapping = _encode_cart_fields(fields)
+
+        def operation():
+            pipe = self.redis.pipeline()
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, CART_TTL_SECONDS)
+            pipe.execute()
+
+        self._cart_call(user_id, operation)
+
     def get_cart(self, user_id):
         """Get user's cart from Redis"""
+        uow = _unit_of_work_for(user_id)
+        if uow:
+            return uow.get_cart()
         try:
-            cart = self.redis.get(f"user:{BRAND_ID}:{user_id}:cart")
-            if cart:
-                # Decode if cart is bytes
-                if isinstance(cart, bytes):
-                    cart = cart.decode('utf-8')
-                cart_data = json.loads(cart)
-                # Validate cart structure
-                if "items" not in cart_data:
-                    cart_data["items"] = []
-                if "total" not in cart_data:
-                    cart_data["total"] = 0
-                return cart_data
-            return {"items": [], "total": 0}
+            raw = self._cart_call(user_id, lambda: self.redis.hgetall(_cart_key(user_id)))
+            return _decode_cart(raw)
         except Exception as e:
             logger.error(f"Error getting cart for {user_id}: {str(e)}")
             return {"items": [], "total": 0}
 
+    def get_carts(self, user_ids):
+        """Get several users' carts in one round trip, as {user_id: cart}"""
+        pipe = self.redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hgetall(_cart_key(user_id))
+        carts = {}
+        for user_id, raw in zip(user_ids, pipe.execute(raise_on_error=False)):
+            # Legacy JSON carts fail with WRONGTYPE; get_cart converts them
+            carts[user_id] = self.get_cart(user_id) if isinstance(raw, Exception) else _decode_cart(raw)
+        return carts
+
     def add_to_cart(self, user_id, item_id, quantity=1):
         """Add item to user's cart using catalog item ID"""
+        cart, added = self.add_items_to_cart(user_id, [(item_id, quantity)])
+        return cart if added else None
+
+    def add_items_to_cart(self, user_id, items):
+        """Add several (item_id, quantity) pairs to a cart in a single Redis call.
+
+        Unknown and out-of-stock items are skipped. Returns (cart, number of
+        items added).
+        """
         try:
-            from config.settings import PRODUCT_CATALOG
+            from services.catalog_service import lookup_product
             
-            cart = self.get_cart(user_id)
-            
-            # Get product details from catalog
-            product = PRODUCT_CATALOG.get(item_id)
-            if not product:
-                logger.error(f"Product ID {item_id} not found in catalog")
-                return None
-            
-            # Check if item already in cart
-            item_found = False
-            for cart_item in cart["items"]:
-                if cart_item["id"] == item_id:
-                    cart_item["quantity"] += quantity
-                    item_found = True
-                    break
-            
-            if not item_found:
-                cart["items"].append({
-                    "id": item_id,
-                    "name": product["name"],
-                    "quantity": quantity,
-                    "price": product["price"]
-                })
+            # Get product details from the brand's synced catalog
+            lines = []
+            for item_id, quantity in items:
+                product = lookup_product(item_id)
+                if not product:
+                    logger.error(f"Product ID {item_id} not found in catalog")
+                elif not product["available"]:
+                    logger.warning(f"Product ID {item_id} is out of stock")
+                else:
+                    lines.append((item_id, product["name"], to_amount(product["price"]), int(quantity)))
+            if not lines:
+                return self.get_cart(user_id), 0
             
-            # Update total
-            cart["total"] = sum(item["quantity"] * item["price"] for item in cart["items"])
+            uow = _unit_of_work_for(user_id)
+            if uow:
+                uow.add_items(lines)
+                return uow.get_cart(), len(lines)
             
-            # Set expiry to 24 hours
-            self.redis.setex(
-                f"user:{BRAND_ID}:{user_id}:cart",
-                86400,
-                json.dumps(cart),
-            )
-            logger.debug(f"Added {quantity}x {product['name']} (ID: {item_id}) to cart for {user_id}")
-            return cart
+            raw = self._cart_call(user_id, lambda: self._add_to_cart_script(
+                keys=[_cart_key(user_id), _cart_reminders_key()],
+                args=_add_to_cart_args(user_id, lines),
+            ))
+            # Scripts return HGETALL as a flat [field, value, ...] list
+            cart = _decode_cart(dict(zip(raw[::2], raw[1::2])))
+            logger.debug("Added %s items to cart for %s", len(lines), user_id)
+            return cart, len(lines)
         except Exception as e:
             logger.error(f"Error adding to cart for {user_id}: {str(e)}")
-            return self.get_cart(user_id)
+            return self.get_cart(user_id), 0
 
     def clear_cart(self, user_id):
         """Clear user's cart"""
+        uow = _unit_of_work_for(user_id)
+        if uow:
+            uow.clear_cart()
+            return True
         try:
-            self.redis.delete(f"user:{BRAND_ID}:{user_id}:cart")
-            logger.debug(f"Cleared cart for {user_id}")
+            # Clearing the cart (including at checkout) also cancels its abandonment reminder
+            pipe = self.redis.pipeline()
+            pipe.delete(_cart_key(user_id))
+            pipe.zrem(_cart_reminders_key(), _cart_reminder_member(user_id))
+            pipe.execute()
+            logger.debug("Cleared cart for %s", user_id)
             return True
         except Exception as e:
             logger.error(f"Error clearing cart for {user_id}: {str(e)}")
@@ -138,16 +666,10 @@ class RedisState:
     def set_branch(self, user_id, branch):
         """Set user's selected branch"""
         try:
-            cart = self.get_cart(user_id)
-            cart["branch"] = branch
-            self.redis.setex(
-                f"user:{BRAND_ID}:{user_id}:cart",
-                86400,
-                json.dumps(cart),
-            )
+            self._set_cart_fields(user_id, {"branch": branch})
             
             # Log branch selection
-            logger.info(f"Branch set for {user_id}: {branch}")
+            logger.info("Branch set for %s: %s", user_id, branch)
             return True
         except Exception as e:
             logger.error(f"Error setting branch for {user_id}: {str(e)}")
@@ -156,16 +678,10 @@ class RedisState:
     def set_delivery_type(self, user_id, delivery_type):
         """Set user's delivery type (Delivery or Takeaway)"""
         try:
-            cart = self.get_cart(user_id)
-            cart["delivery_type"] = delivery_type
-            self.redis.setex(
-                f"user:{BRAND_ID}:{user_id}:cart",
-                86400,
-                json.dumps(cart),
-            )
+            self._set_cart_fields(user_id, {"delivery_type": delivery_type})
             
             # Log delivery type
-            logger.info(f"Delivery type set for {user_id}: {delivery_type}")
+            logger.info("Delivery type set for %s: %s", user_id, delivery_type)
             return True
         except Exception as e:
             logger.error(f"Error setting delivery type for {user_id}: {str(e)}")
@@ -174,16 +690,10 @@ class RedisState:
     def set_payment_method(self, user_id, payment_method):
         """Set user's payment method"""
         try:
-            cart = self.get_cart(user_id)
-            cart["payment_method"] = payment_method
-            self.redis.setex(
-                f"user:{BRAND_ID}:{user_id}:cart",
-                86400,
-                json.dumps(cart),
-            )
+            self._set_cart_fields(user_id, {"payment_method": payment_method})
             
             # Log payment method
-            logger.info(f"Payment method set for {user_id}: {payment_method}")
+            logger.info("Payment method set for %s: %s", user_id, payment_method)
             return True
         except Exception as e:
             logger.error(f"Error setting payment method for {user_id}: {str(e)}")
@@ -193,17 +703,27 @@ class RedisState:
         """Create a new order in Redis"""
         try:
             order_id = order_data["order_id"]
-            
-            # Add to main orders list
-            self.redis.rpush("orders:all", json.dumps(order_data))
-            
-            # Add to branch-specific list
-            self.redis.rpush(f"orders:branch:{order_data['branch'].lower()}", json.dumps(order_data))
-            
-            # Set as active for 7 days
-            self.redis.setex(f"order:{order_id}:active", 604800, "1")  # 7 days
-            
-            logger.info(f"Order {order_id} created in Redis")
+            order_key = _order_key(order_id)
+
+            expires_at = time.time() + ORDER_TTL_SECONDS
+
+            def write(pipe):
+                # The per-order hash is the source of truth; the indexes point into it
+                pipe.hset(order_key, mapping=_encode_order(order_data))
+                pipe.expire(order_key, ORDER_TTL_SECONDS)
+                pipe.zadd(_branch_index_key(order_data["branch"]), {order_id: expires_at})
+                pipe.zadd(_status_index_key(order_data["status"]), {order_id: expires_at})
+
+                # Set as active for 7 days
+                pipe.setex(f"order:{order_id}:active", ORDER_TTL_SECONDS, "1")
+
+            # Inside a request the order is stored with the request's other writes
+            uow = _current_unit_of_work()
+            if uow is not None:
+                uow.orders[order_id] = copy.deepcopy(order_data)
+            self._write(write)
+
+            logger.info("Order %s created in Redis", order_id)
             return True
         except Exception as e:
             logger.error(f"Error creating order in Redis: {str(e)}")
@@ -211,52 +731,78 @@ class RedisState:
 
     def get_order(self, order_id):
         """Get order details from Redis"""
+        uow = _current_unit_of_work()
+        if uow is not None and order_id in uow.orders:
+            return copy.deepcopy(uow.orders[order_id])
         try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.exists(f"order:{order_id}:active")
+            pipe.hgetall(_order_key(order_id))
+            active, raw = pipe.execute()
+
             # Check if order is active
-            if not self.redis.exists(f"order:{order_id}:active"):
+            if not active or not raw:
                 return None
-            
-            # Search in all orders
-            all_orders = self.redis.lrange("orders:all", 0, -1)
-            for order_str in all_orders:
-                # Decode if order_str is bytes
-                if isinstance(order_str, bytes):
-                    order_str = order_str.decode('utf-8')
-                
-                order = json.loads(order_str)
-                if order["order_id"] == order_id:
-                    return order
-            
-            return None
+            return _decode_order(raw)
         except Exception as e:
             logger.error(f"Error getting order {order_id}: {str(e)}")
             return None
 
+    def get_order_ids(self, branch=None, status=None):
+        """Get active order IDs filtered by branch and/or status"""
+        try:
+            keys = []
+            if branch:
+                keys.append(_branch_index_key(branch))
+            if status:
+                keys.append(_status_index_key(status))
+            if not keys:
+                return []
+
+            # Trim ids whose order has expired, then intersect what is left
+            now = time.time()
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.zremrangebyscore(key, "-inf", now)
+                pipe.zrange(key, 0, -1)
+            results = pipe.execute()
+            members = set.intersection(*(set(results[i]) for i in range(1, len(results), 2)))
+            return sorted(m.decode('utf-8') if isinstance(m, bytes) else m for m in members)
+        except Exception as e:
+            logger.error(f"Error getting order ids for branch={branch} status={status}: {str(e)}")
+            return []
+
     def update_order_status(self, order_id, status):
-        """Update order status in Redis"""
+        """Update order status in Redis if the transition is allowed"""
         try:
-            order = self.get_order(order_id)
-            if not order:
+            previous = allowed_previous_statuses(status)
+            if not previous:
+                logger.warning(f"Unknown target status {status} for order {order_id}")
                 return False
-            
-            # Update status
-            order["status"] = status
-            order["updated_at"] = get_current_ist().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Remove old order
-            order_json = json.dumps(order, sort_keys=True)
-            self.redis.lrem("orders:all", 0, order_json)
-            
-            # Add updated order
-            self.redis.rpush("orders:all", json.dumps(order))
-            
-            # Update in branch-specific list
-            branch_list_key = f"orders:branch:{order['branch'].lower()}"
-            self.redis.lrem(branch_list_key, 0, order_json)
-            self.redis.rpush(branch_list_key, json.dumps(order))
-            
-            logger.info(f"Order {order_id} status updated to {status}")
-            return True
+
+            updated_at = get_current_ist().strftime("%Y-%m-%d %H:%M:%S")
+            result = self._update_order_status_script(
+                keys=[
+                    _order_key(order_id),
+                    f"order:{order_id}:active",
+                    _status_index_key(status),
+                ] + [_status_index_key(s) for s in previous],
+                args=[
+                    json.dumps(status),
+                    json.dumps(updated_at),
+                    order_id,
+                ] + [json.dumps(s) for s in previous],
+            )
+
+            if result == 1:
+                logger.info("Order %s status updated to %s", order_id, status)
+                analytics_store.record_status(order_id, status)
+                return True
+            if result == 0:
+                logger.warning(f"Rejected status transition to {status} for order {order_id}")
+            else:
+                logger.warning(f"Order {order_id} not found for status update")
+            return False
         except Exception as e:
             logger.error(f"Error updating order {order_id} status: {str(e)}")
             return False
@@ -267,92 +813,215 @@ class RedisState:
             order = self.get_order(order_id)
             if not order:
                 return False
-            
-            # Add to archive
-            self.redis.rpush("orders:archive", json.dumps(order))
-            
-            # Remove from active lists
-            order_json = json.dumps(order, sort_keys=True)
-            self.redis.lrem("orders:all", 0, order_json)
-            self.redis.lrem(f"orders:branch:{order['branch'].lower()}", 0, order_json)
-            
-            # Delete active flag
-            self.redis.delete(f"order:{order_id}:active")
-            
-            logger.info(f"Order {order_id} archived successfully")
+
+            # Move the order to the archive and drop its record, indexes and active flag
+            def write(pipe):
+                pipe.rpush("orders:archive", json.dumps(order))
+                pipe.delete(_order_key(order_id))
+                pipe.zrem(_branch_index_key(order["branch"]), order_id)
+                pipe.zrem(_status_index_key(order["status"]), order_id)
+                pipe.delete(f"order:{order_id}:active")
+
+            self._write(write)
+
+            logger.info("Order %s archived successfully", order_id)
             return True
         except Exception as e:
             logger.error(f"Error archiving order {order_id}: {str(e)}")
             return False
 
-    def schedule_cart_reminder(self, user_id, order_id, delay_hours=2):
-        """Schedule a cart reminder"""
+    def migrate_order_index(self):
+        """Backfill per-order hashes and indexes from the legacy orders:all list.
+
+        One process runs the backfill under a lock, and the done marker is set
+        only once it has succeeded; if the process dies partway, the lock
+        expires and the next process to start runs it again (already indexed
+        orders are skipped).
+        """
+        lock_token = uuid.uuid4().hex
         try:
-            reminder_time = get_current_ist() + timedelta(hours=delay_hours)
-            reminder_data = {
-                "user_id": user_id,
-                "order_id": order_id,
-                "scheduled_at": reminder_time.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-            # Add to reminders list
-            self.redis.rpush(
-                f"cart:{BRAND_ID}:reminders", json.dumps(reminder_data)
-            )
+            if self.redis.exists("orders:index:migrated"):
+                return 0
+            if not self.redis.set("orders:index:migrating", lock_token, nx=True, ex=ORDER_MIGRATION_LOCK_SECONDS):
+                return 0
 
-            # Set reminder time as key for easy retrieval
-            self.redis.setex(
-                f"cart:{BRAND_ID}:reminder:{user_id}:{order_id}",
-                int(delay_hours * 3600),
-                "1",
-            )
+            # Later entries are newer copies of the same order, so the last one wins
+            latest = {}
+            length = self.redis.llen("orders:all")
+            for start in range(0, length, ORDER_MIGRATION_BATCH):
+                for order_str in self.redis.lrange("orders:all", start, start + ORDER_MIGRATION_BATCH - 1):
+                    if isinstance(order_str, bytes):
+                        order_str = order_str.decode('utf-8')
+                    try:
+                        order = json.loads(order_str)
+                        latest[order["order_id"]] = order
+                    except (ValueError, KeyError):
+                        continue
+
+            order_ids = list(latest)
+            migrated = 0
+            for start in range(0, len(order_ids), ORDER_MIGRATION_BATCH):
+                batch = order_ids[start:start + ORDER_MIGRATION_BATCH]
+
+                # Remaining lifetime of each order and whether it was already indexed
+                pipe = self.redis.pipeline(transaction=False)
+                for order_id in batch:
+                    pipe.pttl(f"order:{order_id}:active")
+                    pipe.exists(_order_key(order_id))
+                results = pipe.execute()
+
+                now = time.time()
+                pipe = self.redis.pipeline(transaction=False)
+                for i, order_id in enumerate(batch):
+                    ttl_ms, indexed = results[2 * i], results[2 * i + 1]
+                    if ttl_ms is None or ttl_ms <= 0 or indexed:
+                        continue
+                    order = latest[order_id]
+                    expires_at = now + ttl_ms / 1000
+                    pipe.hset(_order_key(order_id), mapping=_encode_order(order))
+                    pipe.pexpire(_order_key(order_id), ttl_ms)
+                    pipe.zadd(_branch_index_key(order["branch"]), {order_id: expires_at})
+                    pipe.zadd(_status_index_key(order["status"]), {order_id: expires_at})
+                    migrated += 1
+                pipe.execute()
+
+            self.redis.set("orders:index:migrated", get_current_ist().strftime("%Y-%m-%d %H:%M:%S"))
+            logger.info("Backfilled %s active orders into the order index", migrated)
+            return migrated
+        except Exception as e:
+            logger.error(f"Error migrating order index: {str(e)}")
+            return 0
+        finally:
+            try:
+                if self.redis.get("orders:index:migrating") == lock_token.encode():
+                    self.redis.delete("orders:index:migrating")
+            except Exception as e:
+                logger.error(f"Error releasing order index migration lock: {str(e)}")
+
+    def set_pending_order(self, order_id, pending_order, ttl=3600):
+        """Store an online order awaiting payment (with the current request's writes)"""
+        payload = json.dumps(pending_order)
+        self._write(lambda pipe: pipe.setex(f"pending_order:{order_id}", ttl, payload))
+
+    def delete_pending_order(self, order_id):
+        """Drop a pending online order (with the current request's writes)"""
+        self._write(lambda pipe: pipe.delete(f"pending_order:{order_id}"))
+
+    def schedule_cart_reminder(self, user_id, delay_hours=None):
+        """Schedule (or push back) the abandonment reminder for a user's cart"""
+        try:
+            self.redis.zadd(_cart_reminders_key(), {_cart_reminder_member(user_id): _cart_reminder_due(delay_hours)})
             
-            logger.info(f"Scheduled cart reminder for {user_id} (order {order_id}) in {delay_hours} hours")
+            logger.info("Scheduled cart reminder for %s", user_id)
             return True
         except Exception as e:
             logger.error(f"Error scheduling cart reminder: {str(e)}")
             return False
 
-    def get_pending_cart_reminders(self):
-        """Get all pending cart reminders"""
+    def claim_due_cart_reminders(self, limit=100, now=None):
+        """Remove and return up to `limit` of the current brand's reminders that are due"""
         try:
+            now = now if now is not None else get_current_ist().timestamp()
+            claimed = self._claim_due_reminders_script(keys=[_cart_reminders_key()], args=[now, limit])
             reminders = []
-            all_reminders = self.redis.lrange(
-                f"cart:{BRAND_ID}:reminders", 0, -1
-            )
-            
-            for reminder_str in all_reminders:
-                # Decode if reminder_str is bytes
+            for reminder_str in claimed:
                 if isinstance(reminder_str, bytes):
                     reminder_str = reminder_str.decode('utf-8')
-                
-                reminder = json.loads(reminder_str)
-                scheduled_at = datetime.strptime(reminder["scheduled_at"], "%Y-%m-%d %H:%M:%S")
-                
-                if get_current_ist() >= scheduled_at:
-                    reminders.append(reminder)
-            
+                reminders.append(json.loads(reminder_str))
             return reminders
         except Exception as e:
-            logger.error(f"Error getting pending cart reminders: {str(e)}")
+            logger.error(f"Error claiming due cart reminders: {str(e)}")
             return []
+
+    def restore_cart_reminders(self, user_ids, delay_seconds):
+        """Put claimed reminders that could not be sent back, due in `delay_seconds`.
+
+        A reminder scheduled again in the meantime (the user touched their
+        cart) is kept as it is.
+        """
+        try:
+            due = get_current_ist().timestamp() + delay_seconds
+            self.redis.zadd(_cart_reminders_key(), {_cart_reminder_member(user_id): due for user_id in user_ids}, nx=True)
+            logger.info("Restored %s cart reminders for retry", len(user_ids))
+            return True
+        except Exception as e:
+            logger.error(f"Error restoring {len(user_ids)} cart reminders: {str(e)}")
+            return False
+
+    def next_cart_reminder_due(self):
+        """Epoch second the current brand's earliest reminder is due, or None if there are none"""
+        try:
+            earliest = self.redis.zrange(_cart_reminders_key(), 0, 0, withscores=True)
+            return earliest[0][1] if earliest else None
+        except Exception as e:
+            logger.error(f"Error reading next cart reminder: {str(e)}")
+            return None
+
+    def migrate_cart_reminders(self):
+        """Move reminders from the legacy list into the due-time sorted set.
+
+        Legacy entries tied to an order_id were scheduled when the order was
+        placed, not when a cart was abandoned, so they are dropped rather than
+        turned into abandonment reminders for whatever the user has in their
+        cart now.
+        """
+        migrating_key = f"{LEGACY_CART_REMINDERS_KEY}:migrating"
+        try:
+            # Only one process gets to rename the list
+            self.redis.rename(LEGACY_CART_REMINDERS_KEY, migrating_key)
+        except redis.exceptions.ResponseError:
+            return 0
+        except Exception as e:
+            logger.error(f"Error migrating cart reminders: {str(e)}")
+            return 0
+
+        try:
+            reminders = {}
+            skipped = 0
+            for reminder_str in self.redis.lrange(migrating_key, 0, -1):
+                if isinstance(reminder_str, bytes):
+                    reminder_str = reminder_str.decode('utf-8')
+                try:
+                    reminder = json.loads(reminder_str)
+                    scheduled_at = IST.localize(datetime.strptime(reminder["scheduled_at"], "%Y-%m-%d %H:%M:%S"))
+                except (ValueError, KeyError):
+                    continue
+                if reminder.get("order_id"):
+                    skipped += 1
+                    continue
+                member = _cart_reminder_member(reminder["user_id"])
+                reminders[member] = min(scheduled_at.timestamp(), reminders.get(member, float("inf")))
+
+            pipe = self.redis.pipeline()
+            if reminders:
+                pipe.zadd(_cart_reminders_key(), reminders)
+            pipe.delete(migrating_key)
+            pipe.execute()
+
+            logger.info("Migrated %s legacy cart reminders, dropped %s tied to placed orders", len(reminders), skipped)
+            return len(reminders)
+        except Exception as e:
+            logger.error(f"Error migrating cart reminders: {str(e)}")
+            return 0
+    
+    def claim_daily_run(self, job, day):
+        """True the first time `job` is claimed for `day` across all processes"""
+        try:
+            return bool(self.redis.set(f"scheduler:{BRAND_ID}:{job}:{day}", "1", nx=True, ex=2 * 86400))
+        except Exception as e:
+            logger.error(f"Error claiming daily run of {job}: {str(e)}")
+            return False
     
     def set_location(self, user_id, latitude, longitude):
         """Set user's location coordinates"""
         try:
-            cart = self.get_cart(user_id)
-            cart["location"] = {
+            self._set_cart_fields(user_id, {"location": {
                 "latitude": latitude,
                 "longitude": longitude,
-            }
-            self.redis.setex(
-                f"user:{BRAND_ID}:{user_id}:cart",
-                86400,
-                json.dumps(cart),
-            )
+            }})
             
             # Log location
-            logger.info(f"Location coordinates set for {user_id}: {latitude}, {longitude}")
+            logger.info("Location coordinates set for %s: %s, %s", user_id, latitude, longitude)
             return True
         except Exception as e:
             logger.error(f"Error setting location coordinates for {user_id}: {str(e)}")
@@ -361,16 +1030,10 @@ class RedisState:
     def set_delivery_address(self, user_id, address):
         """Set user's delivery address (text version)"""
         try:
-            cart = self.get_cart(user_id)
-            cart["delivery_address"] = address
-            self.redis.setex(
-                f"user:{BRAND_ID}:{user_id}:cart",
-                86400,
-                json.dumps(cart),
-            )
+            self._set_cart_fields(user_id, {"delivery_address": address})
             
             # Log address
-            logger.info(f"Delivery address set for {user_id}")
+            logger.info("Delivery address set for %s", user_id)
             return True
         except Exception as e:
             logger.error(f"Error setting delivery address for {user_id}: {str(e)}")
@@ -405,6 +1068,44 @@ class RedisState:
                 "maps_link": None
             }
     
+    def claim_events(self, source, event_ids, ttl=None):
+        """Mark webhook event ids as processed with SET NX.
+
+        Returns the ids that had not been seen before; duplicates are left out.
+        If Redis is unavailable every id is returned so no work is lost.
+        """
+        from config.settings import WEBHOOK_DEDUP_TTL_SECONDS
+
+        event_ids = list(dict.fromkeys(event_ids))
+        if not event_ids:
+            return []
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for event_id in event_ids:
+                pipe.set(
+                    f"processed:{BRAND_ID}:{source}:{event_id}",
+                    "1",
+                    nx=True,
+                    ex=ttl or WEBHOOK_DEDUP_TTL_SECONDS,
+                )
+            results = pipe.execute()
+            return [event_id for event_id, claimed in zip(event_ids, results) if claimed]
+        except Exception as e:
+            logger.error(f"Error claiming {source} events: {str(e)}")
+            return event_ids
+
+    def release_events(self, source, event_ids):
+        """Forget claimed event ids whose processing failed, so a redelivery is handled again"""
+        event_ids = [event_id for event_id in event_ids if event_id]
+        if not event_ids:
+            return True
+        try:
+            self.redis.delete(*[f"processed:{BRAND_ID}:{source}:{event_id}" for event_id in event_ids])
+            return True
+        except Exception as e:
+            logger.error(f"Error releasing {source} events: {str(e)}")
+            return False
+
     def set_brand_discount(self, discount_percentage, brand_id=None):
         """Set brand-specific discount percentage (0-100)"""
         try:
@@ -412,9 +1113,9 @@ class RedisState:
             if not (0 <= discount_percentage <= 100):
                 logger.error("Discount percentage must be between 0 and 100")
                 return False
-            brand = brand_id or os.getenv("BRAND_ID", "default")
+            brand = _brand_id(brand_id)
             self.redis.set(f"brand:{brand}:discount", str(discount_percentage))
-            logger.info(f"Discount for {brand} set to {discount_percentage}%")
+            logger.info("Discount for %s set to %s%%", brand, discount_percentage)
             return True
         except Exception as e:
             logger.error(f"Error setting discount: {str(e)}")
@@ -423,7 +1124,7 @@ class RedisState:
     def get_brand_discount(self, brand_id=None):
         """Get brand-specific discount percentage"""
         try:
-            brand = brand_id or os.getenv("BRAND_ID", "default")
+            brand = _brand_id(brand_id)
             discount = self.redis.get(f"brand:{brand}:discount")
             if discount:
                 if isinstance(discount, bytes):
@@ -437,7 +1138,7 @@ class RedisState:
     def clear_brand_discount(self, brand_id=None):
         """Clear brand discount (set to 0%)"""
         try:
-            brand = brand_id or os.getenv("BRAND_ID", "default")
+            brand = _brand_id(brand_id)
             self.redis.delete(f"brand:{brand}:discount")
             logger.info("Brand discount cleared")
             return True
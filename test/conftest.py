@@ -0,0 +1,59 @@
+# test/conftest.py
+"""Shared fixtures for the Python tests.
+
+The app creates its Redis client when modules are imported, so Redis is
+swapped for an in-memory fakeredis server before any app module loads.
+Lua scripts run for real (fakeredis executes them with lupa).
+"""
+import os
+import sys
+import tempfile
+
+import fakeredis
+import pytest
+import redis
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("BRAND_ID", "kanuka")
+os.environ.setdefault("ANALYTICS_DB", os.path.join(tempfile.mkdtemp(), "analytics.db"))
+
+_server = fakeredis.FakeServer()
+
+
+def _pool_from_url(url, **kwargs):
+    return redis.ConnectionPool(connection_class=fakeredis.FakeRedisConnection, server=_server)
+
+
+redis.ConnectionPool.from_url = staticmethod(_pool_from_url)
+
+
+@pytest.fixture(autouse=True)
+def redis_client():
+    """The app's Redis client, emptied before every test"""
+    from stateHandlers.redis_state import redis_state
+
+    redis_state.redis.flushall()
+    return redis_state.redis
+
+
+@pytest.fixture
+def brand():
+    from config.brand_registry import brand_registry
+
+    return brand_registry.default
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    """Messages queued for delivery, as (recipient, payload) pairs; nothing is sent"""
+    from services.whatsapp_service import outbound_queue
+
+    queued = []
+
+    def enqueue_many(messages, fallback=None, context=None):
+        queued.extend(messages)
+        return [f"job{len(queued) - i}" for i in range(len(messages))]
+
+    monkeypatch.setattr(outbound_queue, "enqueue_many", enqueue_many)
+    return queued
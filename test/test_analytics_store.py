@@ -0,0 +1,70 @@
+# test/test_analytics_store.py
+"""Analytics store: the branch_daily rollup follows orders through status changes"""
+import pytest
+
+from config.brand_registry import use_brand
+from config.settings import ORDER_STATUS
+from utils.analytics_store import AnalyticsStore
+
+DAY = "2026-10-18"
+
+
+def order(order_id, total, branch="Main"):
+    return {
+        "order_id": order_id,
+        "user_id": "919800000001",
+        "branch": branch,
+        "order_date": f"{DAY} 10:00:00",
+        "status": ORDER_STATUS["PAID"],
+        "total": total,
+        "items": [{"id": "p1", "name": "Product", "quantity": 1, "price": total}],
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AnalyticsStore(path=str(tmp_path / "analytics.db"), flush_interval=0.01)
+
+
+def daily(store):
+    return [(row["branch"], row["orders"], row["revenue"]) for row in store.revenue_by_branch_day(DAY, DAY)]
+
+
+def test_recorded_orders_are_rolled_up_per_branch(store):
+    store.record_order(order("ORD1", 100))
+    store.record_order(order("ORD2", 50))
+    store.record_order(order("ORD3", 20, branch="East"))
+    store.close()
+
+    assert sorted(daily(store)) == [("East", 1, 20.0), ("Main", 2, 150.0)]
+
+
+def test_cancelling_an_order_takes_it_out_of_the_rollup(store):
+    store.record_order(order("ORD1", 100))
+    store.record_order(order("ORD2", 50))
+    store.record_status("ORD1", ORDER_STATUS["CANCELLED"])
+    store.close()
+
+    assert daily(store) == [("Main", 1, 50.0)]
+
+
+def test_other_status_changes_and_repeats_leave_the_rollup_alone(store):
+    store.record_order(order("ORD1", 100))
+    store.record_order(order("ORD1", 100))
+    store.record_status("ORD1", ORDER_STATUS["READY"])
+    store.record_status("ORD1", ORDER_STATUS["CANCELLED"])
+    store.record_status("ORD1", ORDER_STATUS["CANCELLED"])
+    store.close()
+
+    assert daily(store) == [("Main", 0, 0.0)]
+
+
+def test_rollup_is_kept_per_brand(store):
+    store.record_order(order("ORD1", 100))
+    with use_brand("zumi"):
+        store.record_order(order("ORD2", 70))
+    store.close()
+
+    assert daily(store) == [("Main", 1, 100.0)]
+    with use_brand("zumi"):
+        assert daily(store) == [("Main", 1, 70.0)]
@@ -0,0 +1,51 @@
+# test/test_audit_sink.py
+"""Audit CSV rows are buffered and appended in batches off the request path"""
+import csv
+
+import pytest
+
+from utils import csv_utils
+from utils.csv_utils import AuditSink, current_partition
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    # Partition maintenance walks the real log directories; not needed here
+    monkeypatch.setattr(csv_utils, "_maintenance_loop", lambda: None)
+    return AuditSink(batch_size=2, flush_interval=0.01)
+
+
+def rows(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_rows_are_appended_per_file_in_order_with_one_header(sink, tmp_path):
+    orders, activity = str(tmp_path / "orders.csv"), str(tmp_path / "activity.csv")
+
+    for i in range(5):
+        sink.submit(orders, {"order_id": f"ORD{i}", "total": i})
+    sink.submit(activity, {"user_id": "919800000001", "action": "message_received"})
+    sink.close()
+
+    assert [row["order_id"] for row in rows(current_partition(orders))] == [f"ORD{i}" for i in range(5)]
+    assert rows(current_partition(activity)) == [{"user_id": "919800000001", "action": "message_received"}]
+
+
+def test_submit_does_not_touch_the_filesystem(sink, tmp_path, monkeypatch):
+    monkeypatch.setattr(sink, "start", lambda: None)
+
+    sink.submit(str(tmp_path / "orders.csv"), {"order_id": "ORD1"})
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_a_failing_file_does_not_lose_the_other_files_rows(sink, tmp_path):
+    blocked = tmp_path / "blocked"
+    blocked.write_text("a file, not a directory")
+
+    sink.submit(str(blocked / "orders.csv"), {"order_id": "ORD1"})
+    sink.submit(str(tmp_path / "activity.csv"), {"action": "ok"})
+    sink.close()
+
+    assert rows(current_partition(str(tmp_path / "activity.csv"))) == [{"action": "ok"}]
@@ -0,0 +1,67 @@
+# test/test_branch_locator.py
+"""The grid-indexed branch locator agrees with checking every branch"""
+import random
+
+import pytest
+
+from config.brand_registry import brand_registry
+from utils.location_utils import BranchLocator, calculate_distance, get_branch_locator
+
+HYDERABAD = (17.385, 78.4867)
+
+
+def scan(branches, latitude, longitude):
+    return sorted(
+        ((branch, calculate_distance(latitude, longitude, lat, lon)) for branch, (lat, lon) in branches.items()),
+        key=lambda match: match[1]
+    )
+
+
+@pytest.fixture
+def branches():
+    rng = random.Random(7)
+    return {
+        f"Branch {i}": (HYDERABAD[0] + rng.uniform(-0.3, 0.3), HYDERABAD[1] + rng.uniform(-0.3, 0.3))
+        for i in range(60)
+    }
+
+
+def queries(count=200):
+    rng = random.Random(11)
+    # Mostly inside the service area, some far outside it
+    for i in range(count):
+        spread = 0.4 if i % 10 else 5
+        yield HYDERABAD[0] + rng.uniform(-spread, spread), HYDERABAD[1] + rng.uniform(-spread, spread)
+
+
+def test_nearest_matches_a_linear_scan(branches):
+    locator = BranchLocator(branches, cell_km=5)
+
+    for latitude, longitude in queries():
+        expected = scan(branches, latitude, longitude)[:3]
+        found = locator.nearest(latitude, longitude, k=3)
+        assert [distance for _, distance in found] == pytest.approx([distance for _, distance in expected])
+
+
+def test_within_radius_matches_a_linear_scan(branches):
+    locator = BranchLocator(branches, cell_km=5)
+
+    for latitude, longitude in queries():
+        expected = [match for match in scan(branches, latitude, longitude) if match[1] <= 8]
+        assert locator.within_radius(latitude, longitude, radius_km=8) == expected
+
+
+def test_no_branches_means_no_match():
+    locator = BranchLocator({})
+
+    assert locator.nearest(*HYDERABAD) == []
+    assert locator.within_radius(*HYDERABAD) == []
+
+
+def test_locator_is_rebuilt_when_the_brand_is_reloaded():
+    locator = get_branch_locator(brand_registry.default)
+    assert get_branch_locator(brand_registry.default) is locator
+
+    brand_registry.load()
+
+    assert get_branch_locator(brand_registry.default) is not locator
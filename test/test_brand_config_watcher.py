@@ -0,0 +1,58 @@
+# test/test_brand_config_watcher.py
+"""Brand config watcher: reload notices and restarting after fork"""
+import threading
+
+import pytest
+
+from config.brand_registry import brand_registry
+from services.brand_service import BrandConfigWatcher
+from utils.json_utils import dumps
+
+
+@pytest.fixture
+def watcher(redis_client):
+    return BrandConfigWatcher(brand_registry, redis_client, channel="test:brand_config", poll_seconds=60)
+
+
+def test_notice_without_digest_forces_a_reload(watcher):
+    version = brand_registry.version
+
+    assert watcher.handle_notice(dumps({"sender": "admin", "digest": None}))
+    assert brand_registry.version == version + 1
+
+
+def test_notice_with_our_digest_is_skipped(watcher):
+    version = brand_registry.version
+
+    assert not watcher.handle_notice(dumps({"sender": "other", "digest": brand_registry.digest}))
+    assert brand_registry.version == version
+
+
+def test_notice_with_another_digest_reloads(watcher):
+    version = brand_registry.version
+
+    assert watcher.handle_notice(dumps({"sender": "other", "digest": "0" * 64}).encode("utf-8"))
+    assert brand_registry.version == version + 1
+
+
+def test_own_notice_and_bare_sender_names(watcher):
+    version = brand_registry.version
+
+    assert not watcher.handle_notice(dumps({"sender": watcher.token, "digest": None}))
+    assert watcher.handle_notice(b"admin")
+    assert brand_registry.version == version + 1
+
+
+def test_watcher_restarts_in_a_forked_child(watcher, monkeypatch):
+    monkeypatch.setattr(watcher, "_listen", lambda: None)
+    finished = threading.Thread(target=lambda: None)
+    finished.start()
+    finished.join()
+    token = watcher.token
+    # What a forked child sees: the parent's thread objects, none of them running
+    watcher._threads = [finished]
+
+    watcher._after_fork_in_child()
+
+    assert watcher.token != token
+    assert watcher._threads[0].is_alive()
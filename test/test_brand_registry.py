@@ -0,0 +1,35 @@
+# test/test_brand_registry.py
+"""Brand registry: lookups, the current-brand context and Redis key namespaces"""
+from config.brand_registry import DEFAULT_KEY_NAMESPACE, brand_registry, get_current_brand, use_brand
+
+
+def test_default_brand_keeps_the_deployment_namespace():
+    assert brand_registry.default.key_namespace == DEFAULT_KEY_NAMESPACE
+    assert brand_registry.get("zumi").key_namespace == "zumi"
+
+
+def test_brands_are_found_by_phone_number_id():
+    assert brand_registry.for_phone_number_id("700017766525097").brand_id == "zumi"
+    assert brand_registry.for_phone_number_id("unknown") is None
+
+
+def test_use_brand_sets_the_current_brand_for_the_block():
+    assert get_current_brand() is brand_registry.default
+    with use_brand("zumi") as brand:
+        assert get_current_brand() is brand
+        with use_brand(brand_registry.default):
+            assert get_current_brand() is brand_registry.default
+        assert get_current_brand() is brand
+    assert get_current_brand() is brand_registry.default
+
+
+def test_unknown_brand_falls_back_to_the_default():
+    with use_brand("nope") as brand:
+        assert brand is brand_registry.default
+
+
+def test_greeting_uses_the_brand_name_and_real_line_breaks():
+    brand = brand_registry.get("zumi")
+
+    assert brand.greeting_message.startswith(f"🌿 *Welcome to {brand.name}*\n\n")
+    assert "\\n" not in brand.greeting_message
@@ -0,0 +1,52 @@
+# test/test_cart.py
+"""Carts stored as Redis hashes and updated field by field by ADD_TO_CART_SCRIPT"""
+import time
+
+from stateHandlers.redis_state import (
+    _add_to_cart_args,
+    _cart_key,
+    _cart_reminder_member,
+    _cart_reminders_key,
+    redis_state
+)
+
+
+def add_lines(user_id, lines):
+    redis_state._add_to_cart_script(
+        keys=[_cart_key(user_id), _cart_reminders_key()],
+        args=_add_to_cart_args(user_id, lines),
+    )
+    return redis_state.get_cart(user_id)
+
+
+def test_add_to_cart_merges_quantities_and_keeps_the_total(redis_client):
+    add_lines("u1", [("a", "Apple", 100, 2), ("b", "Banana", 12.5, 1)])
+    cart = add_lines("u1", [("a", "Apple", 100, 1)])
+
+    assert [(item["id"], item["quantity"], item["price"]) for item in cart["items"]] == [("a", 3, 100), ("b", 1, 12.5)]
+    assert cart["total"] == 312.5
+
+
+def test_add_to_cart_keeps_the_price_an_item_was_added_at(redis_client):
+    add_lines("u1", [("a", "Apple", 100, 1)])
+    cart = add_lines("u1", [("a", "Apple", 150, 1)])
+
+    assert cart["items"][0]["price"] == 100
+    assert cart["total"] == 200
+
+
+def test_add_to_cart_sets_ttl_and_pushes_back_the_reminder(redis_client):
+    add_lines("u1", [("a", "Apple", 100, 1)])
+
+    assert redis_client.ttl(_cart_key("u1")) > 0
+    assert redis_client.zscore(_cart_reminders_key(), _cart_reminder_member("u1")) > time.time()
+
+
+def test_add_items_to_cart_prices_from_the_catalog(brand):
+    retailer_id, listed = next(iter(brand.catalog.items()))
+
+    cart, added = redis_state.add_items_to_cart("u1", [(retailer_id, 2), ("no-such-product", 1)])
+
+    assert added == 1
+    assert cart["items"] == [{"id": retailer_id, "name": listed["name"], "quantity": 2, "price": listed["price"]}]
+    assert cart["total"] == 2 * listed["price"]
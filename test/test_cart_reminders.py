@@ -0,0 +1,97 @@
+# test/test_cart_reminders.py
+"""Cart abandonment reminders: due reminders are claimed and sent once, or put back if they cannot be"""
+import time
+
+import pytest
+
+from config.brand_registry import brand_registry
+from config.settings import CART_REMINDER_RETRY_SECONDS
+from handlers import reminder_handler
+from handlers.reminder_handler import process_cart_reminders
+from services.whatsapp_service import outbound_queue
+from stateHandlers.redis_state import _cart_reminder_member, _cart_reminders_key, redis_state
+from utils import csv_utils
+from utils.time_utils import get_current_ist
+
+PRODUCT_ID = next(iter(brand_registry.default.catalog))
+USER_ID = "919800000001"
+
+
+@pytest.fixture
+def logged(monkeypatch):
+    rows = []
+    monkeypatch.setattr(csv_utils, "log_cart_reminder", rows.append)
+    return rows
+
+
+@pytest.fixture
+def due_reminder(redis_client):
+    """A cart whose abandonment reminder is due now"""
+    redis_state.add_to_cart(USER_ID, PRODUCT_ID, 1)
+    redis_client.zadd(_cart_reminders_key(), {_cart_reminder_member(USER_ID): 0})
+
+
+def reminder_due(redis_client):
+    return redis_client.zscore(_cart_reminders_key(), _cart_reminder_member(USER_ID))
+
+
+def test_due_reminder_is_sent_once(due_reminder, outbox, logged, redis_client):
+    assert process_cart_reminders() == 1
+
+    assert [to for to, payload in outbox] == [USER_ID]
+    assert logged == [USER_ID]
+    assert reminder_due(redis_client) is None
+    assert process_cart_reminders() == 0
+
+
+def test_reminder_that_cannot_be_queued_is_put_back(due_reminder, logged, redis_client, monkeypatch):
+    monkeypatch.setattr(outbound_queue, "enqueue_many", lambda messages, fallback=None, context=None: [None])
+
+    assert process_cart_reminders() == 0
+
+    assert logged == []
+    assert reminder_due(redis_client) == pytest.approx(get_current_ist().timestamp() + CART_REMINDER_RETRY_SECONDS, abs=5)
+
+
+def test_reminders_are_put_back_when_carts_cannot_be_read(due_reminder, outbox, redis_client, monkeypatch):
+    def unavailable(user_ids):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(reminder_handler.redis_state, "get_carts", unavailable)
+
+    assert process_cart_reminders() == 0
+
+    assert outbox == []
+    assert reminder_due(redis_client) is not None
+
+
+def test_restoring_keeps_a_reminder_scheduled_in_the_meantime(redis_client):
+    redis_state.schedule_cart_reminder(USER_ID)
+    scheduled = reminder_due(redis_client)
+
+    redis_state.restore_cart_reminders([USER_ID], 1)
+
+    assert reminder_due(redis_client) == scheduled
+
+
+def test_due_reminders_are_claimed_once(redis_client):
+    now = time.time()
+    redis_client.zadd(_cart_reminders_key(), {
+        _cart_reminder_member("due1"): now - 60,
+        _cart_reminder_member("due2"): now - 30,
+        _cart_reminder_member("later"): now + 3600,
+    })
+
+    claimed = redis_state.claim_due_cart_reminders(now=now)
+
+    assert sorted(reminder["user_id"] for reminder in claimed) == ["due1", "due2"]
+    assert redis_state.claim_due_cart_reminders(now=now) == []
+    assert redis_state.next_cart_reminder_due() == pytest.approx(now + 3600)
+
+
+def test_reminder_claims_respect_the_limit(redis_client):
+    now = time.time()
+    redis_client.zadd(_cart_reminders_key(), {_cart_reminder_member(f"u{i}"): now - i for i in range(5)})
+
+    assert len(redis_state.claim_due_cart_reminders(limit=2, now=now)) == 2
+    assert redis_client.zcard(_cart_reminders_key()) == 3
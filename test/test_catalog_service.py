@@ -0,0 +1,123 @@
+# test/test_catalog_service.py
+import pytest
+
+from services import catalog_service
+from services.catalog_service import (
+    CatalogIndex,
+    FakeCatalogClient,
+    _products_key,
+    _version_key,
+    lookup_product,
+    parse_price,
+    sync_catalog
+)
+
+
+def product(retailer_id, price="₹1,200.00", availability="in stock"):
+    return {"retailer_id": retailer_id, "name": f"Product {retailer_id}", "price": price, "availability": availability}
+
+
+class FailingCatalogClient(FakeCatalogClient):
+    """Serves its first page, then fails like a Graph API error mid-sync"""
+
+    def iter_products(self):
+        yield from self.products[:self.page_size]
+        raise RuntimeError("Graph API unavailable")
+
+
+@pytest.fixture(autouse=True)
+def catalog_index(monkeypatch, redis_client):
+    # A fresh index that re-checks the synced version on every lookup
+    index = CatalogIndex(redis_client, refresh_seconds=0)
+    monkeypatch.setattr(catalog_service, "catalog_index", index)
+    return index
+
+
+def synced_ids(redis_client, brand):
+    return {key.decode("utf-8") for key in redis_client.hkeys(_products_key(brand.brand_id))}
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("₹1,200.00", 1200),
+    ("INR 99.50", 99.5),
+    (250.0, 250),
+    ("", None),
+    (None, None),
+])
+def test_parse_price(value, expected):
+    assert parse_price(value) == expected
+
+
+def test_sync_stores_every_page(redis_client, brand):
+    client = FakeCatalogClient([product(f"sku{i}") for i in range(5)], page_size=2)
+
+    assert sync_catalog(brand, client) == 5
+    assert client.pages_served == 3
+    assert synced_ids(redis_client, brand) == {f"sku{i}" for i in range(5)}
+    assert redis_client.exists(_version_key(brand.brand_id))
+    assert not redis_client.exists(f"{_products_key(brand.brand_id)}:syncing")
+
+
+def test_sync_replaces_the_previous_copy(redis_client, brand):
+    sync_catalog(brand, FakeCatalogClient([product("old1"), product("old2")]))
+    sync_catalog(brand, FakeCatalogClient([product("new1")]))
+
+    # Renamed into place, so products dropped from the catalog disappear
+    assert synced_ids(redis_client, brand) == {"new1"}
+
+
+def test_sync_skips_products_without_id_or_price(redis_client, brand):
+    client = FakeCatalogClient([product("sku1"), product("", price="₹10"), product("sku2", price="n/a")])
+
+    assert sync_catalog(brand, client) == 1
+    assert synced_ids(redis_client, brand) == {"sku1"}
+
+
+def test_empty_sync_keeps_the_previous_copy(redis_client, brand):
+    sync_catalog(brand, FakeCatalogClient([product("sku1")]))
+    version = redis_client.get(_version_key(brand.brand_id))
+
+    assert sync_catalog(brand, FakeCatalogClient([])) is None
+    assert synced_ids(redis_client, brand) == {"sku1"}
+    assert redis_client.get(_version_key(brand.brand_id)) == version
+
+
+def test_failed_sync_keeps_the_previous_copy(redis_client, brand):
+    sync_catalog(brand, FakeCatalogClient([product("sku1")]))
+    version = redis_client.get(_version_key(brand.brand_id))
+
+    client = FailingCatalogClient([product("sku2"), product("sku3")], page_size=1)
+    assert sync_catalog(brand, client) is None
+    assert synced_ids(redis_client, brand) == {"sku1"}
+    assert redis_client.get(_version_key(brand.brand_id)) == version
+    assert not redis_client.exists(f"{_products_key(brand.brand_id)}:syncing")
+
+
+def test_lookup_prefers_the_synced_copy(brand):
+    retailer_id = next(iter(brand.catalog))
+    sync_catalog(brand, FakeCatalogClient([product(retailer_id.upper(), price="₹10.50")]))
+
+    assert lookup_product(retailer_id) == {"name": f"Product {retailer_id.upper()}", "price": 10.5, "available": True}
+
+
+def test_lookup_reports_out_of_stock_products(brand):
+    sync_catalog(brand, FakeCatalogClient([product("sku1", availability="out of stock")]))
+
+    assert lookup_product("SKU1")["available"] is False
+
+
+def test_lookup_falls_back_to_the_json_catalog(brand):
+    retailer_id, listed = next(iter(brand.catalog.items()))
+    sync_catalog(brand, FakeCatalogClient([product("sku1")]))
+
+    found = lookup_product(retailer_id)
+    assert found["name"] == listed["name"]
+    assert found["price"] == listed["price"]
+    assert found["available"] is True
+    assert lookup_product("no-such-product") is None
+
+
+def test_lookup_uses_the_json_catalog_before_any_sync(brand):
+    retailer_id, listed = next(iter(brand.catalog.items()))
+
+    assert lookup_product(retailer_id)["name"] == listed["name"]
@@ -0,0 +1,51 @@
+# test/test_csv_partitions.py
+"""CSV logs are split into daily, size-capped partitions that are later gzipped and expired"""
+import gzip
+import os
+from datetime import date
+
+from utils import csv_utils
+from utils.csv_utils import current_partition, list_partitions, maintain_partitions, partition_path, read_csv, write_rows
+
+
+def test_partitions_are_named_by_day_and_part(tmp_path):
+    log = str(tmp_path / "orders.csv")
+
+    assert partition_path(log, "2026-10-18") == str(tmp_path / "orders-2026-10-18.csv")
+    assert partition_path(log, "2026-10-18", 2) == str(tmp_path / "orders-2026-10-18.2.csv")
+
+
+def test_a_full_partition_rolls_over_to_the_next_part(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_utils, "CSV_PARTITION_MAX_BYTES", 10)
+    monkeypatch.setattr(csv_utils, "_current_parts", {})
+    log = str(tmp_path / "orders.csv")
+
+    first = current_partition(log, day="2026-10-18")
+    write_rows(first, [{"order_id": "ORD0000001"}])
+
+    assert current_partition(log, day="2026-10-18") == partition_path(log, "2026-10-18", 1)
+
+
+def test_maintenance_gzips_earlier_days_and_deletes_expired_ones(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_utils, "CSV_RETENTION_DAYS", 30)
+    log = str(tmp_path / "orders.csv")
+    for day in ("2026-08-01", "2026-10-17", "2026-10-18"):
+        write_rows(partition_path(log, day), [{"order_id": day}])
+
+    maintain_partitions(log, today=date(2026, 10, 18))
+
+    assert sorted(os.listdir(tmp_path)) == ["orders-2026-10-17.csv.gz", "orders-2026-10-18.csv"]
+    with gzip.open(tmp_path / "orders-2026-10-17.csv.gz", "rt") as f:
+        assert f.read().splitlines() == ["order_id", "2026-10-17"]
+
+
+def test_read_csv_spans_plain_and_compressed_partitions(tmp_path):
+    log = str(tmp_path / "orders.csv")
+    write_rows(log, [{"order_id": "legacy"}])
+    write_rows(partition_path(log, "2026-10-17"), [{"order_id": "ORD1"}])
+    csv_utils.compress_partition(partition_path(log, "2026-10-17"))
+    write_rows(partition_path(log, "2026-10-18"), [{"order_id": "ORD2"}])
+
+    assert [day for day, part, path in list_partitions(log)] == ["2026-10-17", "2026-10-18"]
+    assert [row["order_id"] for row in read_csv(log)] == ["legacy", "ORD1", "ORD2"]
+    assert [row["order_id"] for row in read_csv(log, start_day="2026-10-18")] == ["ORD2"]
@@ -0,0 +1,74 @@
+# test/test_geocode_cache.py
+"""Typed addresses are geocoded once, then served from the local and Redis caches"""
+import pytest
+
+from utils import geocode_utils
+from utils.geocode_utils import _LRUCache, geocode_address, normalize_address
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+        self.failing = False
+
+    def geocode(self, text):
+        self.calls.append(text)
+        if self.failing:
+            raise TimeoutError("Maps API unreachable")
+        if "nowhere" in text.lower():
+            return []
+        return [{"geometry": {"location": {"lat": 17.4, "lng": 78.3}}}]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(geocode_utils, "_client", client)
+    monkeypatch.setattr(geocode_utils, "_local_cache", _LRUCache(10))
+    return client
+
+
+def test_addresses_are_normalized():
+    assert normalize_address("  My Home,  Jewel Apts!! ") == "my home jewel apts"
+
+
+def test_repeat_lookups_use_the_cache(client):
+    assert geocode_address("My Home, Jewel Apts") == (17.4, 78.3)
+    assert geocode_address("my home jewel apts!") == (17.4, 78.3)
+
+    assert client.calls == ["My Home, Jewel Apts"]
+
+
+def test_other_processes_are_served_from_redis(client, monkeypatch):
+    geocode_address("My Home, Jewel Apts")
+    # A fresh process starts with an empty local cache
+    monkeypatch.setattr(geocode_utils, "_local_cache", _LRUCache(10))
+
+    assert geocode_address("My Home, Jewel Apts") == (17.4, 78.3)
+    assert len(client.calls) == 1
+
+
+def test_not_found_is_cached_too(client):
+    assert geocode_address("Nowhere") is None
+    assert geocode_address("nowhere.") is None
+
+    assert client.calls == ["Nowhere"]
+
+
+def test_api_errors_are_not_cached(client):
+    client.failing = True
+    assert geocode_address("My Home, Jewel Apts") is None
+
+    client.failing = False
+    assert geocode_address("My Home, Jewel Apts") == (17.4, 78.3)
+    assert len(client.calls) == 2
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = _LRUCache(2)
+    cache.set("a", "1", 60)
+    cache.set("b", "2", 60)
+    cache.get("a")
+    cache.set("c", "3", 60)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("1", None, "3")
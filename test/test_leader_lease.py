@@ -0,0 +1,31 @@
+# test/test_leader_lease.py
+"""Scheduler leadership: one Redis lease holder at a time"""
+from services.leader_lease import LeaderLease
+
+
+def test_only_one_process_holds_the_lease(redis_client):
+    first = LeaderLease(redis_client, "test:leader", lease_seconds=5)
+    second = LeaderLease(redis_client, "test:leader", lease_seconds=5)
+
+    assert first.heartbeat()
+    assert not second.heartbeat()
+    assert first.heartbeat()
+
+
+def test_stopping_hands_the_lease_over(redis_client):
+    first = LeaderLease(redis_client, "test:leader", lease_seconds=5)
+    second = LeaderLease(redis_client, "test:leader", lease_seconds=5)
+    first.heartbeat()
+
+    first.stop()
+
+    assert second.heartbeat()
+
+
+def test_a_lease_taken_over_is_not_renewed(redis_client):
+    first = LeaderLease(redis_client, "test:leader", lease_seconds=5)
+    first.heartbeat()
+    redis_client.set("test:leader", "someone-else")
+
+    assert not first.heartbeat()
+    assert redis_client.get("test:leader") == b"someone-else"
@@ -0,0 +1,111 @@
+# test/test_message_handler.py
+import pytest
+
+from config.brand_registry import brand_registry
+from handlers import message_handler
+from handlers.message_handler import handle_sender_messages
+from stateHandlers.redis_state import redis_state
+from utils import payment_utils
+
+PRODUCT_ID = next(iter(brand_registry.default.catalog))
+
+
+def order_message(message_id, quantity=2):
+    return {
+        "id": message_id,
+        "from": "919800000001",
+        "timestamp": "1",
+        "type": "order",
+        "order": {"product_items": [{"product_retailer_id": PRODUCT_ID, "quantity": quantity}]},
+    }
+
+
+@pytest.fixture
+def viewing_catalog(redis_client):
+    redis_state.set_user_state("919800000001", {"step": "VIEWING_CATALOG"})
+
+
+@pytest.fixture
+def failing_cart_summary(monkeypatch):
+    """Makes send_cart_summary (the handler's last step) raise while `failing` is set"""
+    state = {"failing": True}
+    send_cart_summary = message_handler.send_cart_summary
+
+    def flaky_send_cart_summary(to):
+        if state["failing"]:
+            raise RuntimeError("Graph API down")
+        return send_cart_summary(to)
+
+    monkeypatch.setattr(message_handler, "send_cart_summary", flaky_send_cart_summary)
+    return state
+
+
+def test_a_failed_message_leaves_no_trace(viewing_catalog, failing_cart_summary, outbox):
+    assert redis_state.claim_events("whatsapp", ["wamid.1"]) == ["wamid.1"]
+
+    assert not handle_sender_messages(brand_registry.default, "919800000001", [order_message("wamid.1")])
+
+    assert redis_state.get_cart("919800000001")["items"] == []
+    assert redis_state.get_user_state("919800000001")["step"] == "VIEWING_CATALOG"
+    assert outbox == []
+    # The claim is released, so Meta's redelivery is processed
+    assert redis_state.claim_events("whatsapp", ["wamid.1"]) == ["wamid.1"]
+
+
+def test_a_redelivered_message_is_applied_once(viewing_catalog, failing_cart_summary, outbox):
+    handle_sender_messages(brand_registry.default, "919800000001", [order_message("wamid.1")])
+    failing_cart_summary["failing"] = False
+
+    assert handle_sender_messages(brand_registry.default, "919800000001", [order_message("wamid.1")])
+
+    cart = redis_state.get_cart("919800000001")
+    assert [(item["id"], item["quantity"]) for item in cart["items"]] == [(PRODUCT_ID, 2)]
+    assert [to for to, payload in outbox] == ["919800000001"]
+
+
+def test_pending_orders_and_payment_links_wait_for_the_commit(monkeypatch, redis_client):
+    submitted = []
+    monkeypatch.setattr(payment_utils, "_submit", submitted.append)
+
+    with pytest.raises(RuntimeError):
+        with redis_state.unit_of_work("919800000001"):
+            redis_state.set_pending_order("ORD1", {"order_id": "ORD1"})
+            payment_utils.generate_payment_link_async(
+                "919800000001", 100, "ORD1", payment_utils.request_payment_link, payment_utils.request_payment_link
+            )
+            raise RuntimeError("handler failed")
+
+    assert not redis_client.exists("pending_order:ORD1")
+    assert submitted == []
+
+    with redis_state.unit_of_work("919800000001"):
+        redis_state.set_pending_order("ORD1", {"order_id": "ORD1"})
+        payment_utils.generate_payment_link_async(
+            "919800000001", 100, "ORD1", payment_utils.request_payment_link, payment_utils.request_payment_link
+        )
+        assert submitted == []
+
+    assert redis_client.exists("pending_order:ORD1")
+    assert [job["order_id"] for job in submitted] == ["ORD1"]
+
+
+def test_an_order_placed_in_a_request_is_confirmed_after_the_commit(monkeypatch, redis_client, outbox):
+    from services import order_service
+
+    logged = []
+    monkeypatch.setattr(order_service, "log_order", logged.append)
+    brand = brand_registry.default
+    branch = next(iter(brand.branch_contacts))
+    redis_state.add_to_cart("919800000001", PRODUCT_ID, 1)
+    redis_state.set_branch("919800000001", branch)
+
+    with redis_state.unit_of_work("919800000001"):
+        success, _ = order_service.place_order("919800000001", "Takeaway", address="Takeaway")
+        assert success
+        assert redis_client.keys("order:*") == []
+        assert outbox == [] and logged == []
+
+    order_id = logged[0]["order_id"]
+    assert redis_state.get_order(order_id)["branch"] == branch
+    # The branch alert and the customer's confirmation, which reads the order back
+    assert any("ORDER CONFIRMED" in payload["text"]["body"] for to, payload in outbox if to == "919800000001")
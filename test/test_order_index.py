@@ -0,0 +1,101 @@
+# test/test_order_index.py
+import json
+import time
+
+import pytest
+
+from config.settings import ORDER_STATUS
+from stateHandlers.redis_state import _branch_index_key, _status_index_key, redis_state
+
+
+def new_order(order_id, branch="Main", status=ORDER_STATUS["PENDING"]):
+    order = {"order_id": order_id, "branch": branch, "status": status, "total": 100}
+    assert redis_state.create_order(order)
+    return order
+
+
+def test_orders_are_found_by_branch_and_status(redis_client):
+    new_order("ORD1")
+    new_order("ORD2", branch="Other")
+    new_order("ORD3", status=ORDER_STATUS["PAID"])
+
+    assert redis_state.get_order_ids(branch="Main") == ["ORD1", "ORD3"]
+    assert redis_state.get_order_ids(branch="main", status=ORDER_STATUS["PAID"]) == ["ORD3"]
+    assert redis_state.get_order_ids() == []
+
+
+def test_expired_orders_are_trimmed_from_the_indexes(redis_client):
+    new_order("ORD1")
+    new_order("ORD2")
+    # ORD1 reached its TTL: its hash is gone and its index score is in the past
+    redis_client.delete("order:ORD1", "order:ORD1:active")
+    redis_client.zadd(_branch_index_key("Main"), {"ORD1": time.time() - 1})
+    redis_client.zadd(_status_index_key(ORDER_STATUS["PENDING"]), {"ORD1": time.time() - 1})
+
+    assert redis_state.get_order_ids(branch="Main") == ["ORD2"]
+    assert redis_client.zscore(_branch_index_key("Main"), "ORD1") is None
+    assert redis_state.get_order_ids(status=ORDER_STATUS["PENDING"]) == ["ORD2"]
+
+
+def test_status_changes_keep_the_expiry_score(redis_client):
+    new_order("ORD1")
+    expires_at = redis_client.zscore(_status_index_key(ORDER_STATUS["PENDING"]), "ORD1")
+
+    redis_state.update_order_status("ORD1", ORDER_STATUS["PAID"])
+
+    assert redis_client.zscore(_status_index_key(ORDER_STATUS["PAID"]), "ORD1") == pytest.approx(expires_at, abs=2)
+    assert redis_client.zscore(_status_index_key(ORDER_STATUS["PENDING"]), "ORD1") is None
+
+
+def test_archived_orders_leave_the_indexes(redis_client):
+    new_order("ORD1")
+
+    assert redis_state.archive_order("ORD1")
+
+    assert redis_state.get_order_ids(branch="Main") == []
+    assert redis_state.get_order("ORD1") is None
+
+
+# Backfill from the legacy orders:all list
+
+def legacy_orders(redis_client, *order_ids):
+    for order_id in order_ids:
+        redis_client.rpush("orders:all", json.dumps({
+            "order_id": order_id, "branch": "Main", "status": ORDER_STATUS["PAID"], "total": 100,
+        }))
+        redis_client.setex(f"order:{order_id}:active", 3600, "1")
+
+
+def test_backfill_indexes_active_legacy_orders(redis_client):
+    legacy_orders(redis_client, "ORD1", "ORD2")
+    redis_client.rpush("orders:all", json.dumps({"order_id": "ORD0", "branch": "Main", "status": ORDER_STATUS["PAID"]}))
+
+    assert redis_state.migrate_order_index() == 2
+
+    assert redis_state.get_order_ids(branch="Main") == ["ORD1", "ORD2"]
+    assert redis_state.get_order("ORD1")["total"] == 100
+    assert redis_client.exists("orders:index:migrated")
+    assert not redis_client.exists("orders:index:migrating")
+    assert redis_state.migrate_order_index() == 0
+
+
+def test_backfill_is_skipped_while_another_process_runs_it(redis_client):
+    legacy_orders(redis_client, "ORD1")
+    redis_client.set("orders:index:migrating", "other-process", ex=60)
+
+    assert redis_state.migrate_order_index() == 0
+    assert not redis_client.exists("orders:index:migrated")
+    assert redis_client.get("orders:index:migrating") == b"other-process"
+
+
+def test_a_failed_backfill_is_retried(monkeypatch, redis_client):
+    legacy_orders(redis_client, "ORD1")
+    monkeypatch.setattr(redis_client, "llen", lambda key: 1 / 0)
+
+    assert redis_state.migrate_order_index() == 0
+    assert not redis_client.exists("orders:index:migrated")
+    assert not redis_client.exists("orders:index:migrating")
+
+    monkeypatch.undo()
+    assert redis_state.migrate_order_index() == 1
+    assert redis_client.exists("orders:index:migrated")
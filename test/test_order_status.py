@@ -0,0 +1,43 @@
+# test/test_order_status.py
+"""Order status transitions applied atomically by UPDATE_ORDER_STATUS_SCRIPT"""
+import pytest
+
+from config.settings import ORDER_STATUS
+from stateHandlers.redis_state import _status_index_key, redis_state
+
+
+@pytest.fixture
+def order():
+    order_data = {"order_id": "ORD1", "branch": "Main", "status": ORDER_STATUS["PENDING"], "total": 100}
+    assert redis_state.create_order(order_data)
+    return order_data
+
+
+def test_status_moves_forward_and_updates_the_indexes(order):
+    assert redis_state.update_order_status("ORD1", ORDER_STATUS["PAID"])
+
+    assert redis_state.get_order("ORD1")["status"] == ORDER_STATUS["PAID"]
+    assert redis_state.get_order_ids(status=ORDER_STATUS["PAID"]) == ["ORD1"]
+    assert redis_state.get_order_ids(status=ORDER_STATUS["PENDING"]) == []
+
+
+def test_status_never_moves_backwards(order):
+    redis_state.update_order_status("ORD1", ORDER_STATUS["READY"])
+
+    assert not redis_state.update_order_status("ORD1", ORDER_STATUS["PAID"])
+    assert redis_state.get_order("ORD1")["status"] == ORDER_STATUS["READY"]
+
+
+def test_cancel_is_allowed_until_delivered(order, redis_client):
+    assert redis_state.update_order_status("ORD1", ORDER_STATUS["CANCELLED"])
+
+    redis_state.create_order(dict(order, order_id="ORD2", status=ORDER_STATUS["DELIVERED"]))
+    assert not redis_state.update_order_status("ORD2", ORDER_STATUS["CANCELLED"])
+    assert redis_client.zscore(_status_index_key(ORDER_STATUS["DELIVERED"]), "ORD2") is not None
+
+
+def test_status_of_a_missing_or_expired_order_is_not_updated(order, redis_client):
+    assert not redis_state.update_order_status("ORD404", ORDER_STATUS["PAID"])
+
+    redis_client.delete("order:ORD1:active")
+    assert not redis_state.update_order_status("ORD1", ORDER_STATUS["PAID"])
@@ -0,0 +1,110 @@
+# test/test_outbound_queue.py
+"""Outbound queue: per-recipient ordering, the Redis-down buffer, the sweeper and restarts after fork"""
+import queue
+import threading
+
+import pytest
+
+from services.outbound_queue import OutboundQueue
+
+
+class Response:
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+
+
+@pytest.fixture
+def sent():
+    return []
+
+
+@pytest.fixture
+def outbound(redis_client, sent, monkeypatch):
+    """A queue whose worker threads are never started; tests drive it by hand"""
+    def deliver(payload, context):
+        sent.append(payload)
+        return Response(200)
+
+    q = OutboundQueue(redis_client, deliver, "test:outbound", workers=1, max_attempts=2, retry_backoff=0)
+    monkeypatch.setattr(q, "start", lambda: None)
+    return q
+
+
+def test_drain_sends_a_recipients_jobs_in_order_and_releases_the_lock(outbound, sent, redis_client):
+    outbound.enqueue_many([("111", "first"), ("111", "second"), ("222", "other")])
+
+    outbound._drain("111")
+
+    assert sent == ["first", "second"]
+    assert redis_client.llen(outbound._queue_key("111")) == 0
+    assert not redis_client.exists(outbound._lock_key("111"))
+
+
+def test_rejected_message_sends_the_fallback(redis_client):
+    sent = []
+
+    def deliver(payload, context):
+        sent.append(payload)
+        return Response(400, "bad template") if payload == "template" else Response(200)
+
+    q = OutboundQueue(redis_client, deliver, "test:outbound", workers=1, max_attempts=2, retry_backoff=0)
+    q.start = lambda: None
+    q.enqueue("111", "template", fallback="plain text")
+
+    q._drain("111")
+
+    assert sent == ["template", "plain text"]
+    assert redis_client.llen(q.dead_letter_key) == 0
+
+
+def test_redis_outage_buffers_jobs_without_sending_them(outbound, sent, monkeypatch):
+    def unavailable(jobs):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(outbound, "_push", unavailable)
+
+    job_id = outbound.enqueue("111", "hello")
+
+    assert job_id is not None
+    assert sent == []
+    assert outbound._buffer.get_nowait()["payload"] == "hello"
+
+
+def test_full_buffer_drops_the_job(outbound, monkeypatch):
+    def unavailable(jobs):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(outbound, "_push", unavailable)
+    monkeypatch.setattr(outbound, "_buffer", queue.Queue(maxsize=1))
+
+    assert outbound.enqueue_many([("111", "a"), ("111", "b")])[1] is None
+
+
+def test_sweep_readies_unlocked_recipients_and_forgets_empty_ones(outbound, redis_client):
+    outbound.enqueue_many([("111", "stranded"), ("222", "locked")])
+    redis_client.delete(outbound.ready_key)
+    redis_client.set(outbound._lock_key("222"), "worker")
+    redis_client.sadd(outbound.recipients_key, "333")
+
+    assert outbound.sweep() == 1
+
+    assert redis_client.lrange(outbound.ready_key, 0, -1) == [b"111"]
+    assert redis_client.smembers(outbound.recipients_key) == {b"111", b"222"}
+
+
+def test_start_restarts_threads_that_did_not_survive_a_fork(redis_client):
+    q = OutboundQueue(redis_client, lambda payload, context: Response(200), "test:outbound", workers=1)
+    finished = threading.Thread(target=lambda: None)
+    finished.start()
+    finished.join()
+    # What a forked child sees: the parent's thread objects, none of them running
+    q._threads = [finished]
+    q._started = True
+
+    q._after_fork_in_child()
+    try:
+        assert q._running()
+        assert finished not in q._threads
+    finally:
+        q.stop()
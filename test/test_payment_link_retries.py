@@ -0,0 +1,29 @@
+# test/test_payment_link_retries.py
+"""Payment link retries: each due retry is claimed once, and polling survives a fork"""
+import threading
+
+from utils.payment_utils import PaymentLinkRetries
+
+
+def test_due_retries_are_claimed_once(redis_client, monkeypatch):
+    retries = PaymentLinkRetries(redis_client, "test:payment_links:retries")
+    monkeypatch.setattr(retries, "start", lambda: None)
+    retries.schedule({"order_id": "ORD1"}, delay=0)
+    retries.schedule({"order_id": "ORD2"}, delay=3600)
+
+    assert retries.claim_due() == [{"order_id": "ORD1"}]
+    assert retries.claim_due() == []
+
+
+def test_polling_restarts_in_a_forked_child(redis_client):
+    retries = PaymentLinkRetries(redis_client, "test:payment_links:retries", poll_seconds=60)
+    finished = threading.Thread(target=lambda: None)
+    finished.start()
+    finished.join()
+    # What a forked child sees: the parent's thread object, no longer running
+    retries._thread = finished
+
+    retries._after_fork_in_child()
+
+    assert retries._thread is not finished
+    assert retries._thread.is_alive()
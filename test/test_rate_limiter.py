@@ -0,0 +1,28 @@
+# test/test_rate_limiter.py
+"""Token buckets shared across workers through Redis"""
+import time
+
+from utils.rate_limiter import TokenBucket
+
+
+def test_bucket_allows_a_burst_then_asks_to_wait(redis_client):
+    bucket = TokenBucket(redis_client, "test", rate=10, capacity=2)
+
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert 0 < bucket.try_acquire() <= 0.1
+
+
+def test_bucket_refills_over_time(redis_client):
+    bucket = TokenBucket(redis_client, "test", rate=20, capacity=1)
+    bucket.try_acquire()
+
+    assert bucket.try_acquire() > 0
+    time.sleep(0.06)
+    assert bucket.try_acquire() == 0
+
+
+def test_buckets_are_shared_by_name(redis_client):
+    TokenBucket(redis_client, "test", rate=1, capacity=1).try_acquire()
+
+    assert TokenBucket(redis_client, "test", rate=1, capacity=1).try_acquire() > 0
@@ -0,0 +1,62 @@
+# test/test_unit_of_work.py
+import pytest
+
+from config.brand_registry import brand_registry
+from stateHandlers.redis_state import _cart_key, _state_key, redis_state
+
+PRODUCT_ID = next(iter(brand_registry.default.catalog))
+
+
+def test_writes_are_flushed_when_the_request_completes(redis_client):
+    with redis_state.unit_of_work("u1"):
+        redis_state.set_user_state("u1", {"step": "VIEWING_CART"})
+        redis_state.add_to_cart("u1", PRODUCT_ID, 2)
+        # Buffered, but already visible to the request
+        assert not redis_client.exists(_state_key("u1"))
+        assert redis_state.get_user_state("u1")["step"] == "VIEWING_CART"
+
+    assert redis_state.get_user_state("u1")["step"] == "VIEWING_CART"
+    assert redis_state.get_cart("u1")["items"][0]["quantity"] == 2
+
+
+def test_request_uses_one_read_and_one_write_round_trip(redis_client):
+    with redis_state.unit_of_work("u1") as uow:
+        redis_state.get_user_state("u1")
+        redis_state.get_cart("u1")
+        redis_state.set_user_state("u1", {"step": "MAIN_MENU"})
+        redis_state.set_branch("u1", "Main")
+
+    assert uow.round_trips == 2
+
+
+def test_writes_are_discarded_when_the_request_raises(redis_client):
+    redis_state.set_user_state("u1", {"step": "MAIN_MENU"})
+
+    with pytest.raises(RuntimeError):
+        with redis_state.unit_of_work("u1"):
+            redis_state.set_user_state("u1", {"step": "VIEWING_CART"})
+            redis_state.add_to_cart("u1", PRODUCT_ID, 1)
+            raise RuntimeError("handler failed")
+
+    assert redis_state.get_user_state("u1")["step"] == "MAIN_MENU"
+    assert not redis_client.exists(_cart_key("u1"))
+
+
+def test_a_retried_request_applies_its_writes_once(redis_client):
+    def handle(fail):
+        with redis_state.unit_of_work("u1"):
+            redis_state.add_to_cart("u1", PRODUCT_ID, 1)
+            if fail:
+                raise RuntimeError("handler failed")
+
+    with pytest.raises(RuntimeError):
+        handle(fail=True)
+    handle(fail=False)
+
+    assert redis_state.get_cart("u1")["items"][0]["quantity"] == 1
+
+
+def test_other_users_are_not_buffered(redis_client):
+    with redis_state.unit_of_work("u1"):
+        redis_state.set_user_state("u2", {"step": "MAIN_MENU"})
+        assert redis_client.exists(_state_key("u2"))
@@ -0,0 +1,79 @@
+# test/test_webhook_batch.py
+"""Every message in a webhook delivery is handled, in order per sender"""
+import threading
+
+import pytest
+
+from config.brand_registry import get_current_brand
+from handlers import message_handler
+from handlers.message_handler import handle_incoming_message
+
+
+def delivery(*changes):
+    return {"entry": [{"changes": [{"value": value} for value in changes]}]}
+
+
+def text(sender, message_id, timestamp):
+    return {"from": sender, "id": message_id, "timestamp": str(timestamp), "type": "text"}
+
+
+@pytest.fixture
+def handled(monkeypatch):
+    """(brand id, sender, message id) of every message handled; no real handling happens"""
+    seen = []
+    lock = threading.Lock()
+
+    def handle_message(sender, msg):
+        with lock:
+            seen.append((get_current_brand().brand_id, sender, msg["id"]))
+
+    monkeypatch.setattr(message_handler, "handle_message", handle_message)
+    return seen
+
+
+def test_every_message_is_handled_in_timestamp_order_per_sender(handled):
+    data = delivery(
+        {"messages": [text("+919800000001", "a2", 2), text("919800000002", "b1", 1)]},
+        {"messages": [text("919800000001", "a1", 1)]},
+    )
+
+    assert handle_incoming_message(data) == ("OK", 200)
+
+    assert sorted(handled) == sorted([
+        ("kanuka", "919800000001", "a1"),
+        ("kanuka", "919800000001", "a2"),
+        ("kanuka", "919800000002", "b1"),
+    ])
+    first_sender = [message_id for _, sender, message_id in handled if sender == "919800000001"]
+    assert first_sender == ["a1", "a2"]
+
+
+def test_messages_are_handled_as_the_brand_they_were_sent_to(handled):
+    data = delivery(
+        {"metadata": {"phone_number_id": "700017766525097"}, "messages": [text("919800000001", "z1", 1)]},
+        {"metadata": {"phone_number_id": "unknown"}, "messages": [text("919800000001", "k1", 1)]},
+    )
+
+    handle_incoming_message(data)
+
+    assert sorted(handled) == [("kanuka", "919800000001", "k1"), ("zumi", "919800000001", "z1")]
+
+
+def test_a_failing_message_fails_the_delivery_but_not_the_others(monkeypatch):
+    handled = []
+
+    def handle_message(sender, msg):
+        if msg["id"] == "bad":
+            raise RuntimeError("boom")
+        handled.append(msg["id"])
+
+    monkeypatch.setattr(message_handler, "handle_message", handle_message)
+    data = delivery({"messages": [text("919800000001", "bad", 1), text("919800000001", "good", 2)]})
+
+    assert handle_incoming_message(data) == ("Error processing message", 500)
+    assert handled == ["good"]
+
+
+def test_status_only_deliveries_are_acknowledged(handled):
+    assert handle_incoming_message(delivery({"statuses": [{"id": "s1"}]})) == ("OK", 200)
+    assert handled == []
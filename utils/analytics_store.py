@@ -0,0 +1,286 @@
+# utils/analytics_store.py
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from config.brand_registry import get_current_brand
+from config.credentials import ANALYTICS_DB
+from config.settings import AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL_SECONDS, ORDER_STATUS
+from utils.logger import get_logger
+
+logger = get_logger("analytics_store")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    brand TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    order_day TEXT NOT NULL,
+    order_ts TEXT NOT NULL,
+    status TEXT,
+    delivery_type TEXT,
+    payment_method TEXT,
+    original_total REAL NOT NULL,
+    discount_amount REAL NOT NULL,
+    total REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_brand_day_branch ON orders (brand, order_day, branch, total);
+
+CREATE TABLE IF NOT EXISTS order_items (
+    order_id TEXT NOT NULL,
+    brand TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    order_day TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    name TEXT,
+    quantity INTEGER NOT NULL,
+    price REAL NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (order_id, item_id)
+);
+CREATE INDEX IF NOT EXISTS order_items_brand_day_item ON order_items (brand, order_day, item_id);
+
+CREATE TABLE IF NOT EXISTS branch_daily (
+    brand TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    day TEXT NOT NULL,
+    orders INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    PRIMARY KEY (brand, day, branch)
+);
+
+CREATE TABLE IF NOT EXISTS user_activity (
+    ts TEXT NOT NULL,
+    day TEXT NOT NULL,
+    brand TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS user_activity_brand_day_action ON user_activity (brand, day, action);
+CREATE INDEX IF NOT EXISTS user_activity_user ON user_activity (user_id, ts);
+"""
+
+_STOP = object()
+
+class AnalyticsStore:
+    """SQLite copy of orders (with exploded line items) and user activity for reporting.
+
+    branch_daily only counts orders that are not cancelled; it is adjusted
+    when an order's status changes.
+    """
+
+    def __init__(self, path=ANALYTICS_DB, batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._local = threading.local()
+
+    def _connect(self):
+        """One connection per thread; the schema is created on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL lets readers and the writers of other gunicorn workers run side by side
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # Writes are queued and committed in batches by a background thread
+
+    def record_order(self, order_data):
+        """Queue an order (as built by place_order) for the store"""
+        self._submit("order", order_data)
+
+    def record_activity(self, timestamp, user_id, action, details=""):
+        """Queue a user activity row for the store"""
+        self._submit("activity", (timestamp, user_id, action, details))
+
+    def record_status(self, order_id, status):
+        """Queue an order status change for the store"""
+        self._submit("status", (order_id, status))
+
+    def _submit(self, kind, record):
+        self.start()
+        # The writer thread has no request context, so capture the brand now
+        self._queue.put((kind, get_current_brand().brand_id, record))
+
+    def start(self):
+        """Start the writer thread once per process"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="analytics-store", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self, timeout=10):
+        """Write everything still queued"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            if stopping:
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+
+            if batch:
+                try:
+                    self.write_batch(batch)
+                except Exception as e:
+                    logger.error(f"Error writing {len(batch)} analytics records: {str(e)}")
+
+    def write_batch(self, batch):
+        """Write a batch of (kind, brand_id, record) entries in a single transaction"""
+        conn = self._connect()
+        with conn:
+            for kind, brand, record in batch:
+                if kind == "order":
+                    self._insert_order(conn, brand, record)
+                elif kind == "activity":
+                    timestamp, user_id, action, details = record
+                    conn.execute(
+                        "INSERT INTO user_activity (ts, day, brand, user_id, action, details) VALUES (?, ?, ?, ?, ?, ?)",
+                        (timestamp, timestamp[:10], brand, str(user_id), action, details)
+                    )
+                elif kind == "status":
+                    self._update_status(conn, *record)
+
+    def _insert_order(self, conn, brand, order_data):
+        order_ts = order_data["order_date"]
+        order_day = order_ts[:10]
+        branch = order_data.get("branch") or ""
+        total = float(order_data["total"])
+
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO orders (order_id, brand, branch, user_id, order_day, order_ts, status, "
+            "delivery_type, payment_method, original_total, discount_amount, total) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                order_data["order_id"], brand, branch, str(order_data["user_id"]), order_day, order_ts,
+                order_data.get("status"), order_data.get("delivery_type"), order_data.get("payment_method"),
+                float(order_data.get("original_total", total)), float(order_data.get("discount_amount", 0)), total
+            )
+        )
+        if cursor.rowcount == 0:
+            # Already recorded (e.g. replayed by another worker)
+            return
+
+        conn.executemany(
+            "INSERT OR IGNORE INTO order_items (order_id, brand, branch, order_day, item_id, name, quantity, price, amount) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    order_data["order_id"], brand, branch, order_day, str(item["id"]), item.get("name"),
+                    int(item["quantity"]), float(item["price"]), int(item["quantity"]) * float(item["price"])
+                )
+                for item in order_data.get("items", [])
+            ]
+        )
+        conn.execute(
+            "INSERT INTO branch_daily (brand, branch, day, orders, revenue) VALUES (?, ?, ?, 1, ?) "
+            "ON CONFLICT (brand, day, branch) DO UPDATE SET orders = orders + 1, revenue = revenue + excluded.revenue",
+            (brand, branch, order_day, total)
+        )
+
+    def _update_status(self, conn, order_id, status):
+        row = conn.execute(
+            "SELECT brand, branch, order_day, total, status FROM orders WHERE order_id = ?", (order_id,)
+        ).fetchone()
+        if row is None or row["status"] == status:
+            return
+        conn.execute("UPDATE orders SET status = ? WHERE order_id = ?", (status, order_id))
+
+        # Cancelled orders leave the daily rollup (and re-enter it if reinstated)
+        cancelled = ORDER_STATUS["CANCELLED"]
+        if cancelled not in (status, row["status"]):
+            return
+        sign = -1 if status == cancelled else 1
+        conn.execute(
+            "UPDATE branch_daily SET orders = orders + ?, revenue = revenue + ? WHERE brand = ? AND day = ? AND branch = ?",
+            (sign, sign * row["total"], row["brand"], row["order_day"], row["branch"])
+        )
+
+    # Query API; days are "YYYY-MM-DD" strings and ranges are inclusive, and
+    # brand defaults to the current brand
+
+    def revenue_by_branch_day(self, start_day, end_day, branch=None, brand=None):
+        """Order count and revenue per branch per day"""
+        query = "SELECT day, branch, orders, revenue FROM branch_daily WHERE brand = ? AND day BETWEEN ? AND ?"
+        params = [brand or get_current_brand().brand_id, start_day, end_day]
+        if branch:
+            query += " AND branch = ?"
+            params.append(branch)
+        query += " ORDER BY day, branch"
+        return [dict(row) for row in self._connect().execute(query, params)]
+
+    def revenue_by_branch(self, start_day, end_day, brand=None):
+        """Order count and revenue per branch over a date range"""
+        rows = self._connect().execute(
+            "SELECT branch, SUM(orders) AS orders, SUM(revenue) AS revenue FROM branch_daily "
+            "WHERE brand = ? AND day BETWEEN ? AND ? GROUP BY branch ORDER BY revenue DESC",
+            (brand or get_current_brand().brand_id, start_day, end_day)
+        )
+        return [dict(row) for row in rows]
+
+    def item_sales(self, start_day, end_day, branch=None, brand=None):
+        """Units sold and gross amount per item over a date range"""
+        query = (
+            "SELECT item_id, MAX(name) AS name, SUM(quantity) AS quantity, SUM(amount) AS amount "
+            "FROM order_items WHERE brand = ? AND order_day BETWEEN ? AND ?"
+        )
+        params = [brand or get_current_brand().brand_id, start_day, end_day]
+        if branch:
+            query += " AND branch = ?"
+            params.append(branch)
+        query += " GROUP BY item_id ORDER BY quantity DESC"
+        return [dict(row) for row in self._connect().execute(query, params)]
+
+    def activity_by_day(self, start_day, end_day, action=None, brand=None):
+        """Activity count and distinct users per day and action"""
+        query = (
+            "SELECT day, action, COUNT(*) AS events, COUNT(DISTINCT user_id) AS users "
+            "FROM user_activity WHERE brand = ? AND day BETWEEN ? AND ?"
+        )
+        params = [brand or get_current_brand().brand_id, start_day, end_day]
+        if action:
+            query += " AND action = ?"
+            params.append(action)
+        query += " GROUP BY day, action ORDER BY day, action"
+        return [dict(row) for row in self._connect().execute(query, params)]
+
+analytics_store = AnalyticsStore()
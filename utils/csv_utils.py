@@ -160,39 +160,275 @@
 
 
 # utils/csv_utils.py
+import atexit
 import csv
+import fcntl
+import gzip
 import os
-from datetime import datetime
+import queue
+import re
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
 from config.credentials import CART_REMINDERS_CSV, ORDERS_CSV, USER_ACTIVITY_LOG_CSV
 from utils.logger import get_logger
-from config.settings import BRAND_NAME
+from config.settings import (
+    AUDIT_BATCH_SIZE,
+    AUDIT_FLUSH_INTERVAL_SECONDS,
+    CSV_MAINTENANCE_INTERVAL_SECONDS,
+    CSV_PARTITION_MAX_BYTES,
+    CSV_RETENTION_DAYS
+)
+from config.brand_registry import get_current_brand
+from utils.analytics_store import analytics_store
 from utils.time_utils import get_current_ist
 
 logger = get_logger("csv_utils")
 
-def append_to_csv(file_path, data):
-    """Append data to CSV file"""
+_STOP = object()
+
+# Logical CSV logs; each is stored as daily (and size-capped) partitions next to the configured path
+CSV_LOGS = [ORDERS_CSV, CART_REMINDERS_CSV, USER_ACTIVITY_LOG_CSV]
+
+# Highest partition number in use per (file_path, day) in this process
+_current_parts = {}
+
+def _split_log_path(file_path):
+    directory, filename = os.path.split(file_path)
+    stem = filename[:-len(".csv")] if filename.endswith(".csv") else filename
+    return directory or ".", stem
+
+def partition_path(file_path, day, part=0):
+    """Physical path of a partition, e.g. ../data/orders-2024-01-31.csv or orders-2024-01-31.1.csv"""
+    directory, stem = _split_log_path(file_path)
+    suffix = f".{part}" if part else ""
+    return os.path.join(directory, f"{stem}-{day}{suffix}.csv")
+
+def current_partition(file_path, day=None):
+    """Today's partition for file_path, moving to a new part once CSV_PARTITION_MAX_BYTES is reached"""
+    day = day or get_current_ist().strftime("%Y-%m-%d")
+    part = _current_parts.get((file_path, day), 0)
+    while True:
+        path = partition_path(file_path, day, part)
+        try:
+            if os.path.getsize(path) < CSV_PARTITION_MAX_BYTES:
+                break
+        except OSError:
+            break
+        part += 1
+    _current_parts[(file_path, day)] = part
+    return path
+
+def list_partitions(file_path):
+    """All partitions of file_path as sorted (day, part, path) tuples, compressed ones included"""
+    directory, stem = _split_log_path(file_path)
+    pattern = re.compile(rf"^{re.escape(stem)}-(\d{{4}}-\d{{2}}-\d{{2}})(?:\.(\d+))?\.csv(?:\.gz)?$")
+    partitions = {}
     try:
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        # Check if file exists to determine if we need headers
-        file_exists = os.path.isfile(file_path)
-        
-        with open(file_path, 'a', newline='') as csvfile:
-            # Get fieldnames from data keys
-            fieldnames = list(data.keys())
-            
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        filenames = os.listdir(directory)
+    except OSError:
+        return []
+    for filename in filenames:
+        match = pattern.match(filename)
+        if not match:
+            continue
+        day, part = match.group(1), int(match.group(2) or 0)
+        # While a partition is being compressed both files can exist; prefer the plain one
+        if (day, part) not in partitions or not filename.endswith(".gz"):
+            partitions[(day, part)] = os.path.join(directory, filename)
+    return [(day, part, path) for (day, part), path in sorted(partitions.items())]
+
+def compress_partition(path):
+    """Gzip a closed partition in place; skipped if another worker holds it"""
+    try:
+        with open(path, 'rb') as source:
+            try:
+                fcntl.flock(source, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            if not os.path.exists(path):
+                # Another worker finished compressing it first
+                return False
+            tmp_path = f"{path}.gz.tmp"
+            with gzip.open(tmp_path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.replace(tmp_path, f"{path}.gz")
+            os.remove(path)
+        logger.info(f"Compressed {path}")
+        return True
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.error(f"Error compressing CSV {path}: {str(e)}")
+        return False
+
+def maintain_partitions(file_path, today=None):
+    """Compress partitions from earlier days and delete those past CSV_RETENTION_DAYS"""
+    today = today or get_current_ist().date()
+    cutoff = (today - timedelta(days=CSV_RETENTION_DAYS)).isoformat() if CSV_RETENTION_DAYS > 0 else None
+    for day, part, path in list_partitions(file_path):
+        if cutoff and day < cutoff:
+            try:
+                os.remove(path)
+                logger.info(f"Removed expired {path}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Error removing CSV {path}: {str(e)}")
+        elif day < today.isoformat() and not path.endswith(".gz"):
+            compress_partition(path)
+
+def _open_partition(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rt', newline='')
+    return open(path, 'r', newline='')
+
+def read_csv(file_path, start_day=None, end_day=None):
+    """Lazily yield rows of a CSV log across its partitions, oldest first"""
+    # Rows written before partitioning was introduced
+    if start_day is None and os.path.isfile(file_path):
+        with open(file_path, 'r', newline='') as csvfile:
+            yield from csv.DictReader(csvfile)
+    
+    for day, part, path in list_partitions(file_path):
+        if (start_day and day < start_day) or (end_day and day > end_day):
+            continue
+        try:
+            with _open_partition(path) as csvfile:
+                yield from csv.DictReader(csvfile)
+        except FileNotFoundError:
+            # Compressed or expired while we were reading; pick up the .gz if there is one
+            if os.path.exists(f"{path}.gz"):
+                with _open_partition(f"{path}.gz") as csvfile:
+                    yield from csv.DictReader(csvfile)
+
+def _maintenance_loop():
+    while True:
+        for file_path in CSV_LOGS:
+            try:
+                maintain_partitions(file_path)
+            except Exception as e:
+                logger.error(f"Error maintaining CSV partitions for {file_path}: {str(e)}")
+        time.sleep(CSV_MAINTENANCE_INTERVAL_SECONDS)
+
+def write_rows(file_path, rows, fsync=False):
+    """Append rows to a CSV file under an exclusive lock, writing the header if the file is new"""
+    # Create directory if it doesn't exist
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    
+    with open(file_path, 'a', newline='') as csvfile:
+        # Other gunicorn workers append to the same files
+        fcntl.flock(csvfile, fcntl.LOCK_EX)
+        try:
+            writer = csv.DictWriter(csvfile, fieldnames=list(rows[0].keys()), extrasaction="ignore")
             
             # Write header if file is new
-            if not file_exists:
+            if os.fstat(csvfile.fileno()).st_size == 0:
                 writer.writeheader()
             
-            # Write data
-            writer.writerow(data)
+            writer.writerows(rows)
+            csvfile.flush()
+            if fsync:
+                os.fsync(csvfile.fileno())
+        finally:
+            fcntl.flock(csvfile, fcntl.LOCK_UN)
+
+class AuditSink:
+    """Buffers CSV rows in memory and appends them in per-file batches from a background thread"""
+    
+    def __init__(self, batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL_SECONDS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._maintenance_thread = None
+        self._paths = set()
+    
+    def submit(self, file_path, row):
+        """Queue a row for the log at file_path; never touches the filesystem"""
+        self.start()
+        self._queue.put((file_path, row))
+    
+    def start(self):
+        """Start the flusher thread once per process"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+            
+            if not (self._maintenance_thread and self._maintenance_thread.is_alive()):
+                self._maintenance_thread = threading.Thread(target=_maintenance_loop, name="csv-maintenance", daemon=True)
+                self._maintenance_thread.start()
+    
+    def close(self, timeout=10):
+        """Flush everything still queued and fsync the files written by this process"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if not thread:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
         
-        logger.info(f"Data appended to {file_path}")
+        for file_path in self._paths:
+            try:
+                with open(file_path, 'a') as f:
+                    os.fsync(f.fileno())
+            except Exception as e:
+                logger.error(f"Error syncing CSV {file_path}: {str(e)}")
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            if stopping:
+                # Pick up anything queued behind the stop marker
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+            
+            if batch:
+                self._write_batch(batch)
+    
+    def _write_batch(self, batch):
+        rows_by_path = {}
+        for file_path, row in batch:
+            rows_by_path.setdefault(file_path, []).append(row)
+        
+        for file_path, rows in rows_by_path.items():
+            try:
+                path = current_partition(file_path)
+                write_rows(path, rows)
+                self._paths.add(path)
+                logger.debug("Appended %s rows to %s", len(rows), path)
+            except Exception as e:
+                logger.error(f"Error appending to CSV {file_path}: {str(e)}")
+
+audit_sink = AuditSink()
+
+def append_to_csv(file_path, data):
+    """Queue a row to be appended to a CSV file"""
+    try:
+        audit_sink.submit(file_path, data)
         return True
     except Exception as e:
         logger.error(f"Error appending to CSV {file_path}: {str(e)}")
@@ -210,6 +446,7 @@ def log_user_activity(user_id, action, details=""):
         
         # Log to user activity log
         append_to_csv(USER_ACTIVITY_LOG_CSV, data)
+        analytics_store.record_activity(data["timestamp"], user_id, action, details)
         
         return True
     except Exception as e:
@@ -223,7 +460,7 @@ def log_order(order_data):
         log_data = {
             "order_id": order_data["order_id"],
             "user_id": order_data["user_id"],
-            "brand": BRAND_NAME,
+            "brand": get_current_brand().name,
             "branch": order_data["branch"],
             "items": str(order_data["items"]),
             "total": order_data["total"],
@@ -232,18 +469,20 @@ def log_order(order_data):
             "delivery_type": order_data["delivery_type"],
             "payment_method": order_data["payment_method"]
         }
+        analytics_store.record_order(order_data)
         return append_to_csv(ORDERS_CSV, log_data)
     except Exception as e:
         logger.error(f"Error logging order: {str(e)}")
         return False
 
-def log_cart_reminder(user_id, order_id):
+def log_cart_reminder(user_id):
     """Log cart reminder to CSV"""
     try:
+        # Abandonment reminders belong to a cart, not an order, so the old
+        # order_id column is no longer written (it was always empty)
         data = {
             "timestamp": get_current_ist().strftime("%Y-%m-%d %H:%M:%S"),
-            "user_id": user_id,
-            "order_id": order_id
+            "user_id": user_id
         }
         return append_to_csv(CART_REMINDERS_CSV, data)
     except Exception as e:
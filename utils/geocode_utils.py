@@ -0,0 +1,127 @@
+# utils/geocode_utils.py
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import googlemaps
+from config.credentials import GOOGLE_MAPS_API_KEY
+from config.settings import GEOCODE_CACHE_SIZE, GEOCODE_CACHE_TTL_SECONDS, GEOCODE_NEGATIVE_TTL_SECONDS
+from stateHandlers.redis_state import redis_state
+from utils.logger import get_logger
+
+logger = get_logger("geocode_utils")
+
+# Cached value for addresses Google could not find
+_NOT_FOUND = "null"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Shared googlemaps client, so lookups reuse one HTTP session"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = googlemaps.Client(GOOGLE_MAPS_API_KEY)
+        return _client
+
+
+def normalize_address(text):
+    """Cache key form of an address: lower case, punctuation dropped, whitespace collapsed"""
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+
+class _LRUCache:
+    """Small thread-safe LRU whose entries also expire"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+_local_cache = _LRUCache(GEOCODE_CACHE_SIZE)
+
+
+def _redis_key(address):
+    return f"geocode:{hashlib.sha1(address.encode('utf-8')).hexdigest()}"
+
+
+def _store(address, value):
+    ttl = GEOCODE_NEGATIVE_TTL_SECONDS if value == _NOT_FOUND else GEOCODE_CACHE_TTL_SECONDS
+    _local_cache.set(address, value, ttl)
+    try:
+        redis_state.redis.setex(_redis_key(address), ttl, value)
+    except Exception as e:
+        logger.error(f"Error caching geocode result: {str(e)}")
+
+
+def _decode(value):
+    if value == _NOT_FOUND:
+        return None
+    location = json.loads(value)
+    return location["lat"], location["lng"]
+
+
+def geocode_address(text):
+    """Resolve a typed address to (latitude, longitude), or None if it cannot be found.
+
+    Results (including "not found") are cached in-process and in Redis, so
+    repeat lookups of the same address do not call the Google API.
+    """
+    address = normalize_address(text)
+    if not address:
+        return None
+
+    value = _local_cache.get(address)
+    if value is not None:
+        return _decode(value)
+
+    try:
+        value = redis_state.redis.get(_redis_key(address))
+    except Exception as e:
+        logger.error(f"Error reading geocode cache: {str(e)}")
+        value = None
+    if value is not None:
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        _local_cache.set(address, value, GEOCODE_NEGATIVE_TTL_SECONDS if value == _NOT_FOUND else GEOCODE_CACHE_TTL_SECONDS)
+        return _decode(value)
+
+    try:
+        results = get_client().geocode(text)
+    except Exception as e:
+        # Not cached: the address may well resolve once the API is reachable again
+        logger.error(f"Geocoding failed for '{text}': {str(e)}")
+        return None
+
+    if not results:
+        _store(address, _NOT_FOUND)
+        return None
+
+    location = results[0]["geometry"]["location"]
+    _store(address, json.dumps({"lat": location["lat"], "lng": location["lng"]}))
+    return location["lat"], location["lng"]
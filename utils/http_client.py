@@ -0,0 +1,101 @@
+# utils/http_client.py
+import threading
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config.settings import (
+    HTTP_BACKOFF_FACTOR,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_POOL_SIZE,
+    HTTP_READ_TIMEOUT,
+)
+from utils.json_utils import dumps_bytes
+from utils.logger import get_logger
+
+logger = get_logger("http_client")
+
+# 429 is left to the caller's rate limiter / queue: retrying it here would
+# bypass the shared token bucket and hammer an endpoint that asked us to slow down
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session(retries=True):
+    """Create a keep-alive session with a bounded pool and optional retry/backoff.
+
+    Only idempotent GETs are retried; a POST that reached the server could
+    otherwise be applied twice (e.g. two payment links or messages).
+    """
+    retry = Retry(
+        total=HTTP_MAX_RETRIES if retries else 0,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(name="default", retries=True):
+    """Return the shared pooled session for `name` (e.g. "graph", "razorpay").
+
+    Pass retries=False for callers that schedule their own retries, such as
+    everything sent through a TokenBucket.
+    """
+    key = (name, retries)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _build_session(retries)
+                _sessions[key] = session
+                logger.info(f"Created pooled HTTP session '{name}' (pool size {HTTP_POOL_SIZE})")
+    return session
+
+
+@lru_cache(maxsize=None)
+def bearer_headers(access_token):
+    """Prebuilt JSON + bearer auth headers, cached per access token (one per brand).
+
+    The returned dict is shared; callers must not mutate it.
+    """
+    return {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+    }
+
+
+def post_json(session_name, url, payload, headers=JSON_HEADERS, timeout=DEFAULT_TIMEOUT, retries=True, **kwargs):
+    """POST a JSON payload over the named pooled session.
+
+    The body is serialised with utils.json_utils, so `headers` must carry
+    the JSON Content-Type (bearer_headers does).
+    """
+    return get_session(session_name, retries).post(
+        url, data=dumps_bytes(payload), headers=headers, timeout=timeout, **kwargs
+    )
+
+
+def get_json(session_name, url, params=None, headers=None, timeout=DEFAULT_TIMEOUT, retries=True, **kwargs):
+    """GET over the named pooled session"""
+    return get_session(session_name, retries).get(
+        url, params=params, headers=headers, timeout=timeout, **kwargs
+    )
@@ -0,0 +1,31 @@
+# utils/json_utils.py
+import json
+
+# orjson is optional; it is several times faster at serialising message payloads
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps(obj):
+    """Compact JSON text (UTF-8 kept as is) using the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return _encoder.encode(obj)
+
+
+def dumps_bytes(obj):
+    """Compact JSON as UTF-8 bytes, e.g. for a request body"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return _encoder.encode(obj).encode("utf-8")
+
+
+def loads(data):
+    """Parse JSON text or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
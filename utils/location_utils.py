@@ -1,18 +1,143 @@
 # utils/location_utils.py
+import heapq
+import math
 
-from config.settings import DISTANCE
-from geopy.distance import geodesic
-import json
-from pathlib import Path
+from config.brand_registry import get_current_brand
+from config.settings import DELIVERY_RADIUS_KM
 
-# BRANCHES = Path(__file__).parent.parent.parent / "data" / "branches.json"
-BRANCHES = json.loads((Path(__file__).parent.parent / "data" / "branches.json").read_text())
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance between two points in km using Haversine formula"""
+    # Convert decimal degrees to radians
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+
+    # Haversine formula
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
+    c = 2 * math.asin(math.sqrt(a))
+    return c * EARTH_RADIUS_KM
+
+
+class BranchLocator:
+    """Grid index over branch coordinates for nearest-branch and radius lookups.
+
+    Branches are bucketed into cells roughly `cell_km` on a side (longitude
+    cells are widened for the most poleward branch so no cell is narrower
+    than that). A lookup only computes distances for branches in the cells
+    around the query point instead of scanning every branch. Points more
+    than `max_rings` cells from any branch (outside the service area) fall
+    back to a linear scan rather than walking empty cells.
+    """
+
+    def __init__(self, branches, cell_km=DELIVERY_RADIUS_KM, max_rings=2):
+        self.cell_km = cell_km
+        self.max_rings = max_rings
+        self.branches = [(branch, lat, lon) for branch, (lat, lon) in branches.items()]
+        self.cell_lat = cell_km / KM_PER_DEGREE
+        max_abs_lat = max((abs(lat) for lat, _ in branches.values()), default=0)
+        self.cell_lon = self.cell_lat / max(math.cos(math.radians(max_abs_lat)), 0.01)
+
+        self.cells = {}
+        for branch, (lat, lon) in branches.items():
+            self.cells.setdefault(self._cell(lat, lon), []).append((branch, lat, lon))
+
+        rows = [row for row, _ in self.cells] or [0]
+        cols = [col for _, col in self.cells] or [0]
+        self._bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_lat), math.floor(lon / self.cell_lon)
+
+    def _ring(self, row, col, radius):
+        """Branches in cells exactly `radius` cells away from (row, col)"""
+        if radius == 0:
+            yield from self.cells.get((row, col), [])
+            return
+        for d in range(-radius, radius + 1):
+            for cell in ((row - radius, col + d), (row + radius, col + d)):
+                yield from self.cells.get(cell, [])
+        for d in range(-radius + 1, radius):
+            for cell in ((row + d, col - radius), (row + d, col + radius)):
+                yield from self.cells.get(cell, [])
+
+    def _max_ring(self, row, col):
+        min_row, max_row, min_col, max_col = self._bounds
+        return max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+
+    def nearest(self, latitude, longitude, k=1):
+        """Up to k nearest branches as (branch, distance_km), closest first"""
+        if not self.cells:
+            return []
+        row, col = self._cell(latitude, longitude)
+        last_ring = self._max_ring(row, col)
+        found = []
+        for radius in range(min(last_ring, self.max_rings) + 1):
+            for branch, lat, lon in self._ring(row, col, radius):
+                found.append((branch, calculate_distance(latitude, longitude, lat, lon)))
+            found.sort(key=lambda match: match[1])
+            # Anything in the next ring out is at least `radius` cells away
+            if len(found) >= k and found[k - 1][1] <= radius * self.cell_km:
+                return found[:k]
+        if last_ring <= self.max_rings:
+            # Every cell was visited
+            return found[:k]
+        return self._scan(latitude, longitude, k)
+
+    def _scan(self, latitude, longitude, k):
+        """k nearest branches by checking every branch"""
+        return heapq.nsmallest(
+            k,
+            ((branch, calculate_distance(latitude, longitude, lat, lon)) for branch, lat, lon in self.branches),
+            key=lambda match: match[1]
+        )
+
+    def within_radius(self, latitude, longitude, radius_km=DELIVERY_RADIUS_KM):
+        """All branches within radius_km as (branch, distance_km), closest first"""
+        row, col = self._cell(latitude, longitude)
+        rows = math.ceil(radius_km / self.cell_km)
+        cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+        cols = math.ceil(radius_km / (KM_PER_DEGREE * cos_lat * self.cell_lon))
+
+        matches = []
+        for cell_row in range(row - rows, row + rows + 1):
+            for cell_col in range(col - cols, col + cols + 1):
+                for branch, lat, lon in self.cells.get((cell_row, cell_col), []):
+                    distance = calculate_distance(latitude, longitude, lat, lon)
+                    if distance <= radius_km:
+                        matches.append((branch, distance))
+        return sorted(matches, key=lambda match: match[1])
+
+
+# One index per brand, rebuilt when a config reload replaces the brand's context
+_branch_locators = {}
+
+
+def get_branch_locator(brand):
+    """Index over the branches of `brand` (a BrandContext)"""
+    cached = _branch_locators.get(brand.brand_id)
+    if cached is None or cached[0] is not brand:
+        cached = (brand, BranchLocator(brand.branch_coordinates))
+        _branch_locators[brand.brand_id] = cached
+    return cached[1]
+
+
+def find_nearest_branch(latitude, longitude):
+    """Find the current brand's nearest branch based on coordinates"""
+    nearest = get_branch_locator(get_current_brand()).nearest(latitude, longitude)
+    if not nearest:
+        return None, float('inf')
+    return nearest[0]
+
+def is_within_delivery_radius(latitude, longitude):
+    """Check if location is within delivery radius of any branch"""
+    nearest_branch, distance = find_nearest_branch(latitude, longitude)
+    return distance <= DELIVERY_RADIUS_KM, nearest_branch, distance
 
 def get_branch_from_location(latitude, longitude):
-    user_coords = (float(latitude), float(longitude))
-    print(BRANCHES)
-    for branch_name, info in BRANCHES.items():
-        coords = tuple(info["coordinates"])
-        if geodesic(user_coords, coords).km <= DISTANCE:
-            return branch_name
-    return None
\ No newline at end of file
+    """Nearest branch that delivers to the location, or None"""
+    within_radius, nearest_branch, _ = is_within_delivery_radius(float(latitude), float(longitude))
+    return nearest_branch if within_radius else None
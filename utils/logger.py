@@ -30,8 +30,118 @@
 
 
 # utils/logger.py
+import atexit
+import copy
+import itertools
+import json
 import logging
-from datetime import datetime
+import logging.handlers
+import os
+import queue
+import re
+import threading
+
+# LOG_LEVEL sets the default level; LOG_LEVEL_<NAME> overrides it per logger,
+# e.g. LOG_LEVEL_MESSAGE_HANDLER=DEBUG
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# "json" (one object per line) or "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# Below WARNING, only 1 in LOG_SAMPLE_RATE records whose message starts with
+# one of LOG_SAMPLED_PREFIXES (comma separated) is emitted
+LOG_SAMPLE_RATE = int(os.getenv("LOG_SAMPLE_RATE", "10"))
+LOG_SAMPLED_PREFIXES = tuple(
+    prefix for prefix in os.getenv("LOG_SAMPLED_PREFIXES", "Sending message to").split(",") if prefix
+)
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Lets through 1 in `rate` low-severity records whose message template starts with a sampled prefix"""
+
+    def __init__(self, prefixes=LOG_SAMPLED_PREFIXES, rate=LOG_SAMPLE_RATE):
+        super().__init__()
+        self.prefixes = prefixes
+        self.rate = max(rate, 1)
+        self._counters = {prefix: itertools.count() for prefix in prefixes}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not isinstance(record.msg, str):
+            return True
+        for prefix in self.prefixes:
+            if record.msg.startswith(prefix):
+                return next(self._counters[prefix]) % self.rate == 0
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener with args merged and the traceback rendered, but kept apart"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_queue_handler = None
+_listener = None
+_setup_lock = threading.Lock()
+
+def _get_queue_handler():
+    """Create the shared QueueHandler and start its listener thread once per process"""
+    global _queue_handler, _listener
+    with _setup_lock:
+        if _queue_handler is None:
+            if LOG_FORMAT == "text":
+                formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            else:
+                formatter = JsonFormatter()
+
+            # Only the listener thread writes to stderr
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(formatter)
+
+            log_queue = queue.SimpleQueue()
+            _queue_handler = _QueueHandler(log_queue)
+            _queue_handler.addFilter(SamplingFilter())
+            _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+            _listener.start()
+            atexit.register(_listener.stop)
+        return _queue_handler
+
+def _stop_listener():
+    # Drain queued records before a fork (e.g. gunicorn --preload) so they are not written twice
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+def _start_listener():
+    # The listener thread does not survive a fork
+    if _listener is not None and _listener._thread is None:
+        _listener.start()
+
+os.register_at_fork(before=_stop_listener, after_in_parent=_start_listener, after_in_child=_start_listener)
+
+def _level_for(name):
+    env_name = "LOG_LEVEL_" + re.sub(r"[^A-Za-z0-9]", "_", name).upper()
+    return os.getenv(env_name, LOG_LEVEL).upper()
 
 def get_logger(name):
     """Configure and return a logger"""
@@ -39,16 +149,9 @@ def get_logger(name):
     
     # Only add handler if it doesn't already have one
     if not logger.handlers:
-        logger.setLevel(logging.INFO)
-
-        # Create formatter
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-
-        # Create console handler
-        ch = logging.StreamHandler()
-        ch.setFormatter(formatter)
-        logger.addHandler(ch)
+        logger.setLevel(_level_for(name))
+        logger.addHandler(_get_queue_handler())
+        # The queue is the only output; the root logger's handlers would write on the calling thread
+        logger.propagate = False
 
     return logger
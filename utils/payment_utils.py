@@ -1,33 +1,58 @@
 # utils/payment_utils.py
-import requests
-import logging
+import importlib
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from config.brand_registry import get_current_brand, use_brand
 from config.credentials import RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET
+from config.settings import (
+    PAYMENT_LINK_RETRY_POLL_SECONDS,
+    PAYMENT_LINK_WORKERS,
+    RAZORPAY_BURST,
+    RAZORPAY_REQUESTS_PER_SECOND
+)
+from stateHandlers.redis_state import BRAND_ID, CLAIM_DUE_REMINDERS_SCRIPT, redis_state
+from utils.http_client import post_json
+from utils.json_utils import dumps, loads
+from utils.logger import get_logger
+from utils.rate_limiter import TokenBucket
 
 # Set up logging
-logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+logger = get_logger("payment_utils")
+
+RAZORPAY_PAYMENT_LINKS_URL = "https://api.razorpay.com/v1/payment_links"
+RETRYABLE_STATUS_CODES = [429, 500, 502, 503, 504]
+
+# Shared by every worker calling Razorpay with our API key
+razorpay_rate_limiter = TokenBucket(redis_state.redis, "razorpay", RAZORPAY_REQUESTS_PER_SECOND, RAZORPAY_BURST)
+
+# Payment links are created off the request thread
+_payment_link_pool = ThreadPoolExecutor(max_workers=PAYMENT_LINK_WORKERS, thread_name_prefix="payment-link")
 
-def generate_payment_link(to, total, order_id, max_retries=3, delay=1):
+# Attempts waiting out their backoff, scored by the epoch second they are due
+PAYMENT_LINK_RETRIES_KEY = f"payment_links:{BRAND_ID}:retries"
+
+
+def request_payment_link(to, total, order_id):
     """
-    Generates a Razorpay payment link for a customer with retry mechanism.
+    Makes a single attempt to create a Razorpay payment link.
     
     Args:
         to (str): WhatsApp number of the customer
         total (float): Total amount to be paid
         order_id (str): Unique order ID
-        max_retries (int): Maximum number of retry attempts
-        delay (int): Delay between retries in seconds
     
     Returns:
-        str: Shortened Razorpay payment link or None if failed
+        tuple: (short_url, retryable) - short_url is None on failure and
+        retryable tells the caller whether another attempt may succeed
     """
-    url = "https://api.razorpay.com/v1/payment_links"
-    
     # Ensure total is a positive number
     if total <= 0:
         logger.error("Invalid total amount: %s", total)
-        return None
+        return None, False
 
     payload = {
         "amount": int(total * 100),  # Convert to paise
@@ -48,45 +73,176 @@ def generate_payment_link(to, total, order_id, max_retries=3, delay=1):
         "callback_method": "get"
     }
 
-    for attempt in range(max_retries):
-        try:
-            logger.info(f"Attempt {attempt + 1} of {max_retries} to generate payment link for order {order_id}")
-            response = requests.post(
-                url,
-                auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET),
-                json=payload,
-                timeout=10  # Add timeout parameter
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                short_url = data.get("short_url")
-                
-                if short_url:
-                    logger.info("Payment link generated successfully: %s", short_url)
-                    return short_url
-                else:
-                    logger.error("Failed to generate payment link: %s", data.get("error", "No short URL returned"))
-            
-            # Handle specific error codes that might be retryable
-            if response.status_code in [429, 500, 502, 503, 504]:
-                logger.warning(f"Razorpay API returned {response.status_code}. Retrying in {delay} seconds...")
-                time.sleep(delay)
-                continue
-                
-            # If we get here, it's not a retryable error
-            logger.error(f"Failed to generate payment link. Status: {response.status_code}, Response: {response.text}")
-            break
+    try:
+        # Wait our turn rather than being throttled by Razorpay
+        razorpay_rate_limiter.acquire()
+        
+        # Retries are scheduled by generate_payment_link_async, not by the transport
+        response = post_json(
+            "razorpay",
+            RAZORPAY_PAYMENT_LINKS_URL,
+            payload,
+            auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET),
+            retries=False,
+        )
+
+        if response.status_code == 200:
+            data = response.json()
+            short_url = data.get("short_url")
             
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Request exception on attempt {attempt + 1}: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(delay)
-                continue
-            logger.exception("Error generating Razorpay link after all retries: %s", str(e))
-            break
+            if short_url:
+                logger.info("Payment link generated successfully: %s", short_url)
+                return short_url, False
+            logger.error("Failed to generate payment link: %s", data.get("error", "No short URL returned"))
+            return None, False
+
+        # Handle specific error codes that might be retryable
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            logger.warning("Razorpay API returned %s for order %s", response.status_code, order_id)
+            return None, True
+
+        # If we get here, it's not a retryable error
+        logger.error(f"Failed to generate payment link. Status: {response.status_code}, Response: {response.text}")
+        return None, False
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Request exception generating payment link for order {order_id}: {str(e)}")
+        return None, True
+    except Exception as e:
+        logger.exception("Unexpected error generating payment link: %s", str(e))
+        return None, False
+
+
+class PaymentLinkRetries:
+    """Payment link attempts waiting to be retried.
+
+    They sit in a Redis ZSET scored by when they are due, so a retry
+    scheduled before a restart is still made afterwards, by whichever
+    process claims it first.
+    """
+
+    def __init__(self, redis_client, key, poll_seconds=PAYMENT_LINK_RETRY_POLL_SECONDS):
+        self.redis = redis_client
+        self.key = key
+        self.poll_seconds = poll_seconds
+        self._claim_script = self.redis.register_script(CLAIM_DUE_REMINDERS_SCRIPT)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def schedule(self, job, delay):
+        """Attempt `job` again in `delay` seconds; returns False if it could not be stored"""
+        try:
+            self.redis.zadd(self.key, {dumps(job): time.time() + delay})
+        except Exception as e:
+            logger.error(f"Error scheduling payment link retry for order {job['order_id']}: {str(e)}")
+            return False
+        self.start()
+        return True
+
+    def claim_due(self, limit=100):
+        """Take the retries that are due, so each is made by exactly one process"""
+        return [loads(raw) for raw in self._claim_script(keys=[self.key], args=[time.time(), limit])]
+
+    def start(self):
+        """Start polling for due retries in this process (idempotent)"""
+        # A thread inherited through fork() is reported as not alive
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="payment-link-retries", daemon=True)
+            self._thread.start()
+
+    def _after_fork_in_child(self):
+        # The child inherits our state but not the polling thread
+        self._start_lock = threading.Lock()
+        if self._thread:
+            self.start()
+
+    def _run(self):
+        while True:
+            try:
+                for job in self.claim_due():
+                    _submit(job)
+            except Exception as e:
+                logger.error(f"Error polling payment link retries: {str(e)}")
+            time.sleep(self.poll_seconds)
+
+
+payment_link_retries = PaymentLinkRetries(redis_state.redis, PAYMENT_LINK_RETRIES_KEY)
+
+
+def _callback_name(callback):
+    name = f"{callback.__module__}:{callback.__qualname__}"
+    if "<" in callback.__qualname__:
+        raise ValueError(f"Payment link callbacks must be module-level functions, got {name}")
+    return name
+
+
+def _resolve(name):
+    module, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def _submit(job):
+    _payment_link_pool.submit(_run_attempt, job)
+
+
+def _run_attempt(job):
+    """Make one attempt of `job` and schedule the next if it may still succeed"""
+    number = job["attempt"]
+    order_id = job["order_id"]
+    # Attempts and callbacks run as the brand the order was placed with
+    with use_brand(job["brand_id"]):
+        logger.info("Attempt %s of %s to generate payment link for order %s", number, job["max_retries"], order_id)
+        short_url, retryable = request_payment_link(job["to"], job["total"], order_id)
+        try:
+            if short_url:
+                _resolve(job["on_success"])(job["to"], order_id, job["total"], short_url)
+                return
+            if retryable and number < job["max_retries"]:
+                backoff = job["delay"] * (2 ** (number - 1))
+                logger.warning(f"Retrying payment link for order {order_id} in {backoff} seconds...")
+                if payment_link_retries.schedule(dict(job, attempt=number + 1), backoff):
+                    return
+            logger.error(f"Giving up on payment link for order {order_id} after {number} attempt(s)")
+            _resolve(job["on_failure"])(job["to"], order_id)
         except Exception as e:
-            logger.exception("Unexpected error generating payment link: %s", str(e))
-            break
+            logger.exception("Payment link callback failed for order %s: %s", order_id, str(e))
+
+
+def generate_payment_link_async(to, total, order_id, on_success, on_failure, max_retries=3, delay=1):
+    """
+    Generates a Razorpay payment link in the background without blocking the caller.
+    
+    The first attempt runs on a worker thread (after the current request
+    commits, if there is one); a retryable failure is stored
+    in Redis with exponential backoff (see PaymentLinkRetries) instead of
+    sleeping, so it survives a restart.
     
-    return None
+    Args:
+        to (str): WhatsApp number of the customer
+        total (float): Total amount to be paid
+        order_id (str): Unique order ID
+        on_success (callable): Module-level function called with
+            (to, order_id, total, short_url) once the link is ready
+        on_failure (callable): Module-level function called with
+            (to, order_id) if every attempt fails
+        max_retries (int): Maximum number of attempts
+        delay (int): Base delay between attempts in seconds
+    """
+    job = {
+        "to": to,
+        "total": total,
+        "order_id": order_id,
+        "attempt": 1,
+        "max_retries": max_retries,
+        "delay": delay,
+        "brand_id": get_current_brand().brand_id,
+        # Stored by name so that a retry made after a restart can still call them
+        "on_success": _callback_name(on_success),
+        "on_failure": _callback_name(on_failure),
+    }
+    # Inside a request the link is only requested once the request commits
+    redis_state.after_commit(lambda: _submit(job))
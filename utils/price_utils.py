@@ -0,0 +1,7 @@
+# utils/price_utils.py
+
+
+def to_amount(value):
+    """Rupee amount as an int when it is whole (100, not 100.0), otherwise rounded to paise"""
+    amount = round(float(value), 2)
+    return int(amount) if amount.is_integer() else amount
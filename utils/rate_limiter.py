@@ -0,0 +1,82 @@
+# utils/rate_limiter.py
+import time
+
+from utils.logger import get_logger
+
+logger = get_logger("rate_limiter")
+
+# Token bucket shared by every process using the same key.
+# KEYS[1] bucket hash. ARGV[1] refill rate (tokens/s), ARGV[2] capacity,
+# ARGV[3] tokens requested. Time comes from the Redis server so that clock
+# skew between hosts cannot mint or withhold tokens.
+# Returns 0 if the tokens were taken, otherwise the ms until they will be available.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+if now > ts then
+    tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+    ts = now
+end
+
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = math.ceil((requested - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(ts))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+
+class TokenBucket:
+    """Redis-backed token bucket; `acquire` waits for a token instead of failing.
+
+    Tokens refill continuously at `rate` per second up to `capacity`, so
+    short bursts are absorbed and sustained traffic is held to `rate`
+    across all workers and hosts that share the bucket name.
+    """
+
+    def __init__(self, redis_client, name, rate, capacity=None):
+        self.redis = redis_client
+        self.key = f"ratelimit:{name}"
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available; returns 0, or the seconds to wait before retrying"""
+        try:
+            wait_ms = self._script(
+                keys=[self.key],
+                args=[self.rate, self.capacity, tokens],
+            )
+            return int(wait_ms) / 1000
+        except Exception as e:
+            # Never block outbound traffic because Redis is unavailable
+            logger.error(f"Rate limiter {self.key} unavailable, allowing request: {str(e)}")
+            return 0
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until tokens are available; returns False only if `timeout` runs out first"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            logger.debug("Rate limiter %s exhausted, waiting %.3fs", self.key, wait)
+            time.sleep(wait)